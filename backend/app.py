@@ -1,5 +1,10 @@
 import os
-from flask import Flask
+from dotenv import load_dotenv
+
+# Before anything else is imported: modules read their settings at import time
+load_dotenv()
+
+from flask import Flask, Response
 from flask_cors import CORS
 from config import Config
 from routes.auth import auth_bp
@@ -9,9 +14,12 @@ from routes.milk import milk_bp
 from routes.egg import egg_bp
 from routes.pay import pay_bp
 from routes.sub import sub_bp
-from dotenv import load_dotenv
-
-load_dotenv()
+from routes.month import month_bp
+from routes.report import report_bp
+from routes.export import export_bp
+from svc import cache, metrics, profiler, webhook_queue
+from svc.conditional import make_conditional, compress_response
+from db import transport_stats
 
 import logging
 logging.getLogger("apscheduler").setLevel(logging.WARNING)
@@ -21,7 +29,27 @@ app = Flask(__name__)
 app.config.from_object(Config)
 
 # Enable CORS for frontend
-CORS(app, resources={r"/api/*": {"origins": "*"}})
+CORS(app, resources={r"/api/*": {"origins": "*"}}, expose_headers=["X-Session-Token", "Server-Timing"])
+
+# ETags / 304s for JSON GETs, then gzip for large text bodies
+@app.after_request
+def conditional_and_compressed(response):
+    return compress_response(make_conditional(response))
+
+# Server-Timing and latency histograms; after_request hooks run in reverse,
+# so this one sees the response before it is compressed
+@app.before_request
+def start_timing():
+    metrics.start_request()
+
+@app.after_request
+def server_timing(response):
+    return metrics.finish_request(response)
+
+# Opt-in stack sampling (svc/profiler.py); a no-op without PROFILE_TOKEN
+app.before_request(profiler.before_request)
+app.after_request(profiler.after_request)
+app.add_url_rule('/debug/profile', 'profile_window', profiler.profile_window, methods=['POST'])
 
 # Register Blueprints
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
@@ -31,16 +59,46 @@ app.register_blueprint(milk_bp, url_prefix='/api/milk')
 app.register_blueprint(egg_bp, url_prefix='/api/egg')
 app.register_blueprint(pay_bp, url_prefix='/api/pay')
 app.register_blueprint(sub_bp, url_prefix='/api/sub')
+app.register_blueprint(month_bp, url_prefix='/api/month')
+app.register_blueprint(report_bp, url_prefix='/api/report')
+app.register_blueprint(export_bp, url_prefix='/api/export')
 
 @app.route('/health')
 def health():
     return {'status': 'ok'}
 
+# Operator endpoints take the profiler's X-Profile token; they are off
+# (401) when PROFILE_TOKEN is unset
+@app.route('/cache/stats')
+@profiler.token_required
+def cache_stats():
+    return cache.stats()
+
+@app.route('/pool/stats')
+@profiler.token_required
+def pool_stats():
+    return transport_stats()
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/webhooks/stats')
+@profiler.token_required
+def webhook_stats():
+    stats = webhook_queue.stats()
+    # The file's location is for `python -m svc.webhook_queue`, not HTTP
+    stats.pop('path', None)
+    return stats
+
 @app.route('/')
 def hello():
     return 'Hello world, welcome to MDM backend!'
 
 if __name__ == '__main__':
+    # Under gunicorn each worker starts this in post_worker_init (gunicorn.conf.py)
+    from svc.jobs import start_scheduler
+    start_scheduler()
     # Read PORT from environment variable, default to 8000
     port = int(os.getenv('PORT', 8000))
     # Run with host 0.0.0.0 to accept external connections
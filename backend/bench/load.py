@@ -0,0 +1,334 @@
+"""
+Load test for every blueprint route, run offline against the PostgREST
+stand-in in bench/postgrest_stub.py.
+
+Starts the stub with injected latency, seeds it with users who each have an
+active subscription, a month of every register and a completed payment,
+and runs the app under gunicorn against it. Two passes follow:
+
+1. Round-trips: each scenario is sent serially for fresh users (cold
+   caches), and the stub's request counter gives database calls per
+   request. These are compared with bench/baseline.json and any scenario
+   that makes more calls than its baseline fails the run (exit status 1).
+2. Load: each scenario is driven at every --concurrency level over a
+   pool of warm users, reporting throughput, p50/p95/p99 latency, errors
+   and database calls per request.
+
+    python bench/load.py --concurrency 1,8,32 --requests 200 --latency 0.02
+    python bench/load.py --only meal,stock --requests 50
+    python bench/load.py --update-baseline
+    python bench/load.py --storage sqlite
+
+With --storage sqlite the app runs on a SQLite file (svc/storage.py)
+seeded with the same data, and the stub only supplies the seed. No
+round-trips are counted then and the baseline is not checked.
+
+/api/auth/login (Google) and /api/pay/create (PhonePe) call third parties
+and are not driven; month summaries need raw SQL and fail fast here.
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from bench.postgrest_stub import PostgrestStub, STUB_KEY  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+SESSION_SECRET = "bench-session-secret-0123456789abcdef"
+YEAR, MONTH, DAYS = 2026, 1, 31
+# Sent with the webhook scenario; the app's defaults for WEBHOOK_USERNAME/PASSWORD
+WEBHOOK_AUTH = hashlib.sha256(b"webhook_user:webhook_pass").hexdigest()
+COLD_SAMPLES = 3
+# Numbers every request so saves always change a row, across passes and levels
+_serial = itertools.count()
+
+
+def _dates():
+    return [f"{YEAR}-{MONTH:02d}-{day:02d}" for day in range(1, DAYS + 1)]
+
+
+def seed_user(stub):
+    """A subscribed user with a full month of every register; returns the user id"""
+    user_id = str(uuid.uuid4())
+    payment_id = str(uuid.uuid4())
+    stub.seed("users", [{"id": user_id, "email": f"{user_id}@bench.local", "name": "Bench", "google_id": user_id}])
+    stub.seed("payments", [{"id": payment_id, "user_id": user_id, "order_id": f"order-{user_id}",
+                            "plan": "1_month", "amount": 1, "status": "COMPLETED"}])
+    stub.seed("subscriptions", [{"user_id": user_id, "payment_id": payment_id, "plan_type": "1_month",
+                                 "start_date": "2026-01-01T00:00:00+00:00", "end_date": "2099-01-01T00:00:00+00:00",
+                                 "status": "active"}])
+    stub.seed("meal_plans", [{"user_id": user_id, "date": d, "cnt_1to5": 40, "cnt_6to10": 35,
+                              "meal_type": "rice" if i % 2 else "wheat", "has_pulses": i % 3 == 0}
+                             for i, d in enumerate(_dates())])
+    stub.seed("stock", [{"user_id": user_id, "date": d, "grade": grade, "rice_add": 20 if i == 0 else 0,
+                         "wheat_add": 10 if i == 0 else 0, "oil_add": 2 if i == 0 else 0,
+                         "pulse_add": 3 if i == 0 else 0, "rice_open": None, "wheat_open": None,
+                         "oil_open": None, "pulse_open": None}
+                        for i, d in enumerate(_dates()[::7]) for grade in ("1-5", "6-10")])
+    stub.seed("milk", [{"user_id": user_id, "date": d, "children": 70, "milk_open": 0, "ragi_open": 0,
+                        "milk_rcpt": 12.5 if i == 0 else 0, "ragi_rcpt": 3 if i == 0 else 0,
+                        "dist_type": "milk & ragi"} for i, d in enumerate(_dates())])
+    stub.seed("egg", [{"user_id": user_id, "date": d, "payer": "APF", "egg_m": 20, "egg_f": 18,
+                       "banana_m": 1, "banana_f": 2, "egg_price": 6, "banana_price": 6} for d in _dates()])
+    return user_id
+
+
+def _day(i):
+    return f"{YEAR}-{MONTH:02d}-{i % DAYS + 1:02d}"
+
+
+# (name, method, path, body(i) or None, expected status); every save changes one row
+SCENARIOS = [
+    ("auth.refresh", "POST", "/api/auth/refresh", lambda i: {}, 200),
+    ("meal.get", "GET", f"/api/meal/{YEAR}/{MONTH}", None, 200),
+    ("meal.save", "POST", "/api/meal/save", lambda i: {"meals": [
+        {"date": _day(i), "cnt_1to5": 41 + i, "cnt_6to10": 35, "meal_type": "rice", "has_pulses": True}]}, 200),
+    ("stock.get", "GET", f"/api/stock/{YEAR}/{MONTH}", None, 200),
+    ("stock.save", "POST", "/api/stock/save", lambda i: {"records": [
+        {"date": _day(i), "grade": "1-5", "rice_add": 1 + i, "wheat_add": 0, "oil_add": 0, "pulse_add": 0}]}, 200),
+    ("stock.calc", "GET", f"/api/stock/calc/{YEAR}/{MONTH}", None, 200),
+    ("milk.get", "GET", f"/api/milk/{YEAR}/{MONTH}", None, 200),
+    ("milk.save", "POST", "/api/milk/save", lambda i: {"records": [
+        {"date": _day(i), "children": 71 + i, "milk_open": 0, "ragi_open": 0, "milk_rcpt": 0, "ragi_rcpt": 0,
+         "dist_type": "milk & ragi"}]}, 200),
+    ("milk.calc", "GET", f"/api/milk/calc/{YEAR}/{MONTH}", None, 200),
+    ("egg.get", "GET", f"/api/egg/{YEAR}/{MONTH}", None, 200),
+    ("egg.save", "POST", "/api/egg/save", lambda i: {"records": [
+        {"date": _day(i), "payer": "APF", "egg_m": 21 + i, "egg_f": 18, "banana_m": 1, "banana_f": 2}]}, 200),
+    ("month.get", "GET", f"/api/month/{YEAR}/{MONTH}", None, 200),
+    ("report.meals", "GET", f"/api/report/meals/{YEAR}/{MONTH}.pdf", None, 200),
+    ("export.egg", "GET", f"/api/export/egg?from={YEAR}-{MONTH:02d}&to={YEAR}-{MONTH:02d}&format=csv", None, 200),
+    ("sub.active", "GET", "/api/sub/active", None, 200),
+    ("sub.history", "GET", "/api/sub/history", None, 200),
+    ("sub.check", "GET", "/api/sub/check", None, 200),
+    ("pay.webhook", "POST", "/api/pay/webhook", lambda i: {
+        "event": "checkout.order.failed", "payload": {"merchantOrderId": f"missing-{i}", "state": "FAILED"}}, 200),
+    ("pay.status", "GET", "/api/pay/status/order-{user}", None, 302),
+]
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+_opener = urllib.request.build_opener(_NoRedirect)
+
+
+def send(base_url, scenario, user_id, token, i):
+    """One request; returns (seconds, status)"""
+    name, method, path, body, _ = scenario
+    headers = {"Authorization": WEBHOOK_AUTH if name == "pay.webhook" else f"Bearer {token}"}
+    data = None
+    if body is not None:
+        data = json.dumps(body(i)).encode()
+        headers["Content-Type"] = "application/json"
+    req = urllib.request.Request(base_url + path.format(user=user_id), data=data, method=method, headers=headers)
+    start = time.perf_counter()
+    try:
+        with _opener.open(req, timeout=60) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return time.perf_counter() - start, status
+
+
+def percentile(sorted_values, q):
+    index = min(len(sorted_values) - 1, max(0, round(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def round_trips(stub, base_url, users, tokens):
+    """Mean database calls per request for each scenario, cold caches"""
+    counts = {}
+    fresh = iter(users)
+    for scenario in SCENARIOS:
+        stub.reset_counts()
+        for _ in range(COLD_SAMPLES):
+            user_id = next(fresh)
+            _, status = send(base_url, scenario, user_id, tokens[user_id], next(_serial))
+            if status != scenario[4]:
+                print(f"  {scenario[0]}: unexpected status {status}")
+        counts[scenario[0]] = round(stub.calls / COLD_SAMPLES, 2)
+    return counts
+
+
+def run_load(stub, base_url, scenario, users, tokens, requests, concurrency):
+    def one(i):
+        user_id = users[i % len(users)]
+        return send(base_url, scenario, user_id, tokens[user_id], next(_serial))
+
+    stub.reset_counts()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - started
+    latencies = sorted(seconds for seconds, _ in results)
+    return {
+        "rps": requests / elapsed,
+        "p50": percentile(latencies, 0.50) * 1000,
+        "p95": percentile(latencies, 0.95) * 1000,
+        "p99": percentile(latencies, 0.99) * 1000,
+        "errors": sum(status != scenario[4] for _, status in results),
+        "db": stub.calls / requests,
+    }
+
+
+def wait_for(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1)
+            return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up")
+
+
+# Parents before children, for the SQLite file's foreign keys
+SEED_ORDER = ("users", "payments", "subscriptions")
+
+
+def seed_sqlite(stub, path):
+    """Copy the stub's tables into a SQLite storage file"""
+    from svc.storage import SQLiteStorage
+    target = SQLiteStorage(path)
+    tables = sorted(stub.tables, key=lambda t: SEED_ORDER.index(t) if t in SEED_ORDER else len(SEED_ORDER))
+    for table in tables:
+        target.table(table).insert(stub.tables[table]).execute()
+
+
+def start_app(stub, args, workdir):
+    env = {
+        **os.environ,
+        "SUPABASE_URL": stub.url,
+        "SUPABASE_KEY": STUB_KEY,
+        "SESSION_SECRET": SESSION_SECRET,
+        "SCHEDULER_ENABLED": "0",
+        "CACHE_BACKEND": "sqlite",
+        "CACHE_PATH": os.path.join(workdir, "cache.sqlite3"),
+        "WEBHOOK_QUEUE_PATH": os.path.join(workdir, "webhooks.sqlite3"),
+        "FRONTEND_SUCCESS_URL": "http://127.0.0.1/success",
+        "FRONTEND_FAILED_URL": "http://127.0.0.1/failed",
+        "PORT": str(args.port),
+        "WEB_CONCURRENCY": str(args.workers),
+        "GUNICORN_THREADS": str(args.threads),
+    }
+    env.pop("DATABASE_URL", None)
+    if args.storage == "sqlite":
+        env["STORAGE_BACKEND"] = "sqlite"
+        env["STORAGE_PATH"] = os.path.join(workdir, "storage.sqlite3")
+        seed_sqlite(stub, env["STORAGE_PATH"])
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app:app"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL,
+        stderr=None if args.verbose else subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        wait_for(f"{base_url}/health")
+    except Exception:
+        proc.terminate()
+        raise
+    return proc, base_url
+
+
+def check_baseline(counts, update):
+    """Compare round-trips with the stored baseline; returns the scenarios that regressed"""
+    if update:
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(counts, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {BASELINE_PATH}")
+        return []
+    if not os.path.exists(BASELINE_PATH):
+        print("No baseline yet; run with --update-baseline")
+        return []
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)
+    return [(name, baseline[name], calls) for name, calls in counts.items()
+            if name in baseline and calls > baseline[name]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated levels")
+    parser.add_argument("--requests", type=int, default=200, help="per scenario and level")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per stub query")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random seconds per stub query")
+    parser.add_argument("--users", type=int, default=50, help="warm users for the load pass")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--only", help="comma-separated scenario name prefixes")
+    parser.add_argument("--skip-load", action="store_true", help="round-trip check only")
+    parser.add_argument("--storage", choices=("supabase", "sqlite"), default="supabase",
+                        help="app storage backend; sqlite skips the round-trip baseline")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--verbose", action="store_true", help="show the app's stderr")
+    args = parser.parse_args()
+
+    global SCENARIOS
+    if args.only:
+        prefixes = tuple(args.only.split(","))
+        SCENARIOS = [s for s in SCENARIOS if s[0].startswith(prefixes)]
+
+    # issue_token reads these at import
+    os.environ.update(SESSION_SECRET=SESSION_SECRET, SUPABASE_URL="http://127.0.0.1:9", SUPABASE_KEY=STUB_KEY)
+    from svc.session import issue_token
+
+    stub = PostgrestStub(args.latency, args.jitter).start()
+    cold_users = [seed_user(stub) for _ in range(len(SCENARIOS) * COLD_SAMPLES)]
+    warm_users = [seed_user(stub) for _ in range(args.users)]
+    tokens = {u: issue_token(u, "2099-01-01T00:00:00+00:00") for u in cold_users + warm_users}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        proc, base_url = start_app(stub, args, workdir)
+        try:
+            if args.storage == "sqlite":
+                print(f"SQLite storage, {args.workers} workers x {args.threads} threads")
+            else:
+                print(f"Stub latency {args.latency * 1000:.0f} ms (+{args.jitter * 1000:.0f} ms jitter), "
+                      f"{args.workers} workers x {args.threads} threads")
+            counts = round_trips(stub, base_url, cold_users, tokens)
+            regressions = check_baseline(counts, args.update_baseline) if args.storage == "supabase" else []
+
+            if not args.skip_load:
+                print(f"\n{'scenario':<14}{'conc':>5}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+                      f"{'errors':>8}{'db/req':>8}{'cold':>6}")
+                for scenario in SCENARIOS:
+                    for concurrency in (int(c) for c in args.concurrency.split(",")):
+                        r = run_load(stub, base_url, scenario, warm_users, tokens, args.requests, concurrency)
+                        print(f"{scenario[0]:<14}{concurrency:>5}{r['rps']:>9.1f}{r['p50']:>9.1f}{r['p95']:>9.1f}"
+                              f"{r['p99']:>9.1f}{r['errors']:>8}{r['db']:>8.2f}{counts[scenario[0]]:>6.2f}")
+            else:
+                for name, calls in counts.items():
+                    print(f"{name:<14}{calls:>6.2f} db calls/request")
+        finally:
+            proc.terminate()
+            proc.wait()
+            stub.stop()
+
+    if regressions:
+        print("\nDatabase round-trips went up:")
+        for name, before, now in regressions:
+            print(f"  {name}: {before} -> {now}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""
+A local stand-in for the Supabase REST API (PostgREST), for benchmarks.
+
+Keeps tables in memory and answers the subset of PostgREST that db.py
+uses: select with column lists and one-level embeds, eq/neq/gt/gte/lt/lte/
+in filters, or=(...) groups, order, limit/offset, insert, upsert on a
+conflict key, update, delete and the complete_payment RPC. Every request
+waits `latency` seconds (plus up to `jitter`) before it is answered and is
+counted, so a benchmark can report database round-trips per request.
+
+    stub = PostgrestStub(latency=0.02)
+    stub.seed("users", [{"id": "u1", "email": "a@b.c"}])
+    stub.start()   # SUPABASE_URL = stub.url
+
+Raw SQL (db.query_db) goes straight to Postgres and is not covered.
+"""
+
+import itertools
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+# Any JWT-shaped string satisfies the client; the stub never checks it
+STUB_KEY = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.stub"
+
+REST_PREFIX = "/rest/v1/"
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _split_top(text, sep=","):
+    """Split on `sep` outside parentheses"""
+    parts, depth, start = [], 0, 0
+    for i, ch in enumerate(text):
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == sep and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _coerce(stored, text):
+    """The query-string value `text` in the type of a stored value"""
+    if text == "null":
+        return None
+    if text == "now()":
+        return _now()
+    if isinstance(stored, bool):
+        return text == "true"
+    if isinstance(stored, (int, float)):
+        return float(text)
+    return text
+
+
+def _compare(op, stored, text):
+    if op == "in":
+        return any(_compare("eq", stored, v.strip('"')) for v in _split_top(text.strip("()")))
+    if op == "is":
+        return stored is None if text == "null" else stored == (text == "true")
+    value = _coerce(stored, text)
+    if op == "eq":
+        return stored == value or str(stored) == str(value)
+    if op == "neq":
+        return not _compare("eq", stored, text)
+    if stored is None or value is None:
+        return False
+    if isinstance(stored, (int, float)) and not isinstance(stored, bool):
+        stored = float(stored)
+    else:
+        stored, value = str(stored), str(value)
+    return {"gt": stored > value, "gte": stored >= value, "lt": stored < value, "lte": stored <= value}[op]
+
+
+def _condition(column, expr):
+    """A row predicate for `column=op.value`"""
+    negate = expr.startswith("not.")
+    if negate:
+        expr = expr[4:]
+    op, _, text = expr.partition(".")
+    return lambda row: _compare(op, row.get(column), text) != negate
+
+
+def _group(kind, body):
+    """A row predicate for or=(...) / and(...) groups"""
+    checks = []
+    for part in _split_top(body):
+        if part.startswith(("or(", "and(")):
+            inner_kind, _, rest = part.partition("(")
+            checks.append(_group(inner_kind, rest[:-1]))
+        else:
+            column, _, expr = part.partition(".")
+            checks.append(_condition(column, expr))
+    combine = any if kind == "or" else all
+    return lambda row: combine(check(row) for check in checks)
+
+
+class PostgrestStub:
+    def __init__(self, latency=0.0, jitter=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.tables = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.RLock()
+        self.calls = 0
+        self.calls_by_route = {}
+        self.server = None
+
+    # -- data --------------------------------------------------------------
+
+    def seed(self, table, rows):
+        with self._lock:
+            for row in rows:
+                self._insert(table, dict(row))
+
+    def _insert(self, table, row):
+        now = _now()
+        row.setdefault("id", next(self._ids))
+        row.setdefault("created_at", now)
+        row.setdefault("updated_at", now)
+        self.tables.setdefault(table, []).append(row)
+        return row
+
+    def reset_counts(self):
+        with self._lock:
+            self.calls = 0
+            self.calls_by_route = {}
+
+    def _count(self, method, table):
+        with self._lock:
+            self.calls += 1
+            key = f"{method} {table}"
+            self.calls_by_route[key] = self.calls_by_route.get(key, 0) + 1
+
+    # -- queries -----------------------------------------------------------
+
+    def _filters(self, params):
+        checks = []
+        for key, value in params:
+            if key in ("select", "order", "limit", "offset", "on_conflict", "columns"):
+                continue
+            if key in ("or", "and"):
+                checks.append(_group(key, value.strip()[1:-1]))
+            else:
+                checks.append(_condition(key, value))
+        return lambda row: all(check(row) for check in checks)
+
+    def _project(self, row, select):
+        if not select or select == "*":
+            return dict(row)
+        out = {}
+        for part in _split_top(select):
+            if "(" in part:
+                # One-level embed through <singular>_id, e.g. payments(order_id, amount)
+                name, _, cols = part.partition("(")
+                fk = row.get(f"{name.rstrip('s')}_id")
+                target = next((r for r in self.tables.get(name, []) if fk is not None and r.get("id") == fk), None)
+                out[name] = self._project(target, cols[:-1]) if target else None
+            elif part == "*":
+                out.update(row)
+            else:
+                out[part] = row.get(part)
+        return out
+
+    def select(self, table, params):
+        args = dict(params)
+        with self._lock:
+            rows = [r for r in self.tables.get(table, []) if self._filters(params)(r)]
+        for term in reversed(_split_top(args.get("order", ""))):
+            column, _, direction = term.partition(".")
+            desc = direction.startswith("desc")
+            # Postgres puts nulls last ascending, first descending
+            present = [r for r in rows if r.get(column) is not None]
+            missing = [r for r in rows if r.get(column) is None]
+            present.sort(key=lambda r: r[column], reverse=desc)
+            rows = missing + present if desc else present + missing
+        offset = int(args.get("offset", 0))
+        if "limit" in args:
+            rows = rows[offset:offset + int(args["limit"])]
+        else:
+            rows = rows[offset:]
+        return [self._project(r, args.get("select")) for r in rows]
+
+    def write(self, table, params, body, upsert):
+        rows = body if isinstance(body, list) else [body]
+        key = [c for c in dict(params).get("on_conflict", "").split(",") if c]
+        saved = []
+        with self._lock:
+            existing = self.tables.setdefault(table, [])
+            for row in rows:
+                row = {k: (_now() if v == "now()" else v) for k, v in row.items()}
+                match = None
+                if upsert and key:
+                    match = next((r for r in existing if all(str(r.get(c)) == str(row.get(c)) for c in key)), None)
+                if match is not None:
+                    match.update(row, updated_at=_now())
+                    saved.append(dict(match))
+                else:
+                    saved.append(dict(self._insert(table, row)))
+        return saved
+
+    def update(self, table, params, body):
+        keep = self._filters(params)
+        with self._lock:
+            changed = [r for r in self.tables.get(table, []) if keep(r)]
+            for r in changed:
+                r.update({k: (_now() if v == "now()" else v) for k, v in body.items()})
+            return [dict(r) for r in changed]
+
+    def delete(self, table, params):
+        doomed = self._filters(params)
+        with self._lock:
+            rows = self.tables.get(table, [])
+            gone = [r for r in rows if doomed(r)]
+            self.tables[table] = [r for r in rows if not doomed(r)]
+        return gone
+
+    def rpc(self, name, args):
+        if name != "complete_payment":
+            raise KeyError(name)
+        with self._lock:
+            paid = next((p for p in self.tables.get("payments", []) if p["order_id"] == args["p_order_id"]), None)
+            if paid is None:
+                return {"status": "not_found"}
+            paid.update(status="COMPLETED", updated_at=_now())
+            if args.get("p_pp_data") is not None:
+                paid["pp_data"] = args["p_pp_data"]
+            if any(s.get("payment_id") == paid["id"] for s in self.tables.get("subscriptions", [])):
+                return {"status": "already_completed", "user_id": paid["user_id"], "payment_id": paid["id"]}
+            days = 90 if paid["plan"] == "3_month" else 30
+            start = datetime.now(timezone.utc)
+            sub = self._insert("subscriptions", {
+                "user_id": paid["user_id"], "payment_id": paid["id"], "plan_type": paid["plan"],
+                "start_date": start.isoformat(), "end_date": (start + timedelta(days=days)).isoformat(),
+                "status": "active",
+            })
+            return {"status": "completed", "user_id": paid["user_id"], "payment_id": paid["id"],
+                    "subscription_id": sub["id"]}
+
+    # -- HTTP --------------------------------------------------------------
+
+    def handle(self, method, path, query, body):
+        """Answer one request; returns (status, JSON-able body)"""
+        table = path[len(REST_PREFIX):] if path.startswith(REST_PREFIX) else path.strip("/")
+        self._count(method, table)
+        params = parse_qsl(query, keep_blank_values=True)
+        if table.startswith("rpc/"):
+            return 200, self.rpc(table[4:], body or {})
+        if method == "GET":
+            return 200, self.select(table, params)
+        if method == "POST":
+            upsert = "on_conflict" in dict(params)
+            return 201, self.write(table, params, body, upsert)
+        if method == "PATCH":
+            return 200, self.update(table, params, body or {})
+        if method == "DELETE":
+            return 200, self.delete(table, params)
+        return 405, {"message": f"{method} not supported"}
+
+    def start(self, port=0):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _serve(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                body = json.loads(raw) if raw else None
+                url = urlsplit(self.path)
+                if stub.latency or stub.jitter:
+                    time.sleep(stub.latency + random.uniform(0, stub.jitter))
+                try:
+                    status, payload = stub.handle(self.command, url.path, url.query, body)
+                except Exception as e:
+                    status, payload = 400, {"message": f"{type(e).__name__}: {e}"}
+                data = json.dumps(payload, default=str).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PATCH = do_DELETE = _serve
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
@@ -0,0 +1,125 @@
+"""
+Serialisation cost per month sheet: the old per-row fix-up loops plus
+jsonify against the typed row models in svc/models.py.
+
+Builds a synthetic month of rows for each register, shaped like PostgREST
+returns them (bigint ids, numeric columns as ints/floats, plus the extra
+columns a select("*") would bring), and times both paths.
+
+    python bench/serialize.py --rounds 2000
+"""
+
+import argparse
+import copy
+import os
+import sys
+import time
+import uuid
+from flask import Flask, jsonify
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from svc.models import dump_rows  # noqa: E402
+
+DAYS = 31
+USER_ID = str(uuid.uuid4())
+EXTRA = {"created_at": "2026-02-01T10:15:00.123456+00:00", "updated_at": "2026-02-02T08:00:00+00:00"}
+
+
+def _dates():
+    return [f"2026-01-{day:02d}" for day in range(1, DAYS + 1)]
+
+
+def sample_sheets():
+    meals = [
+        {"id": i, "user_id": USER_ID, "date": d, "cnt_1to5": 40 + i, "cnt_6to10": 35,
+         "meal_type": "rice" if i % 2 else "wheat", "has_pulses": i % 3 == 0, **EXTRA}
+        for i, d in enumerate(_dates(), 1)
+    ]
+    stock = [
+        {"id": i * 2 + j, "user_id": USER_ID, "date": d, "grade": grade, "rice_add": 10, "wheat_add": 5.5,
+         "oil_add": 1, "pulse_add": 2, "rice_open": None, "wheat_open": None, "oil_open": None,
+         "pulse_open": None, **EXTRA}
+        for i, d in enumerate(_dates(), 1) for j, grade in enumerate(("1-5", "6-10"))
+    ]
+    milk = [
+        {"id": i, "user_id": USER_ID, "date": d, "children": 70, "milk_open": 0, "ragi_open": 0,
+         "milk_rcpt": 12.5, "ragi_rcpt": 3, "dist_type": "milk & ragi", **EXTRA}
+        for i, d in enumerate(_dates(), 1)
+    ]
+    egg = [
+        {"id": i, "user_id": USER_ID, "date": d, "payer": "APF", "egg_m": 20, "egg_f": 18,
+         "banana_m": 1, "banana_f": 2, "egg_price": None, "banana_price": 5, **EXTRA}
+        for i, d in enumerate(_dates(), 1)
+    ]
+    return {"meal_plans": meals, "stock": stock, "milk": milk, "egg": egg}
+
+
+def _fix_common(r):
+    r['id'] = str(r['id'])
+    r['user_id'] = str(r['user_id'])
+    if isinstance(r['date'], str):
+        r['date'] = r['date']
+    else:
+        r['date'] = r['date'].isoformat()
+
+
+def _fix_floats(r, keys):
+    for key in keys:
+        if r[key] is not None:
+            r[key] = float(r[key])
+
+
+def _fix_egg(r):
+    _fix_common(r)
+    r['egg_price'] = float(r['egg_price']) if r['egg_price'] else 6.0
+    r['banana_price'] = float(r['banana_price']) if r['banana_price'] else 6.0
+
+
+# The loops the GET routes ran before the typed models
+LEGACY_FIXUPS = {
+    "meal_plans": _fix_common,
+    "stock": lambda r: (_fix_common(r), _fix_floats(r, ['rice_add', 'wheat_add', 'oil_add', 'pulse_add',
+                                                        'rice_open', 'wheat_open', 'oil_open', 'pulse_open'])),
+    "milk": lambda r: (_fix_common(r), _fix_floats(r, ['milk_open', 'ragi_open', 'milk_rcpt', 'ragi_rcpt'])),
+    "egg": _fix_egg,
+}
+
+
+def legacy(table, rows):
+    for r in rows:
+        LEGACY_FIXUPS[table](r)
+    return jsonify(rows).get_data()
+
+
+def typed(table, rows):
+    return dump_rows(table, rows)
+
+
+def measure(fn, table, sheet, rounds):
+    # Every round gets fresh rows, as each request does; copying is not timed
+    copies = [copy.deepcopy(sheet) for _ in range(rounds)]
+    start = time.perf_counter()
+    for rows in copies:
+        body = fn(table, rows)
+    return (time.perf_counter() - start) / rounds * 1e6, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    print(f"{'sheet':<12}{'rows':>6}{'legacy us':>12}{'typed us':>11}{'speedup':>9}{'legacy B':>10}{'typed B':>9}")
+    with app.app_context():
+        for table, sheet in sample_sheets().items():
+            legacy_us, legacy_bytes = measure(legacy, table, sheet, args.rounds)
+            typed_us, typed_bytes = measure(typed, table, sheet, args.rounds)
+            print(f"{table:<12}{len(sheet):>6}{legacy_us:>12.1f}{typed_us:>11.1f}"
+                  f"{legacy_us / typed_us:>8.1f}x{legacy_bytes:>10}{typed_bytes:>9}")
+
+
+if __name__ == "__main__":
+    main()
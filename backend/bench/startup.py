@@ -0,0 +1,138 @@
+"""
+Cold-start time of the backend, run offline against the PostgREST
+stand-in in bench/postgrest_stub.py.
+
+Each sample starts from a fresh process, the way a scaled-to-zero dyno does:
+
+- in-process: a new interpreter imports app, then serves one month-sheet
+  GET through Flask's test client; both steps are timed.
+- gunicorn: `gunicorn app:app` is started with the tree's gunicorn.conf.py;
+  timed until /health answers and until the first signed-in request has
+  been answered (which is when the Supabase client gets created).
+
+The working tree is always measured. --rev adds another git revision of the
+backend, extracted with git archive, to compare before and after:
+
+    python bench/startup.py --rev HEAD~1 --samples 5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from bench.load import SESSION_SECRET, YEAR, MONTH, seed_user, wait_for  # noqa: E402
+from bench.postgrest_stub import PostgrestStub, STUB_KEY  # noqa: E402
+
+PATH = f"/api/meal/{YEAR}/{MONTH}"
+
+# Run in the measured tree; prints import and first-request milliseconds
+CHILD = """
+import os, time
+started = time.perf_counter()
+from app import app
+imported = time.perf_counter()
+response = app.test_client().get(os.environ["BENCH_PATH"], headers={"Authorization": "Bearer " + os.environ["BENCH_TOKEN"]})
+answered = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print((imported - started) * 1000, (answered - imported) * 1000)
+"""
+
+
+def extract(rev, workdir):
+    """The backend directory as of `rev`, unpacked under workdir"""
+    target = os.path.join(workdir, rev.replace("/", "_"))
+    os.makedirs(target)
+    archive = subprocess.run(["git", "archive", rev, "."], cwd=BACKEND_DIR, check=True, capture_output=True).stdout
+    subprocess.run(["tar", "-x", "-C", target], input=archive, check=True)
+    return target
+
+
+def app_env(stub, token, workdir):
+    env = {
+        **os.environ,
+        "SUPABASE_URL": stub.url,
+        "SUPABASE_KEY": STUB_KEY,
+        "SESSION_SECRET": SESSION_SECRET,
+        "SCHEDULER_ENABLED": "0",
+        "CACHE_BACKEND": "sqlite",
+        "CACHE_PATH": os.path.join(workdir, "cache.sqlite3"),
+        "WEBHOOK_QUEUE_PATH": os.path.join(workdir, "webhooks.sqlite3"),
+        "METRICS_DIR": os.path.join(workdir, "metrics"),
+        "BENCH_PATH": PATH,
+        "BENCH_TOKEN": token,
+        # Bytecode is cached after the first sample either way; keep it out of the trees
+        "PYTHONDONTWRITEBYTECODE": "1",
+    }
+    env.pop("DATABASE_URL", None)
+    return env
+
+
+def in_process(tree, env):
+    out = subprocess.run([sys.executable, "-c", CHILD], cwd=tree, env=env, check=True,
+                         capture_output=True, text=True).stdout
+    import_ms, first_ms = (float(v) for v in out.split())
+    return import_ms, first_ms
+
+
+def under_gunicorn(tree, env, port, workers):
+    env = {**env, "PORT": str(port), "WEB_CONCURRENCY": str(workers)}
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "app:app"], cwd=tree, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        wait_for(f"{base_url}/health")
+        ready = time.perf_counter()
+        req = urllib.request.Request(base_url + PATH, headers={"Authorization": "Bearer " + env["BENCH_TOKEN"]})
+        urllib.request.urlopen(req, timeout=30).read()
+        answered = time.perf_counter()
+    finally:
+        proc.terminate()
+        proc.wait()
+    return (ready - started) * 1000, (answered - ready) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rev", action="append", default=[], help="git revision to compare (repeatable)")
+    parser.add_argument("--samples", type=int, default=3, help="fresh processes per tree and mode")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--port", type=int, default=18090)
+    parser.add_argument("--skip-gunicorn", action="store_true", help="in-process numbers only")
+    args = parser.parse_args()
+
+    # issue_token reads these at import
+    os.environ.update(SESSION_SECRET=SESSION_SECRET, SUPABASE_URL="http://127.0.0.1:9", SUPABASE_KEY=STUB_KEY)
+    from svc.session import issue_token
+
+    stub = PostgrestStub().start()
+    user_id = seed_user(stub)
+    token = issue_token(user_id, "2099-01-01T00:00:00+00:00")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        trees = [(rev, extract(rev, workdir)) for rev in args.rev] + [("working tree", BACKEND_DIR)]
+        env = app_env(stub, token, workdir)
+        print(f"Median of {args.samples} fresh processes, milliseconds; gunicorn with {args.workers} workers")
+        print(f"{'tree':<16}{'import':>9}{'1st req':>9}{'gunicorn':>10}{'1st req':>9}")
+        try:
+            for name, tree in trees:
+                local = [in_process(tree, env) for _ in range(args.samples)]
+                row = f"{name:<16}{statistics.median(s[0] for s in local):>9.0f}{statistics.median(s[1] for s in local):>9.0f}"
+                if not args.skip_gunicorn:
+                    served = [under_gunicorn(tree, env, args.port, args.workers) for _ in range(args.samples)]
+                    row += f"{statistics.median(s[0] for s in served):>10.0f}{statistics.median(s[1] for s in served):>9.0f}"
+                print(row)
+        finally:
+            stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Throughput of the sync and threaded gunicorn worker modes under the same
+concurrent load.
+
+Starts a stub Supabase REST server that answers every query after a fixed
+delay, runs the app against it once per worker mode, and fires the same
+batch of concurrent month-sheet GETs at each.
+
+    python bench/worker_modes.py --requests 400 --concurrency 50 --latency 0.05
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Any JWT-shaped string satisfies the client; the stub never checks it
+STUB_KEY = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.stub"
+
+
+def start_stub(latency):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _reply(self, body):
+            time.sleep(latency)
+            payload = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            self._reply([])
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"[]")
+            self._reply(body if isinstance(body, list) else [body])
+
+        do_PATCH = do_POST
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def wait_for(url, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1)
+            return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up")
+
+
+def run_load(base_url, requests, concurrency):
+    def one(i):
+        # A fresh user per request so the month cache never answers
+        start = time.perf_counter()
+        urllib.request.urlopen(f"{base_url}/api/meal/2026/1?user_id=bench-{i}", timeout=60).read()
+        return time.perf_counter() - start
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = sorted(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - started
+    return {
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1),
+    }
+
+
+def bench_mode(worker_class, stub_url, args):
+    port = 18000 + (1 if worker_class == "gthread" else 0)
+    env = {
+        **os.environ,
+        "SUPABASE_URL": stub_url,
+        "SUPABASE_KEY": STUB_KEY,
+        "SCHEDULER_ENABLED": "0",
+        "PORT": str(port),
+        "WEB_CONCURRENCY": str(args.workers),
+        "GUNICORN_WORKER_CLASS": worker_class,
+        # gunicorn silently upgrades sync workers to gthread when threads > 1
+        "GUNICORN_THREADS": str(args.threads if worker_class == "gthread" else 1),
+    }
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app:app"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        wait_for(f"{base_url}/health")
+        return run_load(base_url, args.requests, args.concurrency)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per stub query")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+
+    stub = start_stub(args.latency)
+    stub_url = f"http://127.0.0.1:{stub.server_address[1]}"
+    print(f"{args.requests} requests, concurrency {args.concurrency}, "
+          f"{args.workers} workers, {args.latency * 1000:.0f} ms per query")
+    for worker_class in ("sync", "gthread"):
+        print(f"{worker_class:>8}: {bench_mode(worker_class, stub_url, args)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,222 @@
-from supabase import create_client
+from psycopg2.pool import ThreadedConnectionPool
+from psycopg2.extras import RealDictCursor
+import datetime
 import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-# Initialize Supabase client
+import threading
+from svc import cache, metrics, storage
+from svc.transport import pool_stats
+from svc.models import columns
+
+# Storage backend: Supabase, or a local SQLite file (see svc/storage.py).
+# .env is loaded once, by app.py
+STORAGE_BACKEND = storage.STORAGE_BACKEND
 url = os.getenv("SUPABASE_URL")
 key = os.getenv("SUPABASE_KEY")
 
-if not url or not key:
+if STORAGE_BACKEND == "supabase" and (not url or not key):
     raise ValueError("SUPABASE_URL and SUPABASE_KEY environment variables are required")
 
-supabase = create_client(url, key)
+
+
+def _create_client():
+    """The storage client for STORAGE_BACKEND; returns (http_client or None, client)"""
+    if STORAGE_BACKEND == "supabase":
+        return storage.create_supabase(url, key)
+    if STORAGE_BACKEND == "sqlite":
+        return None, storage.SQLiteStorage(storage.STORAGE_PATH)
+    raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+
+
+_http_client = None
+_client = None
+_client_lock = threading.Lock()
+
+
+def _get_client():
+    """Create the storage client on first use"""
+    global _http_client, _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _http_client, _client = _create_client()
+    return _client
+
+# Direct Postgres connection used for raw SQL (aggregates in svc/calc.py).
+# Use the Supabase connection pooler URI here.
+DATABASE_URL = os.getenv("DATABASE_URL")
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "5"))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Maximum number of rows sent in a single upsert request
+UPSERT_CHUNK_SIZE = int(os.getenv("UPSERT_CHUNK_SIZE", "500"))
+
+# Rows deleted per request (ids go in the query string)
+DELETE_CHUNK_SIZE = 100
+
+# Rows fetched per request when paging through a register for export
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "1000"))
+
+
+class RecordValidationError(ValueError):
+    """Raised when one or more posted records are invalid"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"{len(errors)} invalid record(s)")
+
+
+def _parse_date(value):
+    """A posted 'YYYY-MM-DD' date (or ISO timestamp), checked; raises ValueError otherwise"""
+    try:
+        if not isinstance(value, str):
+            raise ValueError
+        return datetime.datetime.fromisoformat(value).date().isoformat()
+    except ValueError:
+        raise ValueError(f"Invalid date {value!r}") from None
+
+
+def _build_rows(records, build_row, deleted=()):
+    """
+    Build upsert rows from posted records, and key dicts from the posted
+    `deleted` dates (or dicts of key columns), collecting per-row errors.
+    Every date is checked and normalised to 'YYYY-MM-DD'.
+    """
+    rows = []
+    errors = []
+    for index, record in enumerate(records):
+        try:
+            row = build_row(record)
+            row["date"] = _parse_date(row["date"])
+            rows.append(row)
+        except KeyError as e:
+            errors.append({"index": index, "date": record.get("date"), "error": f"Missing field {e}"})
+        except (TypeError, ValueError, AttributeError) as e:
+            date = record.get("date") if isinstance(record, dict) else None
+            errors.append({"index": index, "date": date, "error": str(e)})
+
+    keys = []
+    for index, key in enumerate(deleted):
+        key = dict(key) if isinstance(key, dict) else {"date": key}
+        try:
+            key["date"] = _parse_date(key["date"])
+            keys.append(key)
+        except KeyError as e:
+            errors.append({"deleted": index, "date": None, "error": f"Missing field {e}"})
+        except ValueError as e:
+            errors.append({"deleted": index, "date": key["date"], "error": str(e)})
+
+    if errors:
+        raise RecordValidationError(errors)
+    return rows, keys
+
+
+def _bulk_upsert(table, rows, on_conflict):
+    """
+    Upsert many rows with as few requests as possible.
+    Rows are de-duplicated on the conflict key (last one wins, like the
+    old row-by-row loop) and grouped by column set, because PostgREST
+    expects every object in a bulk request to carry the same keys.
+    """
+    key_columns = on_conflict.split(",")
+    unique_rows = {}
+    for row in rows:
+        unique_rows[tuple(row[c] for c in key_columns)] = row
+
+    groups = {}
+    for row in unique_rows.values():
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+
+    saved = []
+    try:
+        for group in groups.values():
+            for start in range(0, len(group), UPSERT_CHUNK_SIZE):
+                chunk = group[start:start + UPSERT_CHUNK_SIZE]
+                result = _get_client().table(table).upsert(chunk, on_conflict=on_conflict).execute()
+                saved.extend(result.data or [])
+    finally:
+        # Earlier chunks may have been written even if a later one failed
+        dates_by_user = {}
+        for row in unique_rows.values():
+            dates_by_user.setdefault(row["user_id"], set()).add(row["date"])
+        for user_id, dates in dates_by_user.items():
+            cache.invalidate_dates(table, user_id, dates)
+    return saved
+
+
+def _same_value(stored, posted):
+    if isinstance(stored, (int, float)) and isinstance(posted, (int, float)):
+        return float(stored) == float(posted)
+    return stored == posted
+
+
+def _key_part(column, value):
+    return str(value)[:10] if column == "date" else str(value)
+
+
+def _row_key(row, key_columns):
+    return tuple(_key_part(c, row[c]) for c in key_columns)
+
+
+def _save_sheet(table, user_id, rows, on_conflict, deleted=()):
+    """
+    Write only what differs from the stored sheet. Posted rows are compared
+    column by column with a fresh read of the months they fall in; unchanged
+    rows are skipped, and `deleted` keys (a date, or a dict of key columns)
+    are removed if they exist. Both come from _build_rows(), so every date
+    is a valid 'YYYY-MM-DD'. Returns per-kind row counts and the dates
+    touched.
+    """
+    key_columns = [c for c in on_conflict.split(",") if c != "user_id"]
+
+    months = {(int(r["date"][:4]), int(r["date"][5:7])) for r in [*rows, *deleted]}
+    stored = {}
+    for year, month in months:
+        for r in _MONTH_FETCHERS[table](user_id, year, month):
+            stored[_row_key(r, key_columns)] = r
+
+    inserted = updated = 0
+    changed = {}
+    for row in rows:
+        key = _row_key(row, key_columns)
+        current = stored.get(key)
+        if current is None:
+            inserted += key not in changed
+        elif all(_same_value(current.get(c), v) for c, v in row.items() if c != "user_id" and c not in key_columns):
+            continue
+        else:
+            updated += key not in changed
+        changed[key] = row
+
+    # A deleted key may leave out key columns, e.g. a bare date deletes every grade
+    def is_deleted(key):
+        return any(
+            all(key[i] == _key_part(c, d[c]) for i, c in enumerate(key_columns) if c in d)
+            for d in deleted
+        )
+
+    doomed = [r for key, r in stored.items() if key not in changed and is_deleted(key)]
+
+    if changed:
+        _bulk_upsert(table, list(changed.values()), on_conflict)
+    if doomed:
+        try:
+            ids = [r["id"] for r in doomed]
+            for start in range(0, len(ids), DELETE_CHUNK_SIZE):
+                _get_client().table(table).delete().in_("id", ids[start:start + DELETE_CHUNK_SIZE]).execute()
+        finally:
+            cache.invalidate_dates(table, user_id, [r["date"] for r in doomed])
+
+    dates = sorted({str(r["date"])[:10] for r in [*changed.values(), *doomed]})
+    return {
+        "inserted": inserted,
+        "updated": updated,
+        "deleted": len(doomed),
+        "unchanged": len(rows) - len(changed),
+        "dates": dates,
+    }
 
 
 def insert_egg_record(
@@ -27,7 +232,7 @@ def insert_egg_record(
 ):
     """Insert or update egg/banana record"""
     try:
-        result = supabase.table("egg").upsert(
+        result = _get_client().table("egg").upsert(
             {
                 "user_id": user_id,
                 "date": date,
@@ -42,6 +247,7 @@ def insert_egg_record(
             on_conflict="user_id,date"
         ).execute()
 
+        cache.invalidate_dates("egg", user_id, [date])
         return result.data[0] if result.data else None
 
     except Exception as e:
@@ -49,8 +255,36 @@ def insert_egg_record(
         raise
 
 
+def upsert_egg_records(user_id, records, deleted=()):
+    """Write the changed rows of a batch of egg/banana records; returns row counts"""
+    def build_row(r):
+        return {
+            "user_id": user_id,
+            "date": r["date"],
+            "payer": r.get("payer"),
+            "egg_m": r.get("egg_m", 0),
+            "egg_f": r.get("egg_f", 0),
+            "banana_m": r.get("banana_m", 0),
+            "banana_f": r.get("banana_f", 0),
+            "egg_price": r.get("egg_price", 6),
+            "banana_price": r.get("banana_price", 6),
+        }
+
+    rows, deleted = _build_rows(records, build_row, deleted)
+    try:
+        return _save_sheet("egg", user_id, rows, "user_id,date", deleted)
+    except Exception as e:
+        print(f"Error upserting egg records: {e}")
+        raise
+
+
 def get_egg_records(user_id, year, month):
     """Get egg records for user by year and month"""
+    return cache.get_month("egg", user_id, year, month, lambda: _fetch_egg_records(user_id, year, month))
+
+
+def _fetch_egg_records(user_id, year, month):
+    """Fetch egg records for user by year and month from Supabase"""
     try:
         start_date = f"{year}-{month:02d}-01"
         end_date = (
@@ -60,8 +294,8 @@ def get_egg_records(user_id, year, month):
         )
 
         result = (
-            supabase.table("egg")
-            .select("*")
+            _get_client().table("egg")
+            .select(columns("egg"))
             .eq("user_id", user_id)
             .gte("date", start_date)
             .lt("date", end_date)
@@ -86,7 +320,7 @@ def insert_meal_plan(
     """Insert or update meal plan"""
     try:
         result = (
-            supabase
+            _get_client()
             .table("meal_plans")
             .upsert(
                 {
@@ -102,6 +336,7 @@ def insert_meal_plan(
             .execute()
         )
 
+        cache.invalidate_dates("meal_plans", user_id, [date])
         return result.data[0] if result.data else None
 
     except Exception as e:
@@ -109,8 +344,33 @@ def insert_meal_plan(
         raise
 
 
+def upsert_meal_plans(user_id, meals, deleted=()):
+    """Write the changed rows of a batch of meal plans; returns row counts"""
+    def build_row(m):
+        return {
+            "user_id": user_id,
+            "date": m["date"],
+            "cnt_1to5": m.get("cnt_1to5", 0),
+            "cnt_6to10": m.get("cnt_6to10", 0),
+            "meal_type": m["meal_type"],      # rice / wheat
+            "has_pulses": m.get("has_pulses", False),
+        }
+
+    rows, deleted = _build_rows(meals, build_row, deleted)
+    try:
+        return _save_sheet("meal_plans", user_id, rows, "user_id,date", deleted)
+    except Exception as e:
+        print(f"Error upserting meal plans: {e}")
+        raise
+
+
 def get_meal_plans(user_id, year, month):
     """Get meal plans for user by year and month"""
+    return cache.get_month("meal_plans", user_id, year, month, lambda: _fetch_meal_plans(user_id, year, month))
+
+
+def _fetch_meal_plans(user_id, year, month):
+    """Fetch meal plans for user by year and month from Supabase"""
     try:
         start_date = f"{year}-{month:02d}-01"
         end_date = (
@@ -120,9 +380,9 @@ def get_meal_plans(user_id, year, month):
         )
 
         result = (
-            supabase
+            _get_client()
             .table("meal_plans")
-            .select("*")
+            .select(columns("meal_plans"))
             .eq("user_id", user_id)
             .gte("date", start_date)
             .lt("date", end_date)
@@ -139,7 +399,7 @@ def get_meal_plans(user_id, year, month):
 def insert_milk_record(user_id, date, children, milk_open, ragi_open, milk_rcpt, ragi_rcpt, dist_type):
     """Insert or update milk record"""
     try:
-        result = supabase.table("milk").upsert({
+        result = _get_client().table("milk").upsert({
             "user_id": user_id,
             "date": date,
             "children": children,
@@ -149,13 +409,40 @@ def insert_milk_record(user_id, date, children, milk_open, ragi_open, milk_rcpt,
             "ragi_rcpt": ragi_rcpt,
             "dist_type": dist_type
         }, on_conflict="user_id,date").execute()
+        cache.invalidate_dates("milk", user_id, [date])
         return result.data[0] if result.data else None
     except Exception as e:
         print(f"Error inserting milk record: {e}")
         raise e
 
+def upsert_milk_records(user_id, records, deleted=()):
+    """Write the changed rows of a batch of milk records; returns row counts"""
+    def build_row(r):
+        return {
+            "user_id": user_id,
+            "date": r["date"],
+            "children": r.get("children", 0),
+            "milk_open": r.get("milk_open"),
+            "ragi_open": r.get("ragi_open"),
+            "milk_rcpt": r.get("milk_rcpt", 0),
+            "ragi_rcpt": r.get("ragi_rcpt", 0),
+            "dist_type": r.get("dist_type", "milk & ragi"),
+        }
+
+    rows, deleted = _build_rows(records, build_row, deleted)
+    try:
+        return _save_sheet("milk", user_id, rows, "user_id,date", deleted)
+    except Exception as e:
+        print(f"Error upserting milk records: {e}")
+        raise e
+
 def get_milk_records(user_id, year, month):
     """Get milk records for user by year and month"""
+    return cache.get_month("milk", user_id, year, month, lambda: _fetch_milk_records(user_id, year, month))
+
+
+def _fetch_milk_records(user_id, year, month):
+    """Fetch milk records for user by year and month from Supabase"""
     try:
         start_date = f"{year}-{month:02d}-01"
         if month == 12:
@@ -163,7 +450,7 @@ def get_milk_records(user_id, year, month):
         else:
             end_date = f"{year}-{month + 1:02d}-01"
         
-        result = supabase.table("milk").select("*").eq("user_id", user_id).gte("date", start_date).lt("date", end_date).order("date").execute()
+        result = _get_client().table("milk").select(columns("milk")).eq("user_id", user_id).gte("date", start_date).lt("date", end_date).order("date").execute()
         return result.data
     except Exception as e:
         print(f"Error getting milk records: {e}")
@@ -192,15 +479,48 @@ def insert_stock(user_id, date, grade, rice_add, wheat_add, oil_add, pulse_add,
         if pulse_open is not None:
             data["pulse_open"] = pulse_open
 
-        result = supabase.table("stock").upsert(data, on_conflict="user_id,date,grade").execute()
+        result = _get_client().table("stock").upsert(data, on_conflict="user_id,date,grade").execute()
+        cache.invalidate_dates("stock", user_id, [date])
         return result.data[0] if result.data else None
     except Exception as e:
         print(f"Error inserting stock: {e}")
         raise e
 
 
+def upsert_stock_records(user_id, records, deleted=()):
+    """Write the changed rows of a batch of stock records; returns row counts"""
+    def build_row(r):
+        # Openings are null unless entered, so clearing one on the page
+        # brings back the carried balance
+        return {
+            "user_id": user_id,
+            "date": r["date"],
+            "grade": r["grade"],
+            "rice_add": r.get("rice_add", 0),
+            "wheat_add": r.get("wheat_add", 0),
+            "oil_add": r.get("oil_add", 0),
+            "pulse_add": r.get("pulse_add", 0),
+            "rice_open": r.get("rice_open"),
+            "wheat_open": r.get("wheat_open"),
+            "oil_open": r.get("oil_open"),
+            "pulse_open": r.get("pulse_open"),
+        }
+
+    rows, deleted = _build_rows(records, build_row, deleted)
+    try:
+        return _save_sheet("stock", user_id, rows, "user_id,date,grade", deleted)
+    except Exception as e:
+        print(f"Error upserting stock records: {e}")
+        raise e
+
+
 def get_stock_records(user_id, year, month):
     """Get stock records for user by year and month"""
+    return cache.get_month("stock", user_id, year, month, lambda: _fetch_stock_records(user_id, year, month))
+
+
+def _fetch_stock_records(user_id, year, month):
+    """Fetch stock records for user by year and month from Supabase"""
     try:
         start_date = f"{year}-{month:02d}-01"
         if month == 12:
@@ -209,8 +529,8 @@ def get_stock_records(user_id, year, month):
             end_date = f"{year}-{month + 1:02d}-01"
 
         result = (
-            supabase.table("stock")
-            .select("*")
+            _get_client().table("stock")
+            .select(columns("stock"))
             .eq("user_id", user_id)
             .gte("date", start_date)
             .lt("date", end_date)
@@ -224,47 +544,192 @@ def get_stock_records(user_id, year, month):
         raise e
 
 
+def get_month_sheet(table, user_id, year, month):
+    """Rows of a month sheet with their version tag, for conditional GETs"""
+    fetch = _MONTH_FETCHERS[table]
+    return cache.get_month_entry(table, user_id, year, month, lambda: fetch(user_id, year, month))
+
+
+_MONTH_FETCHERS = {
+    "meal_plans": _fetch_meal_plans,
+    "stock": _fetch_stock_records,
+    "milk": _fetch_milk_records,
+    "egg": _fetch_egg_records,
+}
+
+
+def get_stock_closings(user_id, periods):
+    """Get persisted month-end stock closings for the given periods (YYYY-MM-01)"""
+    try:
+        result = (
+            _get_client().table("stock_closing")
+            .select("*")
+            .eq("user_id", user_id)
+            .in_("period", periods)
+            .execute()
+        )
+        return result.data
+    except Exception as e:
+        print(f"Error getting stock closings: {e}")
+        raise e
+
+
+def get_later_closings(table, user_id, period):
+    """Get persisted closings (stock_closing / milk_closing) for months after the given period"""
+    try:
+        result = (
+            _get_client().table(table)
+            .select("period")
+            .eq("user_id", user_id)
+            .gt("period", period)
+            .order("period")
+            .execute()
+        )
+        return result.data
+    except Exception as e:
+        print(f"Error getting later closings: {e}")
+        raise e
+
+
+def upsert_stock_closings(user_id, period, closing):
+    """Insert or update the month-end stock closing for each grade"""
+    try:
+        rows = [
+            {
+                "user_id": user_id,
+                "period": period,
+                "grade": grade,
+                **{f"{commodity}_close": value for commodity, value in balances.items()},
+            }
+            for grade, balances in closing.items()
+        ]
+        result = _get_client().table("stock_closing").upsert(rows, on_conflict="user_id,period,grade").execute()
+        return result.data
+    except Exception as e:
+        print(f"Error upserting stock closings: {e}")
+        raise e
+
+
+def get_milk_closings(user_id, periods):
+    """Get persisted month-end milk/ragi closings for the given periods (YYYY-MM-01)"""
+    try:
+        result = (
+            _get_client().table("milk_closing")
+            .select("*")
+            .eq("user_id", user_id)
+            .in_("period", periods)
+            .execute()
+        )
+        return result.data
+    except Exception as e:
+        print(f"Error getting milk closings: {e}")
+        raise e
+
+
+def upsert_milk_closing(user_id, period, closing):
+    """Insert or update the month-end milk/ragi closing"""
+    try:
+        result = _get_client().table("milk_closing").upsert({
+            "user_id": user_id,
+            "period": period,
+            "milk_close": closing["milk"],
+            "ragi_close": closing["ragi"],
+        }, on_conflict="user_id,period").execute()
+        return result.data[0] if result.data else None
+    except Exception as e:
+        print(f"Error upserting milk closing: {e}")
+        raise e
+
+
+
+def _get_pool():
+    """Create the Postgres connection pool on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                if not DATABASE_URL:
+                    raise ValueError("DATABASE_URL environment variable is required for raw SQL queries")
+                _pool = ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, dsn=DATABASE_URL)
+    return _pool
+
+
+def _reinit_after_fork():
+    """
+    Give a forked gunicorn worker its own connections. Sockets opened in the
+    parent (e.g. with preload_app) must not be shared between workers; the
+    worker creates fresh clients on first use.
+    """
+    global _http_client, _client, _client_lock, _pool, _pool_lock
+    _http_client = _client = None
+    _client_lock = threading.Lock()
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reinit_after_fork)
+
+
+def transport_stats():
+    """Supabase HTTP pool and Postgres pool usage for this worker"""
+    http_client = _http_client
+    stats = {"pid": os.getpid(), "supabase": pool_stats(http_client) if http_client else None, "postgres": None}
+    pool = _pool
+    if pool is not None:
+        # ThreadedConnectionPool keeps checked-out and idle connections in _used / _pool
+        stats["postgres"] = {
+            "min": DB_POOL_MIN,
+            "max": DB_POOL_MAX,
+            "in_use": len(pool._used),
+            "idle": len(pool._pool),
+        }
+    return stats
+
+
+def raw_sql_available():
+    """Whether query_db() has a database to run on"""
+    return STORAGE_BACKEND == "sqlite" or bool(DATABASE_URL)
+
 
 def query_db(query, args=(), one=False):
     """
-    Execute raw SQL queries using Supabase
-    This maintains compatibility with existing code while using Supabase
+    Execute a parameterized SQL query directly against Postgres (or the
+    SQLite file with STORAGE_BACKEND=sqlite).
+    Aggregates run on the database server; only the result rows come back.
     """
     try:
-        # For raw SQL queries, we'll use Supabase's rpc function
-        # Note: This requires creating a PostgreSQL function in Supabase
-        # For now, we'll use the table operations where possible
-        
-        # This is a simplified approach - in production you might want to 
-        # create stored procedures in Supabase for complex queries
+        result = _execute_raw_query(query, args)
         if query.strip().upper().startswith('SELECT') or 'RETURNING' in query.upper():
-            # For SELECT queries, we'll need to adapt based on the specific query
-            # This is a placeholder - you'll need to implement specific query handling
-            result = _execute_raw_query(query, args)
             return (result[0] if result else None) if one else result
-        else:
-            # For INSERT/UPDATE/DELETE
-            result = _execute_raw_query(query, args)
-            return result
+        return result
     except Exception as e:
         print(f"Database error: {e}")
         raise e
 
 def _execute_raw_query(query, args):
-    """
-    Execute raw SQL query using Supabase
-    Note: This is a simplified implementation
-    """
-    # This is a placeholder implementation
-    # In practice, you might need to use Supabase's REST API or create RPC functions
-    # For now, we'll return empty results to maintain compatibility
-    return []
+    """Run a query on a pooled connection and return rows as dicts"""
+    if STORAGE_BACKEND == "sqlite":
+        return _get_client().query(query, args)
+    pool = _get_pool()
+    conn = pool.getconn()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur, metrics.timed("db", "sql", "SQL"):
+            cur.execute(query, args)
+            rows = cur.fetchall() if cur.description else []
+        conn.commit()
+        return [dict(r) for r in rows]
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn, close=bool(conn.closed))
 
 # Supabase table operation functions
 def insert_user(email, name, google_id):
     """Insert a new user"""
     try:
-        result = supabase.table("users").insert({
+        result = _get_client().table("users").insert({
             "email": email,
             "name": name,
             "google_id": google_id
@@ -274,19 +739,98 @@ def insert_user(email, name, google_id):
         print(f"Error inserting user: {e}")
         raise e
 
+def iter_register_rows(table, user_id, start_date, end_date, page_size=EXPORT_PAGE_SIZE):
+    """
+    Yield a user's rows of a register with start_date <= date < end_date,
+    in (date, id) order. Pages are keyed on the last row seen rather than
+    an offset, so every page is an index range scan however far in it is.
+    """
+    try:
+        last = None
+        while True:
+            query = (
+                _get_client().table(table)
+                .select("*")
+                .eq("user_id", user_id)
+                .gte("date", start_date)
+                .lt("date", end_date)
+            )
+            if last:
+                query = query.or_(f"date.gt.{last['date']},and(date.eq.{last['date']},id.gt.{last['id']})")
+            result = query.order("date").order("id").limit(page_size).execute()
+
+            yield from result.data
+            if len(result.data) < page_size:
+                return
+            last = result.data[-1]
+    except Exception as e:
+        print(f"Error exporting {table}: {e}")
+        raise e
+
+def get_user_ids(page_size=1000):
+    """Get the IDs of all users"""
+    try:
+        ids = []
+        while True:
+            result = (
+                _get_client().table("users")
+                .select("id")
+                .order("id")
+                .range(len(ids), len(ids) + page_size - 1)
+                .execute()
+            )
+            ids.extend(r["id"] for r in result.data)
+            if len(result.data) < page_size:
+                return ids
+    except Exception as e:
+        print(f"Error getting user ids: {e}")
+        raise e
+
 def get_user_by_google_id(google_id):
     """Get user by Google ID"""
     try:
-        result = supabase.table("users").select("*").eq("google_id", google_id).execute()
+        result = _get_client().table("users").select("*").eq("google_id", google_id).execute()
         return result.data[0] if result.data else None
     except Exception as e:
         print(f"Error getting user: {e}")
         raise e
 
+def get_user_with_subscription(google_id):
+    """
+    Get user by Google ID together with their active subscription
+    (latest end_date) in one request. The subscription is None if there is none.
+    """
+    try:
+        result = (
+            _get_client().table("users")
+            .select(f"*, subscriptions({columns('subscriptions')})")
+            .eq("google_id", google_id)
+            .eq("subscriptions.status", "active")
+            .gte("subscriptions.end_date", "now()")
+            .order("end_date", desc=True, foreign_table="subscriptions")
+            .limit(1, foreign_table="subscriptions")
+            .execute()
+        )
+        if not result.data:
+            return None, None
+        user = result.data[0]
+        subs = user.pop("subscriptions", None) or []
+        sub = subs[0] if subs else None
+        cache.store_subscription("active", user["id"], sub)
+        return user, sub
+    except Exception as e:
+        print(f"Error getting user with subscription: {e}")
+        raise e
+
 def get_active_subscription(user_id):
     """Get active subscription for user"""
+    return cache.get_subscription("active", user_id, lambda: _fetch_active_subscription(user_id))
+
+
+def _fetch_active_subscription(user_id):
+    """Fetch active subscription for user from Supabase"""
     try:
-        result = supabase.table("subscriptions").select("*").eq("user_id", user_id).eq("status", "active").gte("end_date", "now()").order("end_date", desc=True).limit(1).execute()
+        result = _get_client().table("subscriptions").select(columns("subscriptions")).eq("user_id", user_id).eq("status", "active").gte("end_date", "now()").order("end_date", desc=True).limit(1).execute()
         return result.data[0] if result.data else None
     except Exception as e:
         print(f"Error getting subscription: {e}")
@@ -296,7 +840,7 @@ def get_active_subscription(user_id):
 def insert_payment(user_id, order_id, plan, amount, status="pending"):
     """Insert payment record"""
     try:
-        result = supabase.table("payments").insert({
+        result = _get_client().table("payments").insert({
             "user_id": user_id,
             "order_id": order_id,
             "plan": plan,
@@ -311,29 +855,61 @@ def insert_payment(user_id, order_id, plan, amount, status="pending"):
 def get_payment_by_order_id(order_id):
     """Get payment by order ID"""
     try:
-        result = supabase.table("payments").select("*").eq("order_id", order_id).execute()
+        result = _get_client().table("payments").select("*").eq("order_id", order_id).execute()
         return result.data[0] if result.data else None
     except Exception as e:
         print(f"Error getting payment: {e}")
         raise e
 
-def update_payment_status(order_id, status, pp_data=None):
-    """Update payment status"""
+def get_pending_payments(created_before, created_after, limit):
+    """Payments still pending that were created in a time window, oldest first"""
+    try:
+        result = _get_client().table("payments").select("order_id,status,created_at").in_("status", ["pending", "PENDING"]).lt("created_at", created_before.isoformat()).gte("created_at", created_after.isoformat()).order("created_at").limit(limit).execute()
+        return result.data or []
+    except Exception as e:
+        print(f"Error getting pending payments: {e}")
+        raise e
+
+def update_payment_status(order_id, status, pp_data=None, unless_status=None):
+    """
+    Update payment status, leaving it alone if it is currently `unless_status`.
+    pp_data is the gateway's JSON-safe response, stored as jsonb.
+    """
     try:
         data = {"status": status, "updated_at": "now()"}
         if pp_data:
             data["pp_data"] = pp_data
             
-        result = supabase.table("payments").update(data).eq("order_id", order_id).execute()
+        query = _get_client().table("payments").update(data).eq("order_id", order_id)
+        if unless_status:
+            query = query.neq("status", unless_status)
+        result = query.execute()
         return result.data[0] if result.data else None
     except Exception as e:
         print(f"Error updating payment: {e}")
         raise e
 
+def complete_payment(order_id, pp_data=None):
+    """
+    Mark a payment COMPLETED and create its subscription in one transaction
+    (sql/complete_payment.sql). Returns {"status": "completed" |
+    "already_completed" | "not_found", "user_id", "payment_id",
+    "subscription_id"}.
+    """
+    try:
+        result = _get_client().rpc("complete_payment", {"p_order_id": order_id, "p_pp_data": pp_data}).execute()
+        outcome = result.data or {"status": "not_found"}
+        if outcome["status"] == "completed":
+            cache.invalidate_subscription(outcome["user_id"])
+        return outcome
+    except Exception as e:
+        print(f"Error completing payment: {e}")
+        raise e
+
 def insert_subscription(user_id, payment_id, plan_type, start_date, end_date, status="active"):
     """Insert subscription record"""
     try:
-        result = supabase.table("subscriptions").insert({
+        result = _get_client().table("subscriptions").insert({
             "user_id": user_id,
             "payment_id": payment_id,
             "plan_type": plan_type,
@@ -341,6 +917,7 @@ def insert_subscription(user_id, payment_id, plan_type, start_date, end_date, st
             "end_date": end_date.isoformat(),
             "status": status
         }).execute()
+        cache.invalidate_subscription(user_id)
         return result.data[0] if result.data else None
     except Exception as e:
         print(f"Error inserting subscription: {e}")
@@ -348,8 +925,13 @@ def insert_subscription(user_id, payment_id, plan_type, start_date, end_date, st
 
 def get_subscription_by_user_id(user_id):
     """Get active subscription by user ID"""
+    return cache.get_subscription("latest", user_id, lambda: _fetch_subscription_by_user_id(user_id))
+
+
+def _fetch_subscription_by_user_id(user_id):
+    """Fetch latest created active subscription by user ID from Supabase"""
     try:
-        result = supabase.table("subscriptions").select("*").eq("user_id", user_id).eq("status", "active").gte("end_date", "now()").order("created_at", desc=True).limit(1).execute()
+        result = _get_client().table("subscriptions").select(columns("subscriptions")).eq("user_id", user_id).eq("status", "active").gte("end_date", "now()").order("created_at", desc=True).limit(1).execute()
         return result.data[0] if result.data else None
     except Exception as e:
         print(f"Error getting subscription: {e}")
@@ -358,7 +940,7 @@ def get_subscription_by_user_id(user_id):
 def get_subscription_history(user_id):
     """Get subscription history for user"""
     try:
-        result = supabase.table("subscriptions").select("*, payments(order_id, amount, status)").eq("user_id", user_id).order("created_at", desc=True).execute()
+        result = _get_client().table("subscriptions").select(f"{columns('subscriptions')}, payments(order_id, amount, status)").eq("user_id", user_id).order("created_at", desc=True).execute()
         return result.data
     except Exception as e:
         print(f"Error getting subscription history: {e}")
@@ -366,17 +948,14 @@ def get_subscription_history(user_id):
 
 def check_active_subscription(user_id):
     """Check if user has active subscription"""
-    try:
-        result = supabase.table("subscriptions").select("id").eq("user_id", user_id).eq("status", "active").gte("end_date", "now()").limit(1).execute()
-        return len(result.data) > 0
-    except Exception as e:
-        print(f"Error checking subscription: {e}")
-        raise e
+    return get_active_subscription(user_id) is not None
 
 def expire_old_subscriptions():
     """Expire old subscriptions"""
     try:
-        result = supabase.table("subscriptions").update({"status": "expired"}).eq("status", "active").lt("end_date", "now()").execute()
+        result = _get_client().table("subscriptions").update({"status": "expired"}).eq("status", "active").lt("end_date", "now()").execute()
+        for user_id in {r["user_id"] for r in result.data or []}:
+            cache.invalidate_subscription(user_id)
         return result.data
     except Exception as e:
         print(f"Error expiring subscriptions: {e}")
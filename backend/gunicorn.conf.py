@@ -0,0 +1,52 @@
+"""
+Gunicorn settings, picked up automatically by `gunicorn app:app`.
+
+Request handling is I/O bound (Supabase and PhonePe calls), so the default
+mode is the threaded worker: each process keeps many requests in flight
+while they wait on the network. Set GUNICORN_WORKER_CLASS=sync to get the
+old one-request-per-process behaviour (see bench/worker_modes.py).
+
+The app is imported once in the master (preload_app) and workers are forked
+from it, so a cold start pays the imports once rather than once per worker.
+Supabase and PhonePe clients are created in each worker on first use, never
+in the master. Set GUNICORN_PRELOAD=0 to import the app in every worker
+instead (see bench/startup.py).
+
+WEBHOOK_QUEUE_PATH must point at a file on a persistent volume: the queue
+holds webhooks PhonePe has already been told were received, and queued
+ledger refreshes (svc/webhook_queue.py). The server refuses to start
+without it.
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.getenv("GUNICORN_THREADS", "16"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+
+def on_starting(server):
+    # Acknowledged webhooks must outlive a restart
+    if not os.getenv("WEBHOOK_QUEUE_PATH"):
+        raise RuntimeError("WEBHOOK_QUEUE_PATH is not set; point it at a file on a persistent volume")
+    # A per-process cache would keep serving sheets another worker has saved
+    from svc import cache
+    if cache.backend.name == "memory" and server.cfg.workers > 1:
+        raise RuntimeError("CACHE_BACKEND=memory needs WEB_CONCURRENCY=1; use the sqlite backend")
+    # Metric snapshots left by the previous run would be added to this one's
+    from svc import metrics
+    metrics.clear()
+
+
+def post_worker_init(worker):
+    # After gunicorn has reset the worker's signal handlers
+    from svc import profiler
+    profiler.install_signal_handler()
+    # In the worker, not at import: with preload_app that is the master,
+    # and the scheduler's thread would not survive the fork
+    from svc.jobs import start_scheduler
+    start_scheduler()
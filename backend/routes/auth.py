@@ -1,16 +1,12 @@
-from flask import Blueprint, request, jsonify
-from google.oauth2 import id_token
-from google.auth.transport import requests
+from flask import Blueprint, request, jsonify, g
 import uuid
 import os
-from db import get_user_by_google_id, insert_user, get_active_subscription
-
-from dotenv import load_dotenv
-
-load_dotenv()
-
+from db import get_user_with_subscription, get_active_subscription, insert_user
+from svc.google_auth import verifier
+from svc.session import session_guard, issue_token
 
 auth_bp = Blueprint('auth', __name__)
+auth_bp.before_request(session_guard(exempt=('auth.login',)))
 
 @auth_bp.route('/login', methods=['POST'])
 def login():
@@ -29,34 +25,29 @@ def login():
             # print("ERROR: GOOGLE_CLIENT_ID environment variable not set")
             return jsonify({'error': 'Server configuration error'}), 500
 
-        # Verify Google token
-        id_info = id_token.verify_oauth2_token(
-            token, 
-            requests.Request(), 
-            client_id
-        )
+        # Verify Google token locally against cached Google certificates
+        id_info = verifier.verify(token, client_id)
 
         google_id = id_info['sub']
         email = id_info['email']
         name = id_info.get('name')
 
-        # Check if user exists
-        user = get_user_by_google_id(google_id)
+        # Check if user exists, with their active subscription
+        user, sub = get_user_with_subscription(google_id)
 
         if not user:
             # Create new user
             user = insert_user(email, name, google_id)
-        
-        # Check active subscription
-        sub = get_active_subscription(user['id'])
 
+        subscription_end = sub['end_date'] if sub else None
         return jsonify({
+            'token': issue_token(user['id'], subscription_end),
             'user': {
                 'id': str(user['id']),
                 'email': user['email'],
                 'name': user['name'],
                 'is_subscribed': bool(sub),
-                'subscription_end': sub['end_date'] if sub else None
+                'subscription_end': subscription_end
             }
         })
 
@@ -65,3 +56,14 @@ def login():
     except Exception as e:
         print(f"Auth error: {e}")
         return jsonify({'error': 'Authentication failed'}), 500
+
+@auth_bp.route('/refresh', methods=['POST'])
+def refresh():
+    """Reissue the session token, e.g. after a payment went through"""
+    sub = get_active_subscription(g.user_id)
+    subscription_end = sub['end_date'] if sub else None
+    return jsonify({
+        'token': issue_token(g.user_id, subscription_end),
+        'is_subscribed': bool(sub),
+        'subscription_end': subscription_end
+    })
@@ -0,0 +1,62 @@
+from flask import Blueprint, Response, request, jsonify, g
+from svc.session import session_guard, attach_refreshed_token
+from db import iter_register_rows, EXPORT_PAGE_SIZE
+from svc.export import EXPORT_TABLES, EXPORT_FORMATS, csv_chunks, ndjson_chunks
+
+export_bp = Blueprint('export', __name__)
+export_bp.before_request(session_guard(require_subscription=True))
+export_bp.after_request(attach_refreshed_token)
+
+
+def _month_start(value, next_month=False):
+    """'YYYY-MM' -> first day of that month (or of the month after it)"""
+    year, month = (int(part) for part in value.split('-'))
+    if not 1 <= month <= 12:
+        raise ValueError(f"Invalid month: {value}")
+    if next_month:
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return f"{year:04d}-{month:02d}-01"
+
+
+@export_bp.route('/<register>', methods=['GET'])
+def export_register(register):
+    """
+    Stream a register (or 'all' of them) for ?from=YYYY-MM&to=YYYY-MM,
+    both months inclusive, as ?format=csv or ndjson.
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': 'Format must be csv or ndjson'}), 400
+    if register != 'all' and register not in EXPORT_TABLES:
+        return jsonify({'error': 'Unknown register'}), 404
+    if register == 'all' and fmt == 'csv':
+        return jsonify({'error': 'CSV exports one register at a time; use ndjson for all'}), 400
+
+    try:
+        start_date = _month_start(request.args['from'])
+        last_month = _month_start(request.args['to'])
+        end_date = _month_start(request.args['to'], next_month=True)
+    except (KeyError, ValueError):
+        return jsonify({'error': 'from and to must be given as YYYY-MM'}), 400
+    if start_date >= end_date:
+        return jsonify({'error': 'from must not be after to'}), 400
+
+    user_id = g.user_id
+    names = list(EXPORT_TABLES) if register == 'all' else [register]
+    registers = [
+        (name, iter_register_rows(EXPORT_TABLES[name], user_id, start_date, end_date))
+        for name in names
+    ]
+
+    if fmt == 'csv':
+        chunks = csv_chunks(registers[0][1], EXPORT_PAGE_SIZE)
+    else:
+        chunks = ndjson_chunks(registers, EXPORT_PAGE_SIZE)
+
+    # From the parsed months: int() lets whitespace in the raw values through
+    filename = f"MDM_{register}_{start_date[:7]}_{last_month[:7]}.{fmt}"
+    return Response(
+        chunks,
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+    )
@@ -1,47 +1,38 @@
-from flask import Blueprint, request, jsonify
-from db import get_meal_plans, insert_meal_plan
-from datetime import datetime
+from flask import Blueprint, request, jsonify, g
+from svc.models import dump_rows
+from svc.conditional import conditional_json
+from svc.session import session_guard, attach_refreshed_token
+from db import get_month_sheet, upsert_meal_plans, RecordValidationError
+from svc.ledger import refresh_saved_months
 
 meal_bp = Blueprint('meal', __name__)
+meal_bp.before_request(session_guard(require_subscription=True))
+meal_bp.after_request(attach_refreshed_token)
 
 @meal_bp.route('/<int:year>/<int:month>', methods=['GET'])
 def get_meals(year, month):
-    user_id = request.args.get('user_id')
-    if not user_id:
-        return jsonify({'error': 'User ID required'}), 400
+    user_id = g.user_id
 
-    meals = get_meal_plans(user_id, year, month)
+    meals, etag = get_month_sheet('meal_plans', user_id, year, month)
 
-    if meals:
-        for meal in meals:
-            meal['id'] = str(meal['id'])
-            meal['user_id'] = str(meal['user_id'])
-            meal['date'] = meal['date'] if isinstance(meal['date'], str) else meal['date'].isoformat()
-
-    return jsonify(meals or [])
+    return conditional_json(etag, lambda: dump_rows('meal_plans', meals))
 
 
 @meal_bp.route('/save', methods=['POST'])
 def save_meals():
     data = request.json
-    user_id = data.get('user_id')
+    user_id = g.user_id
     meals = data.get('meals', [])
-
-    if not user_id:
-        return jsonify({'error': 'User ID required'}), 400
+    deleted = list(data.get('deleted') or [])
 
     try:
-        for meal in meals:
-            insert_meal_plan(
-                user_id=user_id,
-                date=meal['date'],
-                cnt_1to5=meal.get('cnt_1to5', 0),
-                cnt_6to10=meal.get('cnt_6to10', 0),
-                meal_type=meal['meal_type'],      # rice / wheat
-                has_pulses=meal.get('has_pulses', False)  # boolean
-            )
-
-        return jsonify({'status': 'success'})
+        counts = upsert_meal_plans(user_id, meals, deleted)
+        # Meal counts drive stock usage
+        refresh_saved_months(user_id, counts['dates'])
+
+        return jsonify({'status': 'success', **counts})
+    except RecordValidationError as e:
+        return jsonify({'error': str(e), 'rows': e.errors}), 400
     except Exception as e:
         print("Error saving meals:", e)
         return jsonify({'error': str(e)}), 500
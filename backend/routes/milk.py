@@ -1,63 +1,56 @@
-from flask import Blueprint, request, jsonify
-from db import get_milk_records, insert_milk_record
+from flask import Blueprint, request, jsonify, g
+from svc.models import dump_rows
+from svc.conditional import conditional_json
+from svc.session import session_guard, attach_refreshed_token
+from db import get_month_sheet, upsert_milk_records, RecordValidationError
+from svc.ledger import get_milk_ledger, refresh_saved_months
 
 milk_bp = Blueprint('milk', __name__)
+milk_bp.before_request(session_guard(require_subscription=True))
+milk_bp.after_request(attach_refreshed_token)
 
 @milk_bp.route('/<int:year>/<int:month>', methods=['GET'])
 def get_milk(year, month):
-    user_id = request.args.get('user_id')
-    if not user_id:
-        return jsonify({'error': 'User ID required'}), 400
-
-    records = get_milk_records(user_id, year, month)
-    
-    if records:
-        for r in records:
-            r['id'] = str(r['id'])
-            r['user_id'] = str(r['user_id'])
-            # Handle date formatting
-            if isinstance(r['date'], str):
-                r['date'] = r['date']
-            else:
-                r['date'] = r['date'].isoformat()
-            for key in ['milk_open', 'ragi_open', 'milk_rcpt', 'ragi_rcpt']:
-                if r[key] is not None:
-                    r[key] = float(r[key])
-
-    return jsonify(records or [])
+    user_id = g.user_id
+
+    records, etag = get_month_sheet('milk', user_id, year, month)
+
+    return conditional_json(etag, lambda: dump_rows('milk', records))
 
 @milk_bp.route('/save', methods=['POST'])
 def save_milk():
     data = request.json
-    user_id = data.get('user_id')
+    user_id = g.user_id
     records = data.get('records', [])
-    
-    if not user_id:
-        return jsonify({'error': 'User ID required'}), 400
+    deleted = list(data.get('deleted') or [])
 
     try:
-        for r in records:
-            # Skip rows where all numeric fields are zero and dist_type is default
-            if (
+        # Rows where all numeric fields are zero and dist_type is default
+        # are not stored; if one was stored before, it has been cleared
+        def is_empty(r):
+            return (
                 (r.get('children', 0) == 0) and
-                (r.get('milk_open', 0) == 0) and
-                (r.get('ragi_open', 0) == 0) and
+                not r.get('milk_open') and
+                not r.get('ragi_open') and
                 (r.get('milk_rcpt', 0) == 0) and
                 (r.get('ragi_rcpt', 0) == 0) and
                 (r.get('dist_type', 'milk & ragi') == 'milk & ragi')
-            ):
-                continue  # skip inserting this row
-
-            insert_milk_record(
-                user_id, r['date'], r.get('children', 0),
-                r.get('milk_open', 0), r.get('ragi_open', 0),
-                r.get('milk_rcpt', 0), r.get('ragi_rcpt', 0),
-                r.get('dist_type', 'milk & ragi')
             )
-            
-        return jsonify({'status': 'success'})
+
+        rows = [r for r in records if not is_empty(r)]
+        deleted += [r.get('date') for r in records if is_empty(r)]
+        counts = upsert_milk_records(user_id, rows, deleted)
+        refresh_saved_months(user_id, counts['dates'], register='milk')
+
+        return jsonify({'status': 'success', **counts})
+    except RecordValidationError as e:
+        return jsonify({'error': str(e), 'rows': e.errors}), 400
     except Exception as e:
         print(f"Error saving milk: {e}")
         return jsonify({'error': str(e)}), 500
 
+@milk_bp.route('/calc/<int:year>/<int:month>', methods=['GET'])
+def get_milk_with_calculations(year, month):
+    user_id = g.user_id
 
+    return jsonify(get_milk_ledger(user_id, year, month))
@@ -0,0 +1,86 @@
+from flask import Blueprint, request, jsonify, g
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import logging
+import os
+from svc.session import session_guard, attach_refreshed_token
+from db import raw_sql_available, get_meal_plans, get_stock_records, get_milk_records, get_egg_records, get_stock_closings, get_milk_closings
+from svc.ledger import build_stock_ledger, build_milk_ledger, closing_periods
+from svc.calc import get_meal_summary, get_stock_closing, get_milk_summary, get_egg_summary
+
+month_bp = Blueprint('month', __name__)
+month_bp.before_request(session_guard(require_subscription=True))
+month_bp.after_request(attach_refreshed_token)
+
+logger = logging.getLogger(__name__)
+
+# Shared by all requests in this worker; each dashboard load uses up to 10
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("MONTH_FANOUT_WORKERS", "16")),
+    thread_name_prefix="month-fanout",
+)
+
+
+def _submit(fn, *args):
+    # In a copy of the request's context, so its queries count towards Server-Timing
+    return _executor.submit(contextvars.copy_context().run, fn, *args)
+
+SUMMARIES = {
+    'meals': get_meal_summary,
+    'stock': get_stock_closing,
+    'milk': get_milk_summary,
+    'egg': get_egg_summary,
+}
+
+@month_bp.route('/<int:year>/<int:month>', methods=['GET'])
+def get_month(year, month):
+    """All four registers for a month, fetched concurrently"""
+    user_id = g.user_id
+
+    periods = closing_periods(year, month)
+    reads = {
+        'meals': _submit(get_meal_plans, user_id, year, month),
+        'stock': _submit(get_stock_records, user_id, year, month),
+        'milk': _submit(get_milk_records, user_id, year, month),
+        'egg': _submit(get_egg_records, user_id, year, month),
+        'stock_closings': _submit(get_stock_closings, user_id, periods),
+        'milk_closings': _submit(get_milk_closings, user_id, periods),
+    }
+    # Summaries are raw SQL; without DATABASE_URL (or the SQLite storage
+    # backend) there is nothing to run them on, and the registers are
+    # still useful without them
+    summaries = {}
+    if raw_sql_available():
+        summaries = {name: _submit(fn, user_id, year, month) for name, fn in SUMMARIES.items()}
+
+    try:
+        data = {name: future.result() for name, future in reads.items()}
+    except Exception as e:
+        logger.error(f"Error loading month: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    summary = dict.fromkeys(SUMMARIES)
+    for name, future in summaries.items():
+        try:
+            summary[name] = future.result()
+        except Exception as e:
+            logger.warning(f"Error computing {name} summary: {e}")
+
+    # Building a ledger may persist its closing, so run both side by side too
+    stock = _submit(build_stock_ledger, user_id, year, month, data['stock'], data['meals'], data['stock_closings'])
+    milk = _submit(build_milk_ledger, user_id, year, month, data['milk'], data['milk_closings'])
+    try:
+        stock, milk = stock.result(), milk.result()
+    except Exception as e:
+        logger.error(f"Error computing month ledgers: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    return jsonify({
+        'year': year,
+        'month': month,
+        'meals': data['meals'],
+        'egg': data['egg'],
+        'milk': milk,
+        'stock': stock,
+        'summary': summary,
+    })
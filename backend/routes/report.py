@@ -0,0 +1,25 @@
+from flask import Blueprint, Response, jsonify, g
+from svc.session import session_guard, attach_refreshed_token
+from svc.report import REPORTS, prepare_report, cached_report, stream_report
+
+report_bp = Blueprint('report', __name__)
+report_bp.before_request(session_guard(require_subscription=True))
+report_bp.after_request(attach_refreshed_token)
+
+@report_bp.route('/<kind>/<int:year>/<int:month>.pdf', methods=['GET'])
+def get_report(kind, year, month):
+    """Vector PDF of a monthly register, streamed as it is drawn"""
+    if kind not in REPORTS:
+        return jsonify({'error': 'Unknown report'}), 404
+    if not 1 <= month <= 12:
+        return jsonify({'error': 'Invalid month'}), 400
+
+    user_id = g.user_id
+    filename, version, sheet = prepare_report(kind, user_id, year, month)
+    headers = {'Content-Disposition': f'inline; filename="{filename}"'}
+
+    pdf = cached_report(kind, user_id, year, month, version)
+    if pdf is not None:
+        return Response(pdf, mimetype='application/pdf', headers=headers)
+
+    return Response(stream_report(kind, user_id, year, month, version, sheet), mimetype='application/pdf', headers=headers)
@@ -1,74 +1,35 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, g
+from svc.models import dump_row, dump_rows
+from svc.session import session_guard
 from db import get_subscription_by_user_id, get_subscription_history, check_active_subscription, expire_old_subscriptions
 from datetime import datetime
 
 sub_bp = Blueprint('sub', __name__)
+# /expire is called by the cron job, not a signed-in user
+sub_bp.before_request(session_guard(exempt=('sub.expire_subscriptions',)))
 
 @sub_bp.route('/active', methods=['GET'])
 def get_active_subscription():
     """Get user's active subscription"""
-    user_id = request.args.get('user_id')
-    if not user_id:
-        return jsonify({'error': 'User ID required'}), 400
+    user_id = g.user_id
     
     sub = get_subscription_by_user_id(user_id)
-    
-    if sub:
-        sub['id'] = str(sub['id'])
-        sub['user_id'] = str(sub['user_id'])
-        sub['payment_id'] = str(sub['payment_id']) if sub.get('payment_id') else None
-        # Handle date formatting - Supabase might return strings
-        if isinstance(sub['start_date'], str):
-            sub['start_date'] = sub['start_date']
-        else:
-            sub['start_date'] = sub['start_date'].isoformat()
-        if isinstance(sub['end_date'], str):
-            sub['end_date'] = sub['end_date']
-        else:
-            sub['end_date'] = sub['end_date'].isoformat()
-        if isinstance(sub['created_at'], str):
-            sub['created_at'] = sub['created_at']
-        else:
-            sub['created_at'] = sub['created_at'].isoformat()
-        
-    return jsonify(sub)
+
+    return Response(dump_row('subscriptions', sub), mimetype='application/json')
 
 @sub_bp.route('/history', methods=['GET'])
 def get_subscription_history_route():
     """Get user's subscription history"""
-    user_id = request.args.get('user_id')
-    if not user_id:
-        return jsonify({'error': 'User ID required'}), 400
+    user_id = g.user_id
     
     subs = get_subscription_history(user_id)
-    
-    if subs:
-        for sub in subs:
-            sub['id'] = str(sub['id'])
-            sub['user_id'] = str(sub['user_id'])
-            sub['payment_id'] = str(sub['payment_id']) if sub.get('payment_id') else None
-            # Handle date formatting
-            if isinstance(sub['start_date'], str):
-                sub['start_date'] = sub['start_date']
-            else:
-                sub['start_date'] = sub['start_date'].isoformat()
-            if isinstance(sub['end_date'], str):
-                sub['end_date'] = sub['end_date']
-            else:
-                sub['end_date'] = sub['end_date'].isoformat()
-            if isinstance(sub['created_at'], str):
-                sub['created_at'] = sub['created_at']
-            else:
-                sub['created_at'] = sub['created_at'].isoformat()
-            
-    return jsonify(subs or [])
+
+    return Response(dump_rows('subscriptions', subs), mimetype='application/json')
 
 @sub_bp.route('/check', methods=['GET'])
 def check_subscription():
     """Check if user has valid subscription"""
-    user_id = request.args.get('user_id')
-    if not user_id:
-        return jsonify({'error': 'User ID required'}), 400
+    user_id = g.user_id
     
     has_active = check_active_subscription(user_id)
     
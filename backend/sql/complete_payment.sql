@@ -0,0 +1,56 @@
+-- COMPLETED transition for a payment in one round-trip: marks the payment
+-- COMPLETED and creates its subscription in a single transaction.
+-- Called by db.complete_payment() through supabase.rpc().
+--
+-- Safe to call any number of times, concurrently: the row lock taken by
+-- the update serialises callers, and the unique index below allows one
+-- subscription per payment. A payment that is already COMPLETED but has
+-- no subscription (e.g. an earlier insert failed) gets one.
+
+-- pp_data used to be text holding json.dumps() output; the function below
+-- and update_payment_status() now write JSON values. Existing text must
+-- parse as JSON.
+alter table payments alter column pp_data type jsonb using pp_data::jsonb;
+
+-- Fails if duplicates already exist; remove them first.
+create unique index if not exists subscriptions_payment_id_key
+    on subscriptions (payment_id) where payment_id is not null;
+
+create or replace function complete_payment(p_order_id text, p_pp_data jsonb default null)
+returns jsonb
+language plpgsql
+as $$
+declare
+    paid payments%rowtype;
+    months integer;
+    subscription_id subscriptions.id%type;
+begin
+    update payments
+       set status = 'COMPLETED',
+           pp_data = coalesce(p_pp_data, pp_data),
+           updated_at = now()
+     where order_id = p_order_id
+       and status is distinct from 'COMPLETED'
+    returning * into paid;
+
+    if not found then
+        select * into paid from payments where order_id = p_order_id;
+        if not found then
+            return jsonb_build_object('status', 'not_found');
+        end if;
+    end if;
+
+    months := case when paid.plan = '3_month' then 3 else 1 end;
+    insert into subscriptions (user_id, payment_id, plan_type, start_date, end_date, status)
+    values (paid.user_id, paid.id, paid.plan, now(), now() + make_interval(days => 30 * months), 'active')
+    on conflict (payment_id) where payment_id is not null do nothing
+    returning id into subscription_id;
+
+    return jsonb_build_object(
+        'status', case when subscription_id is null then 'already_completed' else 'completed' end,
+        'user_id', paid.user_id,
+        'payment_id', paid.id,
+        'subscription_id', subscription_id
+    );
+end;
+$$;
@@ -0,0 +1,10 @@
+-- Month-end milk/ragi balances, one row per user and month.
+-- Written by svc/ledger.py; the next month opens from these rows.
+create table if not exists milk_closing (
+    user_id uuid not null references users (id) on delete cascade,
+    period date not null,              -- first day of the month
+    milk_close numeric(12, 3) not null default 0,
+    ragi_close numeric(12, 3) not null default 0,
+    updated_at timestamptz not null default now(),
+    primary key (user_id, period)
+);
@@ -0,0 +1,134 @@
+-- Schema for STORAGE_BACKEND=sqlite (svc/storage.py): the Supabase tables
+-- with the same columns, conflict keys and indexes. Applied on first use;
+-- every statement is idempotent.
+--
+-- Dates are 'YYYY-MM-DD' text and timestamps ISO 8601 text in UTC, which
+-- sort and compare like the Postgres types. BOOLEAN and JSON columns are
+-- converted back to Python values when read.
+
+create table if not exists users (
+    id text primary key,
+    email text,
+    name text,
+    google_id text unique,
+    created_at timestamp not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    updated_at timestamp not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+create table if not exists payments (
+    id text primary key,
+    user_id text not null references users (id) on delete cascade,
+    order_id text not null unique,
+    plan text,
+    amount real,
+    status text,
+    pp_data json,
+    created_at timestamp not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    updated_at timestamp not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+-- The reconciler's scan of pending orders by age
+create index if not exists payments_status_created_at on payments (status, created_at);
+
+create table if not exists subscriptions (
+    id text primary key,
+    user_id text not null references users (id) on delete cascade,
+    payment_id text references payments (id),
+    plan_type text,
+    start_date timestamp,
+    end_date timestamp,
+    status text,
+    created_at timestamp not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    updated_at timestamp not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+-- One subscription per payment (see complete_payment.sql)
+create unique index if not exists subscriptions_payment_id_key
+    on subscriptions (payment_id) where payment_id is not null;
+-- Active subscription lookups: user, status, latest end_date
+create index if not exists subscriptions_user_status_end on subscriptions (user_id, status, end_date);
+
+-- Registers: one row per user and day (and grade for stock). The unique
+-- keys are the upsert conflict targets and serve the month-range reads,
+-- which filter on user_id and a date range and order by date.
+create table if not exists meal_plans (
+    id integer primary key autoincrement,
+    user_id text not null references users (id) on delete cascade,
+    date date not null,
+    cnt_1to5 integer,
+    cnt_6to10 integer,
+    meal_type text,
+    has_pulses boolean,
+    created_at timestamp not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    updated_at timestamp not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    unique (user_id, date)
+);
+
+create table if not exists stock (
+    id integer primary key autoincrement,
+    user_id text not null references users (id) on delete cascade,
+    date date not null,
+    grade text not null,               -- '1-5' / '6-10'
+    rice_add real,
+    wheat_add real,
+    oil_add real,
+    pulse_add real,
+    rice_open real,
+    wheat_open real,
+    oil_open real,
+    pulse_open real,
+    created_at timestamp not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    updated_at timestamp not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    unique (user_id, date, grade)
+);
+
+create table if not exists milk (
+    id integer primary key autoincrement,
+    user_id text not null references users (id) on delete cascade,
+    date date not null,
+    children integer,
+    milk_open real,
+    ragi_open real,
+    milk_rcpt real,
+    ragi_rcpt real,
+    dist_type text,
+    created_at timestamp not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    updated_at timestamp not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    unique (user_id, date)
+);
+
+create table if not exists egg (
+    id integer primary key autoincrement,
+    user_id text not null references users (id) on delete cascade,
+    date date not null,
+    payer text,
+    egg_m integer,
+    egg_f integer,
+    banana_m integer,
+    banana_f integer,
+    egg_price real,
+    banana_price real,
+    created_at timestamp not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    updated_at timestamp not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    unique (user_id, date)
+);
+
+-- Month-end balances (see stock_closing.sql / milk_closing.sql)
+create table if not exists stock_closing (
+    user_id text not null references users (id) on delete cascade,
+    period date not null,
+    grade text not null,
+    rice_close real not null default 0,
+    wheat_close real not null default 0,
+    oil_close real not null default 0,
+    pulse_close real not null default 0,
+    updated_at timestamp not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    primary key (user_id, period, grade)
+);
+
+create table if not exists milk_closing (
+    user_id text not null references users (id) on delete cascade,
+    period date not null,
+    milk_close real not null default 0,
+    ragi_close real not null default 0,
+    updated_at timestamp not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    primary key (user_id, period)
+);
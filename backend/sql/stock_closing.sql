@@ -0,0 +1,13 @@
+-- Month-end stock balances, one row per user, month and grade.
+-- Written by svc/ledger.py; the next month opens from these rows.
+create table if not exists stock_closing (
+    user_id uuid not null references users (id) on delete cascade,
+    period date not null,              -- first day of the month
+    grade text not null,               -- '1-5' / '6-10'
+    rice_close numeric(12, 3) not null default 0,
+    wheat_close numeric(12, 3) not null default 0,
+    oil_close numeric(12, 3) not null default 0,
+    pulse_close numeric(12, 3) not null default 0,
+    updated_at timestamptz not null default now(),
+    primary key (user_id, period, grade)
+);
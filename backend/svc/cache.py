@@ -0,0 +1,318 @@
+"""
+Read-through caches for month sheets and subscription status.
+
+A (table, user_id, year, month) sheet only changes when that user saves it,
+so GETs are served from a bounded TTL cache and the batch upserts in db.py
+invalidate exactly the months they touched.
+
+A user's active subscription is cached until its own end_date, and dropped
+when a payment creates a subscription or old ones are expired.
+
+Two storage backends are available, picked with CACHE_BACKEND:
+- "sqlite" (default): a SQLite file shared by every gunicorn worker on the
+  box (CACHE_PATH), so an invalidation in one worker is seen by all of them.
+- "memory": a per-process cachetools TLRUCache, for a single process only;
+  gunicorn.conf.py refuses it with more than one worker.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from cachetools import TLRUCache
+from dateutil.parser import isoparse
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "sqlite")
+CACHE_PATH = os.getenv("CACHE_PATH", "/tmp/mdm-cache.sqlite3")
+MONTH_CACHE_SIZE = int(os.getenv("MONTH_CACHE_SIZE", "1024"))
+MONTH_CACHE_TTL = int(os.getenv("MONTH_CACHE_TTL", "600"))  # seconds
+
+# How long "no active subscription" is cached, in seconds. Only the shared
+# backend caches it: a payment's invalidation would not reach the other
+# workers of the memory backend, which would keep turning the user away.
+SUB_CACHE_NEGATIVE_TTL = int(os.getenv("SUB_CACHE_NEGATIVE_TTL", "300"))
+
+# Cached subscription lookups: latest end_date / latest created_at
+SUBSCRIPTION_KINDS = ("active", "latest")
+
+# Bumped on every invalidation so a load that raced with a save is not cached
+VERSION_COUNTER = "month_version"
+SUB_VERSION_COUNTER = "sub_version"
+
+
+class MemoryBackend:
+    """In-process cache; invalidations are only visible to this worker"""
+
+    name = "memory"
+
+    def __init__(self, maxsize, default_ttl):
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._entries = TLRUCache(maxsize=maxsize, ttu=lambda _key, entry, _now: entry[0], timer=time.time)
+        self._counters = {}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[1] if entry is not None else None
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (time.time() + (ttl or self.default_ttl), value)
+
+    def set_if_unchanged(self, key, value, counter, expected, ttl=None):
+        with self._lock:
+            if self._counters.get(counter, 0) != expected:
+                return False
+            self._entries[key] = (time.time() + (ttl or self.default_ttl), value)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def counter(self, name):
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def incr(self, name):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + 1
+            return self._counters[name]
+
+    def size(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class SQLiteBackend:
+    """Cache in a SQLite file shared by all worker processes on one host"""
+
+    name = "sqlite"
+
+    # Expired and surplus entries are purged on roughly one write in N
+    PURGE_EVERY = 64
+
+    def __init__(self, path, maxsize, default_ttl):
+        self.path = path
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, stored_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_stored_at ON cache (stored_at)")
+        conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def _conn(self):
+        # One connection per thread, re-opened in a forked child
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _store(self, conn, key, value, ttl):
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at, stored_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value, default=str), now + (ttl or self.default_ttl), now),
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self._purge(conn, now)
+
+    def _purge(self, conn, now):
+        conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+        conn.execute(
+            "DELETE FROM cache WHERE key IN ("
+            " SELECT key FROM cache ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+            (self.maxsize,),
+        )
+
+    def set(self, key, value, ttl=None):
+        self._store(self._conn(), key, value, ttl)
+
+    def set_if_unchanged(self, key, value, counter, expected, ttl=None):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM counters WHERE name = ?", (counter,)).fetchone()
+            if (row[0] if row else 0) != expected:
+                return False
+            self._store(conn, key, value, ttl)
+            return True
+        finally:
+            conn.execute("COMMIT")
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def counter(self, name):
+        row = self._conn().execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def incr(self, name):
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1)"
+            " ON CONFLICT (name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+        return self.counter(name)
+
+    def size(self):
+        return self._conn().execute("SELECT COUNT(*) FROM cache WHERE expires_at > ?", (time.time(),)).fetchone()[0]
+
+
+def create_backend(kind=CACHE_BACKEND):
+    if kind == "memory":
+        return MemoryBackend(MONTH_CACHE_SIZE, MONTH_CACHE_TTL)
+    if kind == "sqlite":
+        return SQLiteBackend(CACHE_PATH, MONTH_CACHE_SIZE, MONTH_CACHE_TTL)
+    raise ValueError(f"Unknown CACHE_BACKEND: {kind}")
+
+
+backend = create_backend()
+
+# Hit/miss counters are per worker
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "invalidations": 0, "sub_hits": 0, "sub_misses": 0}
+
+
+def _count(stat):
+    with _stats_lock:
+        _stats[stat] += 1
+
+
+def month_key(table, user_id, year, month):
+    return f"month:{table}:{user_id}:{int(year)}:{int(month)}"
+
+
+def content_hash(rows):
+    """Stable version tag for a list of rows"""
+    payload = json.dumps(rows, sort_keys=True, default=str).encode()
+    return hashlib.blake2b(payload, digest_size=12).hexdigest()
+
+
+def get_month_entry(table, user_id, year, month, loader):
+    """
+    Return (rows, etag) for a sheet, calling loader() on a miss. The etag
+    is hashed once when the sheet is loaded and stored alongside it.
+    """
+    key = month_key(table, user_id, year, month)
+    entry = backend.get(key)
+    if isinstance(entry, dict):
+        _count("hits")
+        # Routes reformat rows in place, so hand out copies
+        return [dict(r) for r in entry["rows"]], entry["etag"]
+    _count("misses")
+
+    version = backend.counter(VERSION_COUNTER)
+    rows = loader() or []
+    etag = content_hash(rows)
+    backend.set_if_unchanged(key, {"rows": [dict(r) for r in rows], "etag": etag}, VERSION_COUNTER, version)
+    return rows, etag
+
+
+def get_month(table, user_id, year, month, loader):
+    """Return the cached sheet, calling loader() on a miss"""
+    return get_month_entry(table, user_id, year, month, loader)[0]
+
+
+def invalidate_month(table, user_id, year, month):
+    """Drop one cached sheet, in every worker sharing the backend"""
+    backend.incr(VERSION_COUNTER)
+    backend.delete(month_key(table, user_id, year, month))
+    _count("invalidations")
+
+
+def invalidate_dates(table, user_id, dates):
+    """Drop every cached sheet containing one of the given YYYY-MM-DD dates"""
+    months = {(int(d[:4]), int(d[5:7])) for d in map(str, dates)}
+    for year, month in months:
+        invalidate_month(table, user_id, year, month)
+
+
+def subscription_key(kind, user_id):
+    return f"sub:{kind}:{user_id}"
+
+
+def seconds_until(end_date):
+    """Seconds from now until an ISO timestamp (naive values are UTC)"""
+    end = isoparse(str(end_date))
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    return (end - datetime.now(timezone.utc)).total_seconds()
+
+
+def get_subscription(kind, user_id, loader):
+    """
+    Return the cached active subscription (or None), calling loader() on a
+    miss. An entry lives exactly until the subscription's end_date.
+    """
+    key = subscription_key(kind, user_id)
+    entry = backend.get(key)
+    if entry is not None:
+        _count("sub_hits")
+        return dict(entry["sub"]) if entry["sub"] else None
+    _count("sub_misses")
+
+    version = backend.counter(SUB_VERSION_COUNTER)
+    sub = loader()
+    store_subscription(kind, user_id, sub, version)
+    return sub
+
+
+def store_subscription(kind, user_id, sub, version=None):
+    """Cache a freshly read subscription (None meaning there is none)"""
+    if not sub and backend.name == "memory":
+        return
+    ttl = seconds_until(sub["end_date"]) if sub else SUB_CACHE_NEGATIVE_TTL
+    if ttl <= 0:
+        return
+    if version is None:
+        version = backend.counter(SUB_VERSION_COUNTER)
+    value = {"sub": dict(sub) if sub else None}
+    backend.set_if_unchanged(subscription_key(kind, user_id), value, SUB_VERSION_COUNTER, version, ttl=ttl)
+
+
+def invalidate_subscription(user_id):
+    """Drop every cached subscription entry for a user"""
+    backend.incr(SUB_VERSION_COUNTER)
+    for kind in SUBSCRIPTION_KINDS:
+        backend.delete(subscription_key(kind, user_id))
+    _count("invalidations")
+
+
+def stats():
+    """Hit/miss counters for the month cache"""
+    with _stats_lock:
+        counts = dict(_stats)
+    lookups = counts["hits"] + counts["misses"]
+    return {
+        **counts,
+        "backend": backend.name,
+        "pid": os.getpid(),
+        "size": backend.size(),
+        "maxsize": MONTH_CACHE_SIZE,
+        "ttl": MONTH_CACHE_TTL,
+        "hit_ratio": round(counts["hits"] / lookups, 4) if lookups else 0.0,
+        "sub_ttl_negative": SUB_CACHE_NEGATIVE_TTL if backend.name != "memory" else 0,
+    }
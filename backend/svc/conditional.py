@@ -0,0 +1,85 @@
+"""
+Conditional GETs and response compression.
+
+Month sheets carry a version hash stored with their cache entry, so a
+matching If-None-Match is answered with 304 before anything is serialised.
+Other JSON GETs (e.g. /api/stock/calc) are tagged with a hash of their body
+on the way out. Bodies over COMPRESS_MIN_SIZE are gzipped for clients that
+accept it; streamed exports are gzipped chunk by chunk.
+"""
+
+import gzip
+import os
+import zlib
+from flask import Response, request
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))  # bytes
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "6"))
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/csv", "text/plain", "text/html")
+
+# Browsers keep the body but must revalidate it before every use
+CACHE_CONTROL = "private, no-cache"
+
+
+def conditional_json(etag, render):
+    """
+    Answer a GET for content whose version is already known: 304 when the
+    client holds that version, otherwise render() the JSON body.
+    """
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(render(), mimetype="application/json")
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
+
+
+def make_conditional(response):
+    """Tag an untagged JSON GET response with a hash of its body and honour If-None-Match"""
+    if (
+        request.method != "GET"
+        or response.status_code != 200
+        or response.is_streamed
+        or response.mimetype != "application/json"
+        or "ETag" in response.headers
+    ):
+        return response
+    # Weak, so the tag still matches whether or not the body was gzipped
+    response.add_etag(weak=True)
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return response.make_conditional(request)
+
+
+def _gzip_stream(chunks):
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        # Sync-flush each chunk so rows still reach the client as they are produced
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def compress_response(response):
+    """gzip a text body when the client accepts it"""
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_TYPES
+        or "gzip" not in request.accept_encodings
+    ):
+        return response
+
+    if response.is_streamed:
+        response.response = _gzip_stream(response.response)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+        response.set_data(gzip.compress(data, COMPRESS_LEVEL, mtime=0))
+    response.headers["Content-Encoding"] = "gzip"
+    response.vary.add("Accept-Encoding")
+    return response
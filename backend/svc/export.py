@@ -0,0 +1,66 @@
+"""
+Streaming multi-month export of the registers.
+
+Rows are pulled from db.iter_register_rows one page at a time and written
+out as CSV or NDJSON as each page arrives, so memory stays flat however
+long the range is.
+"""
+
+import csv
+import io
+import json
+
+# Export name -> table
+EXPORT_TABLES = {
+    "meals": "meal_plans",
+    "stock": "stock",
+    "milk": "milk",
+    "egg": "egg",
+}
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+# Internal columns left out of exports
+OMITTED_COLUMNS = ("user_id",)
+
+
+def _pages(rows, size):
+    """Group an iterator of rows into lists of up to `size`"""
+    page = []
+    for row in rows:
+        page.append(row)
+        if len(page) == size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+def _clean(row):
+    return {k: v for k, v in row.items() if k not in OMITTED_COLUMNS}
+
+
+def csv_chunks(rows, page_size):
+    """CSV text for one register: a header from the first row, then one chunk per page"""
+    columns = None
+    for page in _pages(rows, page_size):
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=columns or list(_clean(page[0])), extrasaction="ignore")
+        if columns is None:
+            columns = writer.fieldnames
+            writer.writeheader()
+        writer.writerows(_clean(row) for row in page)
+        yield buffer.getvalue()
+
+
+def ndjson_chunks(registers, page_size):
+    """
+    NDJSON lines for (name, rows) pairs; each line carries its register name
+    so several registers can share one stream.
+    """
+    for name, rows in registers:
+        for page in _pages(rows, page_size):
+            yield "".join(json.dumps({"register": name, **_clean(row)}, default=str) + "\n" for row in page)
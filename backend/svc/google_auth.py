@@ -0,0 +1,74 @@
+"""
+Google ID-token verification with cached signing certificates.
+
+google.oauth2.id_token.verify_oauth2_token fetches Google's certificates on
+every call. Here they are fetched over one pooled HTTP session, kept until
+their Cache-Control max-age runs out, and tokens are verified locally.
+"""
+
+import re
+import threading
+import time
+import requests
+from google.auth import jwt
+
+GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+# Used when Google's response carries no max-age
+DEFAULT_CERTS_TTL = 300
+# Unknown key ids force a refetch at most this often (seconds)
+MIN_REFRESH_INTERVAL = 60
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+class GoogleTokenVerifier:
+    def __init__(self, certs_url=GOOGLE_CERTS_URL, session=None):
+        self.certs_url = certs_url
+        self._session = session or requests.Session()
+        self._lock = threading.Lock()
+        self._certs = None
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+
+    def _fetch_certs(self):
+        response = self._session.get(self.certs_url, timeout=5)
+        response.raise_for_status()
+        match = _MAX_AGE.search(response.headers.get("Cache-Control", ""))
+        max_age = int(match.group(1)) if match else DEFAULT_CERTS_TTL
+        age = int(response.headers.get("Age", 0) or 0)
+        self._certs = response.json()
+        self._fetched_at = time.monotonic()
+        self._expires_at = self._fetched_at + max(max_age - age, 0)
+
+    def certs(self, refresh=False):
+        """Google's current signing certificates, keyed by key id"""
+        if not refresh and self._certs is not None and time.monotonic() < self._expires_at:
+            return self._certs
+        with self._lock:
+            now = time.monotonic()
+            if self._certs is None or now >= self._expires_at or (
+                refresh and now - self._fetched_at >= MIN_REFRESH_INTERVAL
+            ):
+                self._fetch_certs()
+            return self._certs
+
+    def verify(self, token, audience, clock_skew_in_seconds=10):
+        """
+        Verify a Google ID token and return its claims.
+        Raises ValueError if the token is invalid.
+        """
+        certs = self.certs()
+        key_id = jwt.decode_header(token).get("kid")
+        if key_id not in certs:
+            # Google rotated its keys before our copy expired
+            certs = self.certs(refresh=True)
+
+        claims = jwt.decode(token, certs=certs, audience=audience, clock_skew_in_seconds=clock_skew_in_seconds)
+        if claims.get("iss") not in GOOGLE_ISSUERS:
+            raise ValueError(f"Wrong issuer: {claims.get('iss')}")
+        return claims
+
+
+verifier = GoogleTokenVerifier()
@@ -0,0 +1,121 @@
+"""
+Background jobs run by APScheduler.
+
+Only one gunicorn worker per host runs the scheduler: every worker calls
+start_scheduler() from post_worker_init and the first one to take an
+exclusive lock on SCHEDULER_LOCK_PATH wins. Set SCHEDULER_ENABLED=0 to turn
+the jobs off (e.g. for one-off scripts).
+
+The same worker drains the webhook queue (svc.webhook_queue), so queued
+PhonePe notifications and ledger closing refreshes queued by saves are only
+processed on hosts running the scheduler, and reconciles payments left
+pending (svc.reconcile). Jobs named in
+PROFILE_JOBS are profiled on every run (svc.profiler).
+"""
+
+import fcntl
+import logging
+import os
+from datetime import date
+from apscheduler.schedulers.background import BackgroundScheduler
+from db import get_user_ids
+from svc import profiler, webhook_queue
+from svc.ledger import REFRESH_EVENT, get_stock_ledger, get_milk_ledger, previous_month, refresh_closings
+from svc.payments import handle_webhook
+from svc.reconcile import RECONCILE_EVENT, RECONCILE_INTERVAL, reconcile_order, reconcile_pending
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "1") == "1"
+SCHEDULER_LOCK_PATH = os.getenv("SCHEDULER_LOCK_PATH", "/tmp/mdm-scheduler.lock")
+SCHEDULER_TIMEZONE = os.getenv("SCHEDULER_TIMEZONE", "Asia/Kolkata")
+WEBHOOK_POLL_INTERVAL = int(os.getenv("WEBHOOK_POLL_INTERVAL", "2"))  # seconds
+
+scheduler = BackgroundScheduler(timezone=SCHEDULER_TIMEZONE)
+_lock_file = None
+
+
+def materialise_closings(year=None, month=None):
+    """
+    Persist every user's month-end stock and milk/ragi closing for a month
+    (by default the one that just ended), so the next month's day 1 opens
+    from a single row.
+    """
+    if year is None or month is None:
+        today = date.today()
+        year, month = previous_month(today.year, today.month)
+
+    done = failed = 0
+    for user_id in get_user_ids():
+        try:
+            get_stock_ledger(user_id, year, month)
+            get_milk_ledger(user_id, year, month)
+            done += 1
+        except Exception as e:
+            failed += 1
+            logger.error(f"Closing materialisation failed for user {user_id}, {year}-{month:02d}: {str(e)}")
+    logger.info(f"Materialised closings for {year}-{month:02d}: {done} users, {failed} failed")
+
+
+def handle_job(event, payload):
+    """
+    Webhook queue jobs: PhonePe notifications, plus order checks asked for
+    by /api/pay/status and closing refreshes queued by register saves
+    """
+    if event == RECONCILE_EVENT:
+        reconcile_order(payload['merchantOrderId'])
+    elif event == REFRESH_EVENT:
+        refresh_closings(payload['user_id'], payload['year'], payload['month'], payload['register'])
+    else:
+        handle_webhook(event, payload)
+
+
+def drain_webhooks():
+    """Process every due webhook job"""
+    counts = webhook_queue.run_due(handle_job)
+    if any(counts.values()):
+        logger.info(f"Webhook jobs: {counts}")
+
+
+def purge_webhooks():
+    """Drop old processed webhook jobs"""
+    removed = webhook_queue.purge_done()
+    logger.info(f"Purged {removed} processed webhook jobs")
+
+
+def start_scheduler():
+    """Start the scheduler in this process unless another worker already has"""
+    global _lock_file
+    if not SCHEDULER_ENABLED or scheduler.running:
+        return False
+
+    lock_file = open(SCHEDULER_LOCK_PATH, "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _lock_file = lock_file  # held for the life of the process
+
+    scheduler.add_job(
+        profiler.profiled(materialise_closings), "cron", day=1, hour=0, minute=30,
+        id="materialise_closings", replace_existing=True,
+        coalesce=True, misfire_grace_time=6 * 3600,
+    )
+    scheduler.add_job(
+        profiler.profiled(drain_webhooks), "interval", seconds=WEBHOOK_POLL_INTERVAL,
+        id="drain_webhooks", replace_existing=True,
+        coalesce=True, max_instances=1,
+    )
+    scheduler.add_job(
+        profiler.profiled(reconcile_pending), "interval", seconds=RECONCILE_INTERVAL,
+        id="reconcile_pending", replace_existing=True,
+        coalesce=True, max_instances=1,
+    )
+    scheduler.add_job(
+        profiler.profiled(purge_webhooks), "cron", hour=3, minute=0,
+        id="purge_webhooks", replace_existing=True, coalesce=True,
+    )
+    scheduler.start()
+    logger.info(f"Scheduler started in pid {os.getpid()}")
+    return True
@@ -0,0 +1,351 @@
+"""
+Stock and milk/ragi ledger engine.
+
+Computes opening, receipts, usage and closing for every day, commodity and
+grade of a month. Day 1 opens from the explicit *_open values the user
+entered, or else from the previous month's persisted closing, so the
+opening lookup is a single row fetch rather than a scan of history.
+
+Ledgers are kept per worker; syncing one against fresh sheets only
+recomputes from the first day whose inputs changed. After a save, the
+month's closing and those of later months are refreshed by the scheduler
+worker (REFRESH_EVENT on the webhook queue), not in the request.
+"""
+
+import datetime
+import threading
+from calendar import monthrange
+from itertools import accumulate
+from cachetools import LRUCache
+from svc import webhook_queue
+from db import (
+    get_stock_records, get_meal_plans, get_milk_records,
+    get_stock_closings, get_later_closings, upsert_stock_closings,
+    get_milk_closings, upsert_milk_closing,
+)
+
+COMMODITIES = ("rice", "wheat", "oil", "pulse")
+GRADES = ("1-5", "6-10")
+
+# kg per child per meal
+RATES = {
+    "1-5": {"rice": 0.1, "wheat": 0.1, "oil": 0.005, "pulse": 0.02},
+    "6-10": {"rice": 0.15, "wheat": 0.15, "oil": 0.0075, "pulse": 0.03},
+}
+COUNT_FIELDS = {"1-5": "cnt_1to5", "6-10": "cnt_6to10"}
+
+_ledgers = LRUCache(maxsize=256)
+_ledgers_lock = threading.Lock()
+
+
+def period_of(year, month):
+    """Closing rows are keyed by the first day of their month"""
+    return f"{year}-{month:02d}-01"
+
+
+def previous_month(year, month):
+    return (year - 1, 12) if month == 1 else (year, month - 1)
+
+
+def _num(value):
+    return float(value) if value else 0.0
+
+
+def daily_usage(meal, grade):
+    """kg of each commodity used by one grade on one day"""
+    cnt = meal.get(COUNT_FIELDS[grade]) or 0
+    meal_type = meal.get("meal_type")
+    used = dict.fromkeys(COMMODITIES, 0.0)
+    if cnt and meal_type:
+        rates = RATES[grade]
+        if meal_type in ("rice", "wheat"):
+            used[meal_type] = cnt * rates[meal_type]
+        used["oil"] = cnt * rates["oil"]
+        if meal.get("has_pulses"):
+            used["pulse"] = cnt * rates["pulse"]
+    return used
+
+
+class StockLedger:
+    """Day-by-day stock balances for one user and month"""
+
+    def __init__(self, year, month):
+        self.year = year
+        self.month = month
+        self.dates = [f"{year}-{month:02d}-{day:02d}" for day in range(1, monthrange(year, month)[1] + 1)]
+        days = len(self.dates)
+        self.stock_rows = [dict.fromkeys(GRADES) for _ in range(days)]
+        self.opening = {g: dict.fromkeys(COMMODITIES, 0.0) for g in GRADES}
+        self.added = {g: {c: [0.0] * days for c in COMMODITIES} for g in GRADES}
+        self.used = {g: {c: [0.0] * days for c in COMMODITIES} for g in GRADES}
+        self.open = {g: {c: [0.0] * days for c in COMMODITIES} for g in GRADES}
+        self.close = {g: {c: [0.0] * days for c in COMMODITIES} for g in GRADES}
+        self._inputs = [None] * days
+        self._carry = None
+        self.lock = threading.Lock()
+
+    def sync(self, stock_records, meal_plans, carry=None):
+        """
+        Bring the ledger up to date with the given sheets and carried-in
+        closing balances. Returns the index of the first day recomputed
+        (len(dates) when nothing changed).
+        """
+        stock_lookup = {(str(r["date"])[:10], r["grade"]): r for r in stock_records}
+        meal_lookup = {str(m["date"])[:10]: m for m in meal_plans}
+        carry = carry or {g: dict.fromkeys(COMMODITIES, 0.0) for g in GRADES}
+
+        start = 0 if carry != self._carry else None
+        inputs = []
+        for i, date in enumerate(self.dates):
+            rows = {g: stock_lookup.get((date, g), {}) for g in GRADES}
+            meal = meal_lookup.get(date, {})
+            signature = (
+                tuple(tuple(rows[g].get(f"{c}_{kind}") for c in COMMODITIES for kind in ("add", "open")) for g in GRADES),
+                meal.get("cnt_1to5"), meal.get("cnt_6to10"), meal.get("meal_type"), meal.get("has_pulses"),
+            )
+            if start is None and signature != self._inputs[i]:
+                start = i
+            inputs.append((signature, rows, meal))
+
+        if start is None:
+            return len(self.dates)
+
+        self._carry = carry
+        for i in range(start, len(self.dates)):
+            signature, rows, meal = inputs[i]
+            self._inputs[i] = signature
+            self.stock_rows[i] = rows
+            for g in GRADES:
+                usage = daily_usage(meal, g)
+                for c in COMMODITIES:
+                    self.added[g][c][i] = _num(rows[g].get(f"{c}_add"))
+                    self.used[g][c][i] = usage[c]
+
+        # As in milk_ledger_rows, an entered 0 is the same as none: the old
+        # stock page saved 0 openings on every day-1 row it posted
+        first = self.stock_rows[0]
+        for g in GRADES:
+            for c in COMMODITIES:
+                explicit = first[g].get(f"{c}_open") if first[g] else None
+                self.opening[g][c] = float(explicit) if explicit else carry[g][c]
+        self._recompute(start)
+        return start
+
+    def _recompute(self, start):
+        """Rebuild balances from day index `start` to the end of the month"""
+        for g in GRADES:
+            for c in COMMODITIES:
+                added, used = self.added[g][c], self.used[g][c]
+                opens, closes = self.open[g][c], self.close[g][c]
+                balance = closes[start - 1] if start else self.opening[g][c]
+                deltas = (added[i] - used[i] for i in range(start, len(self.dates)))
+                running = list(accumulate(deltas, initial=balance))
+                opens[start:] = running[:-1]
+                closes[start:] = running[1:]
+
+    def closing(self):
+        """Month-end balance per grade and commodity"""
+        return {g: {c: round(self.close[g][c][-1], 3) for c in COMMODITIES} for g in GRADES}
+
+    def rows(self):
+        """
+        One row per day and grade, in the /api/stock/calc response shape.
+        *_open is the entered opening and *_carry the balance carried in
+        (both day 1 only, None otherwise); *_opening is computed.
+        """
+        result = []
+        for i, date in enumerate(self.dates):
+            for g in GRADES:
+                stock_row = self.stock_rows[i][g] or {}
+                row = {"date": date, "grade": g}
+                for c in COMMODITIES:
+                    row[f"{c}_add"] = self.added[g][c][i]
+                for c in COMMODITIES:
+                    explicit = stock_row.get(f"{c}_open") if i == 0 else None
+                    row[f"{c}_open"] = float(explicit) if explicit else None
+                for c in COMMODITIES:
+                    row[f"{c}_carry"] = round(self._carry[g][c], 3) if i == 0 else None
+                for c in COMMODITIES:
+                    row[f"{c}_used"] = round(self.used[g][c][i], 3)
+                for c in COMMODITIES:
+                    row[f"{c}_opening"] = round(self.open[g][c][i], 3)
+                    row[f"{c}_closing"] = round(self.close[g][c][i], 3)
+                result.append(row)
+        return result
+
+
+def _closing_from_rows(rows):
+    closing = {g: dict.fromkeys(COMMODITIES, 0.0) for g in GRADES}
+    for r in rows:
+        if r["grade"] in closing:
+            closing[r["grade"]] = {c: _num(r.get(f"{c}_close")) for c in COMMODITIES}
+    return closing
+
+
+def closing_periods(year, month):
+    """Periods whose closings a month's ledger needs: last month's and its own"""
+    return [period_of(*previous_month(year, month)), period_of(year, month)]
+
+
+def get_stock_ledger(user_id, year, month):
+    """
+    Return the ledger rows for a month, persisting its month-end closing
+    when it changed so the next month can open from it.
+    """
+    return build_stock_ledger(
+        user_id, year, month,
+        get_stock_records(user_id, year, month),
+        get_meal_plans(user_id, year, month),
+        get_stock_closings(user_id, closing_periods(year, month)),
+    )
+
+
+def build_stock_ledger(user_id, year, month, stock_records, meal_plans, closings):
+    """Same as get_stock_ledger, for callers that already fetched the inputs"""
+    prev_period, period = closing_periods(year, month)
+    carry = _closing_from_rows([r for r in closings if str(r["period"])[:10] == prev_period])
+    stored = [r for r in closings if str(r["period"])[:10] == period]
+
+    key = (str(user_id), year, month)
+    with _ledgers_lock:
+        ledger = _ledgers.get(key)
+        if ledger is None:
+            ledger = _ledgers[key] = StockLedger(year, month)
+
+    with ledger.lock:
+        ledger.sync(stock_records, meal_plans, carry)
+        closing = ledger.closing()
+        rows = ledger.rows()
+
+    if not stored or _closing_from_rows(stored) != closing:
+        upsert_stock_closings(user_id, period, closing)
+    return rows
+
+
+# kg of milk powder / ragi per child per day
+MILK_RATE = 0.018
+RAGI_RATE = 0.005
+RAGI_WEEKDAYS = (0, 2, 4)  # Mon / Wed / Fri
+
+
+def milk_usage(record, date):
+    """kg of milk and ragi distributed on one day"""
+    children = record.get("children") or 0
+    milk = children * MILK_RATE
+    ragi = 0.0
+    if record.get("dist_type", "milk & ragi") == "milk & ragi" and date.weekday() in RAGI_WEEKDAYS:
+        ragi = children * RAGI_RATE
+    return milk, ragi
+
+
+def milk_ledger_rows(year, month, records, carry=None):
+    """
+    Running milk/ragi balances for every day of a month. Day 1 opens from
+    the explicit day-1 values or the carried-in closing; later days open
+    from the previous day's closing.
+
+    milk_open/ragi_open are what was entered and milk_carry/ragi_carry the
+    balance carried in (both day 1 only, None otherwise); milk_opening/
+    ragi_opening are the computed balances. A client saving rows back
+    thus never stores a derived opening as an explicit one.
+    """
+    lookup = {str(r["date"])[:10]: r for r in records}
+    carry = carry or {"milk": 0.0, "ragi": 0.0}
+    first = lookup.get(f"{year}-{month:02d}-01", {})
+    explicit = {c: _num(first[f"{c}_open"]) if first.get(f"{c}_open") else None for c in ("milk", "ragi")}
+    milk = carry["milk"] if explicit["milk"] is None else explicit["milk"]
+    ragi = carry["ragi"] if explicit["ragi"] is None else explicit["ragi"]
+
+    rows = []
+    for day in range(1, monthrange(year, month)[1] + 1):
+        date = f"{year}-{month:02d}-{day:02d}"
+        record = lookup.get(date, {})
+        milk_used, ragi_used = milk_usage(record, datetime.date(year, month, day))
+        milk_rcpt = _num(record.get("milk_rcpt"))
+        ragi_rcpt = _num(record.get("ragi_rcpt"))
+        row = {
+            "date": date,
+            "children": record.get("children") or 0,
+            "dist_type": record.get("dist_type", "milk & ragi"),
+            "milk_open": explicit["milk"] if day == 1 else None,
+            "ragi_open": explicit["ragi"] if day == 1 else None,
+            "milk_carry": round(carry["milk"], 3) if day == 1 else None,
+            "ragi_carry": round(carry["ragi"], 3) if day == 1 else None,
+            "milk_opening": round(milk, 3),
+            "ragi_opening": round(ragi, 3),
+            "milk_rcpt": milk_rcpt,
+            "ragi_rcpt": ragi_rcpt,
+            "milk_used": round(milk_used, 3),
+            "ragi_used": round(ragi_used, 3),
+        }
+        milk += milk_rcpt - milk_used
+        ragi += ragi_rcpt - ragi_used
+        row["milk_close"] = round(milk, 3)
+        row["ragi_close"] = round(ragi, 3)
+        rows.append(row)
+    return rows
+
+
+def get_milk_ledger(user_id, year, month):
+    """
+    Return the milk/ragi ledger rows for a month, persisting its month-end
+    closing when it changed so the next month can open from it.
+    """
+    return build_milk_ledger(
+        user_id, year, month,
+        get_milk_records(user_id, year, month),
+        get_milk_closings(user_id, closing_periods(year, month)),
+    )
+
+
+def build_milk_ledger(user_id, year, month, records, closings):
+    """Same as get_milk_ledger, for callers that already fetched the inputs"""
+    prev_period, period = closing_periods(year, month)
+    closings = {str(r["period"])[:10]: r for r in closings}
+    prev = closings.get(prev_period, {})
+    carry = {"milk": _num(prev.get("milk_close")), "ragi": _num(prev.get("ragi_close"))}
+
+    rows = milk_ledger_rows(year, month, records, carry)
+
+    closing = {"milk": rows[-1]["milk_close"], "ragi": rows[-1]["ragi_close"]}
+    stored = closings.get(period)
+    if not stored or {"milk": _num(stored.get("milk_close")), "ragi": _num(stored.get("ragi_close"))} != closing:
+        upsert_milk_closing(user_id, period, closing)
+    return rows
+
+
+# Ledger builder and closing table for each register with carried balances
+LEDGERS = {
+    "stock": (get_stock_ledger, "stock_closing"),
+    "milk": (get_milk_ledger, "milk_closing"),
+}
+
+# Webhook queue event for refresh_closings(), run by svc.jobs.handle_job
+REFRESH_EVENT = "ledger.refresh"
+
+
+def refresh_closings(user_id, year, month, register="stock"):
+    """
+    Recompute a month after a save and carry the new closing through any
+    later months that already have a persisted closing.
+    """
+    get_ledger, table = LEDGERS[register]
+    get_ledger(user_id, year, month)
+    later = sorted({str(r["period"])[:10] for r in get_later_closings(table, user_id, period_of(year, month))})
+    for period in later:
+        get_ledger(user_id, int(period[:4]), int(period[5:7]))
+
+
+def refresh_saved_months(user_id, dates, register="stock"):
+    """
+    Queue a closing refresh for every month with a date written by a save.
+    A month with a refresh still waiting is not queued twice.
+    """
+    months = {(int(str(d)[:4]), int(str(d)[5:7])) for d in dates}
+    for year, month in sorted(months):
+        payload = {"register": register, "user_id": user_id, "year": year, "month": month}
+        try:
+            webhook_queue.enqueue(REFRESH_EVENT, payload, unique_in=("queued",))
+        except Exception as e:
+            # The save itself succeeded; the next /calc request retries
+            print(f"Error queueing {register} closing refresh: {e}")
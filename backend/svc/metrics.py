@@ -0,0 +1,206 @@
+"""
+Request, database and PhonePe timings.
+
+Every request gets a Server-Timing header: time spent in Supabase calls
+(db), PhonePe calls (phonepe) and in total. The same timings feed latency
+histograms per route, per table and per PhonePe operation, served in the
+Prometheus text format at /metrics. Requests slower than SLOW_REQUEST_MS
+are logged with the user they were for.
+
+Supabase calls are timed by the HTTP transport (svc/transport.py), from
+sending the request until the body has been read; raw SQL and PhonePe calls
+use timed(). Work fanned out to other threads is counted towards the
+request when it runs in a copy of the request's context (routes/month.py).
+Each gunicorn worker keeps its own histograms and writes a
+snapshot to METRICS_DIR at most every METRICS_FLUSH_INTERVAL seconds;
+/metrics adds up the snapshots of every worker, including ones that have
+since exited, so counters never go backwards within a deploy.
+"""
+
+import contextvars
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, request
+
+logger = logging.getLogger(__name__)
+
+METRICS_DIR = os.getenv("METRICS_DIR", "/tmp/mdm-metrics")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))  # seconds
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+
+# Upper bounds in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HISTOGRAMS = {
+    "mdm_http_request_duration_seconds": ("Time to produce a response, by route", ("route", "method", "status")),
+    "mdm_db_query_duration_seconds": ("Supabase and SQL call latency, by table", ("table", "method")),
+    "mdm_phonepe_call_duration_seconds": ("PhonePe SDK call latency, by operation", ("operation",)),
+}
+
+# Server-Timing entry for each kind of timed call
+KIND_METRICS = {
+    "db": "mdm_db_query_duration_seconds",
+    "phonepe": "mdm_phonepe_call_duration_seconds",
+}
+
+_lock = threading.Lock()
+# name -> {label values: [bucket counts..., +Inf count, sum]}
+_series = {name: {} for name in HISTOGRAMS}
+_last_flush = 0.0
+
+
+class RequestTimings:
+    """Milliseconds and call counts per kind for one request, summed across threads"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self.kinds = {}
+
+    def add(self, kind, ms):
+        with self._lock:
+            total = self.kinds.setdefault(kind, [0.0, 0])
+            total[0] += ms
+            total[1] += 1
+
+
+_current = contextvars.ContextVar("request_timings", default=None)
+
+
+def observe(name, seconds, *labels):
+    """Record one observation in a histogram"""
+    with _lock:
+        counts = _series[name].get(labels)
+        if counts is None:
+            counts = _series[name][labels] = [0] * (len(BUCKETS) + 1) + [0.0]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                counts[i] += 1
+        counts[len(BUCKETS)] += 1
+        counts[-1] += seconds
+
+
+def record(kind, seconds, *labels):
+    """Record a timed call in its histogram and in the current request's Server-Timing"""
+    observe(KIND_METRICS[kind], seconds, *labels)
+    timings = _current.get()
+    if timings is not None:
+        timings.add(kind, seconds * 1000)
+
+
+@contextmanager
+def timed(kind, *labels):
+    """Time a block as a call of `kind` ("db" or "phonepe")"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(kind, time.perf_counter() - start, *labels)
+
+
+def start_request():
+    """before_request hook"""
+    _current.set(RequestTimings())
+
+
+def finish_request(response):
+    """after_request hook: Server-Timing header, route histogram and slow-request log"""
+    timings = _current.get()
+    if timings is None:
+        return response
+    _current.set(None)
+    total_ms = (time.perf_counter() - timings.started) * 1000
+    entries = [f'{kind};desc="{count} calls";dur={ms:.1f}' for kind, (ms, count) in sorted(timings.kinds.items())]
+    entries.append(f"total;dur={total_ms:.1f}")
+    response.headers["Server-Timing"] = ", ".join(entries)
+
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    observe("mdm_http_request_duration_seconds", total_ms / 1000, route, request.method, str(response.status_code))
+    if total_ms >= SLOW_REQUEST_MS:
+        logger.warning(
+            f"Slow request {request.method} {route} {total_ms:.0f} ms for user {g.get('user_id')}: "
+            + ", ".join(f"{kind} {count} calls {ms:.0f} ms" for kind, (ms, count) in timings.kinds.items())
+        )
+    _maybe_flush()
+    return response
+
+
+# -- aggregation across workers ---------------------------------------------
+
+def _snapshot_path(pid):
+    return os.path.join(METRICS_DIR, f"{pid}.json")
+
+
+def flush():
+    """Write this worker's histograms to METRICS_DIR"""
+    global _last_flush
+    with _lock:
+        data = {name: [[list(labels), counts] for labels, counts in series.items()] for name, series in _series.items()}
+        _last_flush = time.monotonic()
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = _snapshot_path(os.getpid())
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(data, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def _maybe_flush():
+    if time.monotonic() - _last_flush >= METRICS_FLUSH_INTERVAL:
+        try:
+            flush()
+        except OSError as e:
+            logger.error(f"Could not write metrics snapshot: {e}")
+
+
+def clear():
+    """Drop every worker's snapshot; gunicorn calls this once at startup"""
+    for path in glob.glob(os.path.join(METRICS_DIR, "*.json")):
+        os.remove(path)
+
+
+def _merged():
+    flush()
+    merged = {name: {} for name in HISTOGRAMS}
+    for path in glob.glob(os.path.join(METRICS_DIR, "*.json")):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for name, series in data.items():
+            for labels, counts in series:
+                total = merged.setdefault(name, {}).setdefault(tuple(labels), [0] * len(counts))
+                for i, value in enumerate(counts):
+                    total[i] += value
+    return merged
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}"
+
+
+def render():
+    """All workers' histograms in the Prometheus text exposition format"""
+    lines = []
+    for name, series in _merged().items():
+        help_text, label_names = HISTOGRAMS[name]
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for labels, counts in sorted(series.items()):
+            for bound, count in zip((*BUCKETS, "+Inf"), counts):
+                le = 'le="%s"' % bound
+                lines.append(f"{name}_bucket{_label_text(label_names, labels, le)} {count}")
+            lines.append(f"{name}_sum{_label_text(label_names, labels)} {counts[-1]:.6f}")
+            lines.append(f"{name}_count{_label_text(label_names, labels)} {counts[len(BUCKETS)]}")
+    return "\n".join(lines) + "\n"
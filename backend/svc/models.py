@@ -0,0 +1,122 @@
+"""
+Typed row models for the register and subscription tables.
+
+Each model lists exactly the columns the app reads, which db.py uses as
+its select() projection, and has a pydantic TypeAdapter built once at
+import. Routes hand raw rows to dump_rows(), which validates and encodes
+them to JSON in pydantic-core in a single pass: ids become strings, dates
+stay ISO strings and numeric columns come out as floats, with no Python
+loop over the fields.
+"""
+
+import datetime
+from typing import Annotated, List, Optional, Union
+from typing_extensions import NotRequired, TypedDict
+from pydantic import BeforeValidator, Field, TypeAdapter
+
+# UUIDs come back as strings, bigint ids as ints; the frontend wants strings
+Id = Annotated[str, Field(coerce_numbers_to_str=True)]
+# PostgREST sends ISO strings; raw SQL rows carry date/datetime objects
+Date = Union[str, datetime.date]
+Timestamp = Union[str, datetime.datetime]
+# Unpriced egg/banana rows are shown at the default price
+Price = Annotated[float, BeforeValidator(lambda v: v or 6.0)]
+
+
+class MealPlanRow(TypedDict):
+    id: Id
+    user_id: Id
+    date: Date
+    cnt_1to5: Optional[int]
+    cnt_6to10: Optional[int]
+    meal_type: Optional[str]
+    has_pulses: Optional[bool]
+
+
+class StockRow(TypedDict):
+    id: Id
+    user_id: Id
+    date: Date
+    grade: str
+    rice_add: Optional[float]
+    wheat_add: Optional[float]
+    oil_add: Optional[float]
+    pulse_add: Optional[float]
+    rice_open: Optional[float]
+    wheat_open: Optional[float]
+    oil_open: Optional[float]
+    pulse_open: Optional[float]
+
+
+class MilkRow(TypedDict):
+    id: Id
+    user_id: Id
+    date: Date
+    children: Optional[int]
+    milk_open: Optional[float]
+    ragi_open: Optional[float]
+    milk_rcpt: Optional[float]
+    ragi_rcpt: Optional[float]
+    dist_type: Optional[str]
+
+
+class EggRow(TypedDict):
+    id: Id
+    user_id: Id
+    date: Date
+    payer: Optional[str]
+    egg_m: Optional[int]
+    egg_f: Optional[int]
+    banana_m: Optional[int]
+    banana_f: Optional[int]
+    egg_price: Price
+    banana_price: Price
+
+
+class PaymentSummary(TypedDict):
+    order_id: Optional[str]
+    amount: Optional[float]
+    status: Optional[str]
+
+
+class SubscriptionRow(TypedDict):
+    id: Id
+    user_id: Id
+    payment_id: Optional[Id]
+    plan_type: Optional[str]
+    start_date: Timestamp
+    end_date: Timestamp
+    status: Optional[str]
+    created_at: Timestamp
+    # Only present when the query embeds the payment
+    payments: NotRequired[Optional[PaymentSummary]]
+
+
+MODELS = {
+    "meal_plans": MealPlanRow,
+    "stock": StockRow,
+    "milk": MilkRow,
+    "egg": EggRow,
+    "subscriptions": SubscriptionRow,
+}
+
+_list_adapters = {table: TypeAdapter(List[model]) for table, model in MODELS.items()}
+_one_adapters = {table: TypeAdapter(Optional[model]) for table, model in MODELS.items()}
+
+
+def columns(table):
+    """select() projection for a table: the model's own columns"""
+    model = MODELS[table]
+    return ",".join(name for name in model.__annotations__ if name in model.__required_keys__)
+
+
+def dump_rows(table, rows):
+    """Encode a list of raw rows as JSON bytes"""
+    adapter = _list_adapters[table]
+    return adapter.dump_json(adapter.validate_python(rows or []))
+
+
+def dump_row(table, row):
+    """Encode one raw row (or None) as JSON bytes"""
+    adapter = _one_adapters[table]
+    return adapter.dump_json(adapter.validate_python(row))
@@ -0,0 +1,61 @@
+"""
+Payment state changes driven by PhonePe notifications.
+
+Used by the webhook queue worker (svc.jobs) and by the /api/pay/status
+redirect, so both paths complete a payment the same way.
+"""
+
+import logging
+from db import complete_payment, update_payment_status
+
+logger = logging.getLogger(__name__)
+
+COMPLETED_EVENT = "checkout.order.completed"
+FAILED_EVENT = "checkout.order.failed"
+WEBHOOK_EVENTS = (COMPLETED_EVENT, FAILED_EVENT)
+
+# insert_payment writes 'pending'; PhonePe reports 'PENDING'
+PENDING_STATES = ("pending", "PENDING")
+
+
+def process_payment_completion(payload):
+    """
+    Process completed payment and create subscription
+    This function is idempotent - safe to call multiple times
+    """
+    merchant_order_id = payload.get('merchantOrderId')
+    state = payload.get('state')
+
+    if not merchant_order_id:
+        logger.error("Missing merchantOrderId in payload")
+        return False
+
+    if state != 'COMPLETED':
+        # Never move a payment back out of COMPLETED
+        update_payment_status(merchant_order_id, state, payload, unless_status='COMPLETED')
+        return True
+
+    # Status update and subscription insert in one server-side transaction
+    outcome = complete_payment(merchant_order_id, payload)
+    if outcome['status'] == 'not_found':
+        logger.error(f"Payment record not found for order {merchant_order_id}")
+        return False
+    if outcome['status'] == 'already_completed':
+        logger.info(f"Payment {merchant_order_id} already processed, skipping")
+    else:
+        logger.info(f"Subscription created for user {outcome['user_id']}, order {merchant_order_id}")
+    return True
+
+
+def handle_webhook(event, payload):
+    """Apply one queued webhook; raises so the queue retries it"""
+    if event == COMPLETED_EVENT:
+        if not process_payment_completion(payload):
+            raise RuntimeError(f"Payment completion failed for order {payload.get('merchantOrderId')}")
+    elif event == FAILED_EVENT:
+        merchant_order_id = payload.get('merchantOrderId')
+        if merchant_order_id:
+            update_payment_status(merchant_order_id, 'FAILED', payload, unless_status='COMPLETED')
+            logger.info(f"Payment failed for order {merchant_order_id}")
+    else:
+        logger.warning(f"Unknown event type: {event}")
@@ -0,0 +1,133 @@
+"""
+Minimal vector PDF writer.
+
+Draws text, lines and filled boxes with the standard Helvetica fonts, which
+every PDF viewer has built in, so nothing is embedded and a month's register
+comes out at a few kilobytes. Pages are written out as they are produced so
+a response can be streamed.
+"""
+
+import zlib
+
+A4_LANDSCAPE = (842, 595)  # points
+
+FONTS = {"regular": ("F1", "Helvetica"), "bold": ("F2", "Helvetica-Bold")}
+
+# Glyph widths (1/1000 em) for printable ASCII, from the Adobe core font metrics
+_WIDTHS = {
+    "regular": [
+        278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+        556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+        1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+        667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+        333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+        556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+    ],
+    "bold": [
+        278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+        556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+        975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+        667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+        333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+        611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+    ],
+}
+
+
+def text_width(text, size, font="regular"):
+    """Width of a string in points"""
+    widths = _WIDTHS[font]
+    return sum(widths[ord(ch) - 32] if 32 <= ord(ch) < 127 else 556 for ch in text) * size / 1000
+
+
+def _escape(text):
+    data = text.encode("cp1252", "replace")
+    return data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+def _num(value):
+    return f"{value:.2f}".rstrip("0").rstrip(".")
+
+
+class Page:
+    """One page of drawing operations; coordinates are from the top-left"""
+
+    def __init__(self, size=A4_LANDSCAPE):
+        self.width, self.height = size
+        self._ops = []
+
+    def text(self, x, y, text, size=7, font="regular", align="left"):
+        """Draw text with its baseline at y; x is the left, centre or right edge"""
+        text = str(text)
+        if align != "left":
+            width = text_width(text, size, font)
+            x -= width / 2 if align == "center" else width
+        self._ops.append(
+            b"BT /%s %s Tf %s %s Td (%s) Tj ET"
+            % (FONTS[font][0].encode(), _num(size).encode(), _num(x).encode(),
+               _num(self.height - y).encode(), _escape(text))
+        )
+
+    def line(self, x1, y1, x2, y2, width=0.5):
+        self._ops.append(
+            b"%s w %s %s m %s %s l S"
+            % tuple(_num(v).encode() for v in (width, x1, self.height - y1, x2, self.height - y2))
+        )
+
+    def fill(self, x, y, w, h, gray=0.9):
+        """Fill a box whose top-left corner is (x, y)"""
+        self._ops.append(
+            b"%s g %s %s %s %s re f 0 g"
+            % tuple(_num(v).encode() for v in (gray, x, self.height - y - h, w, h))
+        )
+
+    def content(self):
+        return b"\n".join(self._ops)
+
+
+def render(pages, title=""):
+    """
+    Yield the bytes of a PDF document, one object at a time.
+    `pages` may be a generator; each page is written as soon as it is drawn.
+    """
+    offsets = {}
+    position = 0
+
+    def emit(number, body):
+        nonlocal position
+        offsets[number] = position
+        chunk = b"%d 0 obj\n%s\nendobj\n" % (number, body)
+        position += len(chunk)
+        return chunk
+
+    header = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+    position = len(header)
+    yield header
+    # 1: catalog, 2: page tree (written last), 3-4: fonts, 5: info, then content/page pairs
+    yield emit(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+    for number, (_, base) in enumerate(FONTS.values(), start=3):
+        yield emit(number, b"<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>" % base.encode())
+    yield emit(5, b"<< /Title (%s) /Producer (MDM) >>" % _escape(title))
+    resources = b"<< /Font << %s >> >>" % b" ".join(
+        b"/%s %d 0 R" % (name.encode(), number) for number, (name, _) in enumerate(FONTS.values(), start=3)
+    )
+
+    kids = []
+    number = 6
+    for page in pages:
+        stream = zlib.compress(page.content())
+        yield emit(number, b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream" % (len(stream), stream))
+        yield emit(
+            number + 1,
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Resources %s /Contents %d 0 R >>"
+            % (page.width, page.height, resources, number),
+        )
+        kids.append(number + 1)
+        number += 2
+
+    yield emit(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % k for k in kids), len(kids)))
+
+    xref = [b"xref\n0 %d\n" % number, b"0000000000 65535 f \n"]
+    xref += [b"%010d 00000 n \n" % offsets[n] for n in range(1, number)]
+    yield b"".join(xref)
+    yield b"trailer\n<< /Size %d /Root 1 0 R /Info 5 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (number, position)
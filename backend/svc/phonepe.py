@@ -0,0 +1,63 @@
+"""
+The PhonePe Standard Checkout client, shared by the payment routes and the
+pending-order reconciler (svc/reconcile.py). Calls go through pay() and
+order_status() so they are timed in svc.metrics.
+
+The SDK is imported and the client created on the first call, so importing
+the app stays cheap.
+"""
+
+import json
+import os
+import threading
+from svc import metrics
+
+PHONEPE_CLIENT_ID = os.getenv("PHONEPE_CLIENT_ID")
+PHONEPE_CLIENT_SECRET = os.getenv("PHONEPE_CLIENT_SECRET")
+CLIENT_VERSION = os.getenv("CLIENT_VERSION")
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The StandardCheckoutClient, created on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from phonepe.sdk.pg.payments.v2.standard_checkout_client import StandardCheckoutClient
+                from phonepe.sdk.pg.env import Env
+                _client = StandardCheckoutClient.get_instance(
+                    client_id=PHONEPE_CLIENT_ID, 
+                    client_secret=PHONEPE_CLIENT_SECRET, 
+                    client_version=CLIENT_VERSION, 
+                    env=Env.PRODUCTION,
+                    should_publish_events=True
+                )
+    return _client
+
+
+def build_pay_request(merchant_order_id, amount, redirect_url, meta_info):
+    """A StandardCheckoutPayRequest; meta_info is a dict of udf1..udf5"""
+    from phonepe.sdk.pg.payments.v2.models.request.standard_checkout_pay_request import StandardCheckoutPayRequest
+    from phonepe.sdk.pg.common.models.request.meta_info import MetaInfo
+    return StandardCheckoutPayRequest.build_request(
+        merchant_order_id=merchant_order_id,
+        amount=amount,
+        redirect_url=redirect_url,
+        meta_info=MetaInfo(**meta_info),
+    )
+
+
+def pay(pay_request):
+    """Start a checkout; the response carries the redirect_url"""
+    with metrics.timed("phonepe", "pay"):
+        return get_client().pay(pay_request)
+
+
+def order_status(order_id):
+    """PhonePe's view of an order: (state, JSON-safe response details)"""
+    with metrics.timed("phonepe", "get_order_status"):
+        response = get_client().get_order_status(order_id, details=False)
+    return response.state, json.loads(json.dumps(response.__dict__, default=str))
@@ -0,0 +1,218 @@
+"""
+On-demand sampling profiler for live workers.
+
+A sampler thread reads every thread's stack with sys._current_frames()
+each PROFILE_INTERVAL seconds and writes the counts in the collapsed-stack
+format flamegraph.pl, speedscope and inferno read, one file per session in
+PROFILE_DIR. The thread only exists while a session is running; when
+profiling is off a request costs a header lookup at most.
+
+Sessions can be started:
+- for one request: send `X-Profile: <PROFILE_TOKEN>`; the file name comes
+  back in the X-Profile-File header. Only the request's own thread is
+  sampled, until its response has been sent.
+- for one worker and a time window: POST /debug/profile?seconds=30 with
+  the same header profiles whichever worker answers (its pid is in the
+  reply); `kill -USR2 <worker pid>` profiles that worker for
+  PROFILE_SIGNAL_SECONDS. All threads are sampled, each stack rooted at
+  its thread name, so scheduler jobs show up too.
+- for scheduler jobs: list job function names (or "all") in PROFILE_JOBS
+  and every run of them is profiled.
+
+Request and window sessions need PROFILE_TOKEN to be set. The same token
+guards the operator stats endpoints (token_required).
+"""
+
+import functools
+import hmac
+import logging
+import os
+import re
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from flask import current_app, jsonify, request
+
+logger = logging.getLogger(__name__)
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/mdm-profiles")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))  # seconds between samples
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "300"))
+PROFILE_SIGNAL_SECONDS = float(os.getenv("PROFILE_SIGNAL_SECONDS", "30"))
+PROFILE_MAX_SESSIONS = int(os.getenv("PROFILE_MAX_SESSIONS", "4"))
+PROFILE_JOBS = {name for name in os.getenv("PROFILE_JOBS", "").split(",") if name}
+
+PROFILE_HEADER = "X-Profile"
+FILE_HEADER = "X-Profile-File"
+
+_lock = threading.Lock()
+_sessions = set()
+_sampler = None
+
+
+class Session:
+    """Stack counts for one profile; thread_ids=None samples every thread"""
+
+    def __init__(self, kind, name, thread_ids=None, seconds=None):
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", name).strip("_") or "root"
+        self.path = os.path.join(PROFILE_DIR, f"{kind}-{stamp}-{os.getpid()}-{safe_name}.folded")
+        self.thread_ids = thread_ids
+        self.deadline = time.monotonic() + seconds if seconds else None
+        self.counts = Counter()
+        self.samples = 0
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _fold(frame, root=None):
+    stack = []
+    while frame is not None:
+        stack.append(_frame_name(frame))
+        frame = frame.f_back
+    if root:
+        stack.append(root)
+    return ";".join(reversed(stack))
+
+
+def _sample_loop():
+    global _sampler
+    me = threading.get_ident()
+    while True:
+        with _lock:
+            if not _sessions:
+                _sampler = None
+                return
+            sessions = list(_sessions)
+        frames = sys._current_frames()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        now = time.monotonic()
+        for session in sessions:
+            if session.deadline and now >= session.deadline:
+                stop(session)
+                continue
+            for thread_id, frame in frames.items():
+                if thread_id == me:
+                    continue
+                if session.thread_ids is None:
+                    session.counts[_fold(frame, names.get(thread_id, str(thread_id)))] += 1
+                elif thread_id in session.thread_ids:
+                    session.counts[_fold(frame)] += 1
+            session.samples += 1
+        del frames
+        time.sleep(PROFILE_INTERVAL)
+
+
+def start(kind, name, thread_ids=None, seconds=None):
+    """Begin a session; returns it, or None if PROFILE_MAX_SESSIONS are already running"""
+    global _sampler
+    session = Session(kind, name, thread_ids, seconds)
+    with _lock:
+        if len(_sessions) >= PROFILE_MAX_SESSIONS:
+            return None
+        _sessions.add(session)
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample_loop, name="profiler", daemon=True)
+            _sampler.start()
+    return session
+
+
+def stop(session):
+    """End a session and write its stacks; returns the file path"""
+    with _lock:
+        if session not in _sessions:
+            return session.path
+        _sessions.discard(session)
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        with open(session.path, "w") as f:
+            for stack, count in session.counts.most_common():
+                f.write(f"{stack} {count}\n")
+        logger.info(f"Profile written to {session.path} ({session.samples} samples)")
+    except OSError as e:
+        logger.error(f"Could not write profile {session.path}: {e}")
+    return session.path
+
+
+def _authorised():
+    token = request.headers.get(PROFILE_HEADER)
+    return bool(PROFILE_TOKEN and token and hmac.compare_digest(token, PROFILE_TOKEN))
+
+
+def token_required(view):
+    """
+    Serve an operator view (e.g. /cache/stats) only to requests carrying
+    the X-Profile token. The header does not start a profile for these.
+    """
+    @functools.wraps(view)
+    def guarded(*args, **kwargs):
+        if not _authorised():
+            return jsonify({'error': 'Unauthorized'}), 401
+        return view(*args, **kwargs)
+    guarded.operator_view = True
+    return guarded
+
+
+# -- Flask hooks --------------------------------------------------------------
+
+def before_request():
+    if not PROFILE_TOKEN or PROFILE_HEADER not in request.headers or not _authorised():
+        return
+    if getattr(current_app.view_functions.get(request.endpoint), "operator_view", False):
+        return
+    request.environ["mdm.profile"] = start("request", f"{request.method}_{request.path}", {threading.get_ident()})
+
+
+def after_request(response):
+    session = request.environ.get("mdm.profile")
+    if session is not None:
+        response.headers[FILE_HEADER] = session.path
+        # After the body has been sent, so streamed responses are covered too
+        response.call_on_close(lambda: stop(session))
+    return response
+
+
+def profile_window():
+    """View for POST /debug/profile?seconds=N: profile this worker for a while"""
+    if not _authorised():
+        return jsonify({'error': 'Unauthorized'}), 401
+    seconds = min(request.args.get("seconds", PROFILE_SIGNAL_SECONDS, type=float), PROFILE_MAX_SECONDS)
+    session = start("worker", f"{seconds:g}s", seconds=seconds)
+    if session is None:
+        return jsonify({'error': 'Too many profiles running'}), 429
+    return jsonify({'pid': os.getpid(), 'seconds': seconds, 'file': session.path})
+
+
+# -- workers and jobs ---------------------------------------------------------
+
+def install_signal_handler(signum=signal.SIGUSR2):
+    """Profile this process for PROFILE_SIGNAL_SECONDS on `signum`; gunicorn installs it per worker"""
+    def handler(_signum, _frame):
+        # Not start() itself: the interrupted code may be holding _lock
+        threading.Thread(
+            target=start, args=("worker", f"signal-{PROFILE_SIGNAL_SECONDS:g}s"),
+            kwargs={"seconds": PROFILE_SIGNAL_SECONDS}, daemon=True,
+        ).start()
+    signal.signal(signum, handler)
+
+
+def profiled(fn):
+    """Wrap a scheduler job so its runs are profiled when listed in PROFILE_JOBS"""
+    if not ({"all", fn.__name__} & PROFILE_JOBS):
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        session = start("job", fn.__name__, {threading.get_ident()})
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            if session is not None:
+                stop(session)
+    return wrapper
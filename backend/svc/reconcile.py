@@ -0,0 +1,68 @@
+"""
+Resolve payments left pending when no webhook arrived.
+
+Every RECONCILE_INTERVAL seconds the scheduler worker (svc.jobs) takes up
+to RECONCILE_BATCH_SIZE pending payments created between RECONCILE_MAX_AGE
+and RECONCILE_MIN_AGE ago, asks PhonePe for their state with at most
+RECONCILE_CONCURRENCY calls in flight, and applies the answers through the
+same completion path as the webhook. The /api/pay/status redirect and the
+payment page's /api/pay/order polls queue a single order (RECONCILE_EVENT)
+on the webhook queue to have it checked straight away, at most one job per
+order at a time.
+"""
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from db import get_pending_payments, update_payment_status
+from svc.payments import PENDING_STATES, process_payment_completion
+from svc.phonepe import order_status
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_INTERVAL = int(os.getenv("RECONCILE_INTERVAL", "60"))  # seconds
+RECONCILE_MIN_AGE = int(os.getenv("RECONCILE_MIN_AGE", "60"))  # seconds; younger orders wait for their webhook
+RECONCILE_MAX_AGE = int(os.getenv("RECONCILE_MAX_AGE", "172800"))  # seconds; older orders are left alone
+RECONCILE_BATCH_SIZE = int(os.getenv("RECONCILE_BATCH_SIZE", "100"))
+RECONCILE_CONCURRENCY = int(os.getenv("RECONCILE_CONCURRENCY", "4"))
+
+RECONCILE_EVENT = "reconcile.order"
+
+
+def reconcile_order(order_id):
+    """Ask PhonePe about one order and record the answer; returns its state"""
+    state, details = order_status(order_id)
+    if state == 'COMPLETED':
+        payload = {**details, 'merchantOrderId': order_id, 'state': state}
+        if not process_payment_completion(payload):
+            raise RuntimeError(f"Payment completion failed for order {order_id}")
+    elif state not in PENDING_STATES:
+        update_payment_status(order_id, state, details, unless_status='COMPLETED')
+    return state
+
+
+def _reconcile_quietly(order_id):
+    try:
+        return reconcile_order(order_id)
+    except Exception as e:
+        logger.error(f"Reconciling order {order_id} failed: {str(e)}")
+        return "error"
+
+
+def reconcile_pending():
+    """Check every stale pending payment in one batch; returns a count per resulting state"""
+    now = datetime.now(timezone.utc)
+    payments = get_pending_payments(
+        now - timedelta(seconds=RECONCILE_MIN_AGE),
+        now - timedelta(seconds=RECONCILE_MAX_AGE),
+        RECONCILE_BATCH_SIZE,
+    )
+    counts = {}
+    if not payments:
+        return counts
+    with ThreadPoolExecutor(max_workers=RECONCILE_CONCURRENCY, thread_name_prefix="reconcile") as pool:
+        for state in pool.map(_reconcile_quietly, [p['order_id'] for p in payments]):
+            counts[state] = counts.get(state, 0) + 1
+    logger.info(f"Reconciled {len(payments)} pending payments: {counts}")
+    return counts
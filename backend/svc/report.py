@@ -0,0 +1,242 @@
+"""
+Monthly register reports rendered as vector PDF.
+
+Each register is built from the same data the /api/<register> routes serve
+and drawn as a table with svc.pdf. Rendered files are kept per worker, keyed
+by (kind, user, month, data version), where the version is a hash of the
+rows the report was drawn from, so a save never serves a stale file.
+"""
+
+import calendar
+import datetime
+import hashlib
+import json
+import os
+import threading
+from cachetools import LRUCache
+from db import get_meal_plans, get_egg_records
+from svc.ledger import COMMODITIES, GRADES, COUNT_FIELDS, daily_usage, get_stock_ledger, get_milk_ledger
+from svc.pdf import Page, render
+
+REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", "128"))
+
+# Cooking cost (Rs) per child per meal, as on the meals sheet
+SADILVARU_RATES = {"1-5": 2.15, "6-10": 3.12}
+
+MARGIN = 28
+ROW_HEIGHT = 11
+FONT_SIZE = 6.5
+
+_reports = LRUCache(maxsize=REPORT_CACHE_SIZE)
+_reports_lock = threading.Lock()
+
+
+def _day(date):
+    d = datetime.date.fromisoformat(str(date)[:10])
+    return f"{d.day} {d.strftime('%a')}"
+
+
+def _fmt(value, decimals):
+    if value is None or value == "":
+        return ""
+    if decimals is None:
+        return str(value)
+    return f"{float(value):.{decimals}f}"
+
+
+def _total(rows, columns):
+    """A TOTAL row summing every numeric column flagged as summable"""
+    total = {}
+    for _, _, _, key, decimals, summable in columns:
+        if summable:
+            total[key] = sum(float(r.get(key) or 0) for r in rows)
+    return total
+
+
+# Columns are (group, label, width, key, decimals, summable)
+
+def _meal_sheet(user_id, year, month):
+    meals = {str(m["date"])[:10]: m for m in get_meal_plans(user_id, year, month)}
+    columns = [(None, "Date", 38, "date", None, False), (None, "Meal", 32, "meal_type", None, False),
+               (None, "Pulses", 28, "has_pulses", None, False)]
+    for g in GRADES:
+        group = f"Class {g}"
+        columns.append((group, "Children", 36, f"cnt_{g}", 0, True))
+        columns += [(group, c.title(), 38, f"{c}_{g}", 3, True) for c in COMMODITIES]
+        columns.append((group, "Sadilvaru", 42, f"sadilvaru_{g}", 2, True))
+    columns += [(None, "Sadilvaru", 44, "sadilvaru", 2, True), (None, "Children", 38, "children", 0, True)]
+
+    rows = []
+    for day in range(1, calendar.monthrange(year, month)[1] + 1):
+        date = f"{year}-{month:02d}-{day:02d}"
+        meal = meals.get(date, {})
+        row = {"date": _day(date), "meal_type": (meal.get("meal_type") or "").title(),
+               "has_pulses": "Yes" if meal.get("has_pulses") else ("No" if meal.get("meal_type") else "")}
+        row["sadilvaru"] = row["children"] = 0
+        for g in GRADES:
+            cnt = (meal.get(COUNT_FIELDS[g]) or 0) if meal.get("meal_type") else 0
+            used = daily_usage(meal, g)
+            row[f"cnt_{g}"] = cnt
+            row.update({f"{c}_{g}": used[c] for c in COMMODITIES})
+            row[f"sadilvaru_{g}"] = cnt * SADILVARU_RATES[g]
+            row["sadilvaru"] += row[f"sadilvaru_{g}"]
+            row["children"] += cnt
+        rows.append(row)
+    return "Meals Register", columns, rows, list(meals.values())
+
+
+def _stock_sheet(user_id, year, month):
+    ledger = get_stock_ledger(user_id, year, month)
+    columns = [(None, "Date", 38, "date", None, False), (None, "Class", 28, "grade", None, False)]
+    for c in COMMODITIES:
+        group = c.title()
+        columns += [(group, "Open", 34, f"{c}_opening", 3, False), (group, "Recd", 32, f"{c}_add", 3, True),
+                    (group, "Total", 34, f"{c}_total", 3, False), (group, "Used", 32, f"{c}_used", 3, True),
+                    (group, "Close", 34, f"{c}_closing", 3, False)]
+    rows = []
+    for r in ledger:
+        row = dict(r, date=_day(r["date"]))
+        for c in COMMODITIES:
+            row[f"{c}_total"] = r[f"{c}_opening"] + r[f"{c}_add"]
+        rows.append(row)
+    return "Stock Register", columns, rows, ledger
+
+
+def _milk_sheet(user_id, year, month):
+    ledger = get_milk_ledger(user_id, year, month)
+    columns = [(None, "Date", 38, "date", None, False), (None, "Distribution", 54, "dist_type", None, False),
+               (None, "Children", 38, "children", 0, True)]
+    for group, kind, summable in (("Opening", "opening", False), ("Received", "rcpt", True),
+                                  ("Total", "total", False), ("Distributed", "used", True),
+                                  ("Closing", "close", False)):
+        columns += [(group, "Milk", 40, f"milk_{kind}", 3, summable), (group, "Ragi", 40, f"ragi_{kind}", 3, summable)]
+    rows = []
+    for r in ledger:
+        row = dict(r, date=_day(r["date"]), dist_type=r["dist_type"].title())
+        row["milk_total"] = r["milk_opening"] + r["milk_rcpt"]
+        row["ragi_total"] = r["ragi_opening"] + r["ragi_rcpt"]
+        rows.append(row)
+    return "Milk & Ragi Register", columns, rows, ledger
+
+
+def _egg_sheet(user_id, year, month):
+    records = {str(r["date"])[:10]: r for r in get_egg_records(user_id, year, month)}
+    columns = [(None, "Date", 38, "date", None, False), (None, "Payer", 34, "payer", None, False)]
+    for group, item in (("Egg", "egg"), ("Banana", "banana")):
+        columns += [(group, "M", 30, f"{item}_m", 0, True), (group, "F", 30, f"{item}_f", 0, True),
+                    (group, "Total", 34, f"{item}_total", 0, True), (group, "Amount", 44, f"{item}_amount", 2, True)]
+    columns += [(None, "Total", 34, "total", 0, True), (None, "Amount", 48, "amount", 2, True)]
+    rows = []
+    for day in range(1, calendar.monthrange(year, month)[1] + 1):
+        date = f"{year}-{month:02d}-{day:02d}"
+        r = records.get(date, {})
+        row = {"date": _day(date), "payer": r.get("payer") or ""}
+        for item in ("egg", "banana"):
+            row[f"{item}_m"] = r.get(f"{item}_m") or 0
+            row[f"{item}_f"] = r.get(f"{item}_f") or 0
+            row[f"{item}_total"] = row[f"{item}_m"] + row[f"{item}_f"]
+            row[f"{item}_amount"] = row[f"{item}_total"] * float(r.get(f"{item}_price") or 6.0)
+        row["total"] = row["egg_total"] + row["banana_total"]
+        row["amount"] = row["egg_amount"] + row["banana_amount"]
+        rows.append(row)
+    return "Egg & Banana Register", columns, rows, list(records.values())
+
+
+REPORTS = {
+    "meals": ("Meals", _meal_sheet),
+    "stock": ("Stock", _stock_sheet),
+    "milk": ("Milk_Ragi", _milk_sheet),
+    "egg": ("Egg_Banana", _egg_sheet),
+}
+
+
+def _draw_header(page, columns, y):
+    """Column group and label rows; returns the y below them"""
+    x = MARGIN
+    width = sum(c[2] for c in columns)
+    page.fill(MARGIN, y, width, ROW_HEIGHT * 2)
+    groups = []
+    for group, label, w, *_ in columns:
+        if group and groups and groups[-1][0] == group:
+            groups[-1][2] += w
+        else:
+            groups.append([group, x, w])
+        if group:
+            page.text(x + w / 2, y + ROW_HEIGHT * 2 - 3, label, FONT_SIZE, "bold", "center")
+        else:
+            page.text(x + w / 2, y + ROW_HEIGHT * 1.5 - 2, label, FONT_SIZE, "bold", "center")
+        x += w
+    for group, gx, w in groups:
+        page.line(gx, y, gx, y + ROW_HEIGHT * 2)
+        if group:
+            page.text(gx + w / 2, y + ROW_HEIGHT - 3, group, FONT_SIZE, "bold", "center")
+            page.line(gx, y + ROW_HEIGHT, gx + w, y + ROW_HEIGHT)
+    page.line(MARGIN + width, y, MARGIN + width, y + ROW_HEIGHT * 2)
+    page.line(MARGIN, y, MARGIN + width, y)
+    return y + ROW_HEIGHT * 2
+
+
+def _draw_row(page, columns, row, y, bold=False):
+    x = MARGIN
+    for _, _, w, key, decimals, _ in columns:
+        value = row.get(key)
+        text = _fmt(value, decimals)
+        if decimals is None:
+            page.text(x + 2, y + ROW_HEIGHT - 3, text, FONT_SIZE, "bold" if bold else "regular")
+        else:
+            page.text(x + w - 2, y + ROW_HEIGHT - 3, text, FONT_SIZE, "bold" if bold else "regular", "right")
+        page.line(x, y, x, y + ROW_HEIGHT, 0.3)
+        x += w
+    page.line(x, y, x, y + ROW_HEIGHT, 0.3)
+    page.line(MARGIN, y, x, y, 0.3)
+    page.line(MARGIN, y + ROW_HEIGHT, x, y + ROW_HEIGHT, 0.3)
+    return y + ROW_HEIGHT
+
+
+def _pages(title, columns, rows):
+    """Lay the table out over as many pages as it needs"""
+    total = dict(_total(rows, columns), **{columns[0][3]: "TOTAL"})
+    body = rows + [total]
+    page_number = 0
+    start = 0
+    while start < len(body):
+        page_number += 1
+        page = Page()
+        page.text(MARGIN, MARGIN, title, 12, "bold")
+        page.text(page.width - MARGIN, MARGIN, f"Page {page_number}", FONT_SIZE, align="right")
+        y = _draw_header(page, columns, MARGIN + 10)
+        while start < len(body) and y + ROW_HEIGHT <= page.height - MARGIN:
+            y = _draw_row(page, columns, body[start], y, bold=body[start] is total)
+            start += 1
+        yield page
+
+
+def prepare_report(kind, user_id, year, month):
+    """
+    Fetch a report's data and return (filename, version, sheet).
+    Raises KeyError for an unknown kind.
+    """
+    name, build_sheet = REPORTS[kind]
+    title, columns, rows, source = build_sheet(user_id, year, month)
+    payload = json.dumps(source, sort_keys=True, default=str).encode()
+    version = hashlib.sha256(payload).hexdigest()[:16]
+    filename = f"{name}_{calendar.month_name[month]}_{year}.pdf"
+    title = f"{title} - {calendar.month_name[month]} {year}"
+    return filename, version, (title, columns, rows)
+
+
+def cached_report(kind, user_id, year, month, version):
+    """A previously rendered PDF for this data version, or None"""
+    with _reports_lock:
+        return _reports.get((kind, str(user_id), year, month, version))
+
+
+def stream_report(kind, user_id, year, month, version, sheet):
+    """Yield the PDF in chunks, keeping a copy once it has been fully written"""
+    title, columns, rows = sheet
+    chunks = []
+    for chunk in render(_pages(title, columns, rows), title):
+        chunks.append(chunk)
+        yield chunk
+    with _reports_lock:
+        _reports[(kind, str(user_id), year, month, version)] = b"".join(chunks)
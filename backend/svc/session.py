@@ -0,0 +1,91 @@
+"""
+Stateless signed session tokens.
+
+/api/auth/login issues an HS256 JWT carrying the user id and the end of
+their subscription. Blueprints install session_guard() as a before_request
+hook, which checks the token locally; entitlement only touches the
+subscription cache once the token's subscription_end has passed, and then
+a refreshed token is returned in the X-Session-Token response header.
+"""
+
+import os
+import time
+import jwt
+from flask import g, jsonify, request
+from db import get_active_subscription
+from svc.cache import seconds_until
+
+SESSION_SECRET = os.getenv("SESSION_SECRET")
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(7 * 24 * 3600)))  # seconds
+SESSION_ALGORITHM = "HS256"
+REFRESH_HEADER = "X-Session-Token"
+
+if not SESSION_SECRET:
+    raise ValueError("SESSION_SECRET environment variable is required")
+
+
+def issue_token(user_id, subscription_end=None):
+    """Sign a session token for a user"""
+    now = int(time.time())
+    payload = {
+        "sub": str(user_id),
+        "subscription_end": subscription_end,
+        "iat": now,
+        "exp": now + SESSION_TTL,
+    }
+    return jwt.encode(payload, SESSION_SECRET, algorithm=SESSION_ALGORITHM)
+
+
+def decode_token(token):
+    """Verify a session token and return its claims; raises jwt.InvalidTokenError"""
+    return jwt.decode(token, SESSION_SECRET, algorithms=[SESSION_ALGORITHM], options={"require": ["sub", "exp"]})
+
+
+def _entitled(claims):
+    """True if the token, or failing that the subscription cache, shows an active subscription"""
+    subscription_end = claims.get("subscription_end")
+    if subscription_end and seconds_until(subscription_end) > 0:
+        return True
+
+    # The token predates a payment (or has lapsed): ask the cache, which
+    # process_payment_completion invalidates, and hand back a fresh token
+    sub = get_active_subscription(claims["sub"])
+    if not sub:
+        return False
+    g.subscription_end = sub["end_date"]
+    g.refreshed_token = issue_token(claims["sub"], sub["end_date"])
+    return True
+
+
+def session_guard(require_subscription=False, exempt=()):
+    """
+    Build a before_request hook that authenticates the bearer token and sets
+    g.user_id. Endpoints listed in `exempt` (e.g. 'pay.webhook') skip it.
+    """
+    def guard():
+        if request.method == "OPTIONS" or request.endpoint in exempt:
+            return None
+
+        header = request.headers.get("Authorization", "")
+        if not header.startswith("Bearer "):
+            return jsonify({'error': 'Authentication required'}), 401
+        try:
+            claims = decode_token(header[len("Bearer "):])
+        except jwt.InvalidTokenError:
+            return jsonify({'error': 'Invalid or expired session'}), 401
+
+        g.user_id = claims["sub"]
+        g.subscription_end = claims.get("subscription_end")
+        if require_subscription and not _entitled(claims):
+            return jsonify({'error': 'Active subscription required'}), 402
+        return None
+
+    return guard
+
+
+def attach_refreshed_token(response):
+    """after_request hook: pass on a token refreshed by the guard"""
+    token = g.get("refreshed_token")
+    if token:
+        response.headers[REFRESH_HEADER] = token
+    return response
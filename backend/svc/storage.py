@@ -0,0 +1,490 @@
+"""
+Storage backends for db.py.
+
+db.py reaches its tables through the part of the supabase-py query builder
+it uses: table(name) with select (column lists and one-level embeds),
+eq/neq/gt/gte/lt/lte/in_/or_ filters, order, limit and range, then insert,
+upsert on a conflict key, update or delete, each ending in execute() with
+the rows in .data; rpc("complete_payment"); and raw SQL through query_db().
+
+Two backends are available, picked with STORAGE_BACKEND:
+- "supabase" (default): the Supabase REST client on the pooled transport
+  in svc/transport.py; raw SQL goes to DATABASE_URL.
+- "sqlite": a local SQLite file (STORAGE_PATH) with the same tables,
+  conflict keys and indexes (sql/sqlite_schema.sql). Every call is a local
+  query with no network round-trip, for single-school or offline installs
+  and for tests and benchmarks. Raw SQL runs on the same file.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from svc import metrics
+from svc.transport import build_http_client
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase")
+STORAGE_PATH = os.getenv("STORAGE_PATH", "mdm.sqlite3")
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sql", "sqlite_schema.sql")
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# PostgREST filter operators and their SQL
+_OPERATORS = {"eq": "=", "neq": "<>", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+
+def create_supabase(url, key):
+    """Supabase client on a pooled HTTP/2 transport; returns (http_client, client)"""
+    # Deferred: the supabase package (storage3, pyiceberg, ...) takes over a
+    # second to import, and only a request needs it
+    from supabase import create_client, ClientOptions
+    http_client = build_http_client()
+    return http_client, create_client(url, key, options=ClientOptions(httpx_client=http_client))
+
+
+def _now():
+    # Same text as the schema's strftime() defaults, so timestamps compare as strings
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+
+
+def _quote(name):
+    if not _IDENTIFIER.match(name):
+        raise ValueError(f"Invalid identifier: {name!r}")
+    return f'"{name}"'
+
+
+def _split_top(text, sep=","):
+    """Split on `sep` outside parentheses"""
+    parts, depth, start = [], 0, 0
+    for i, ch in enumerate(text):
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == sep and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _condition(column, op, value):
+    """SQL and parameters for one filter"""
+    column = _quote(column)
+    if op in _OPERATORS:
+        return f"{column} {_OPERATORS[op]} ?", [_now() if value == "now()" else value]
+    if op == "in":
+        values = list(value)
+        if not values:
+            return "0", []
+        return f"{column} IN ({', '.join('?' * len(values))})", values
+    if op == "is":
+        if value in (None, "null"):
+            return f"{column} IS NULL", []
+        return f"{column} IS ?", [value in (True, "true")]
+    raise ValueError(f"Unsupported filter: {op}")
+
+
+def _logic(kind, body):
+    """SQL for a PostgREST or=(...) / and(...) filter string"""
+    clauses, params = [], []
+    for part in _split_top(body):
+        if part.startswith(("or(", "and(")):
+            inner_kind, _, rest = part.partition("(")
+            sql, args = _logic(inner_kind, rest[:-1])
+        else:
+            column, _, expr = part.partition(".")
+            negate = expr.startswith("not.")
+            if negate:
+                expr = expr[4:]
+            op, _, text = expr.partition(".")
+            value = [v.strip('"') for v in _split_top(text.strip("()"))] if op == "in" else text.strip('"')
+            sql, args = _condition(column, op, value)
+            if negate:
+                sql = f"NOT ({sql})"
+        clauses.append(sql)
+        params.extend(args)
+    return "(" + f" {kind.upper()} ".join(clauses) + ")", params
+
+
+class Response:
+    """What execute() returns; rows in .data, like postgrest's APIResponse"""
+
+    def __init__(self, data):
+        self.data = data
+        self.count = None
+
+
+class _Clauses:
+    """WHERE / ORDER BY / LIMIT for a query or one of its embeds"""
+
+    def __init__(self):
+        self.where = []
+        self.params = []
+        self.order = []
+        self.limit = None
+        self.offset = None
+
+    def sql(self):
+        text = ""
+        if self.where:
+            text += " WHERE " + " AND ".join(self.where)
+        if self.order:
+            text += " ORDER BY " + ", ".join(self.order)
+        if self.limit is not None:
+            text += f" LIMIT {int(self.limit)}"
+            if self.offset:
+                text += f" OFFSET {int(self.offset)}"
+        return text
+
+
+class Query:
+    """A query builder for one table, executed against a SQLiteStorage"""
+
+    def __init__(self, storage, table):
+        self.storage = storage
+        self.table = table
+        self.action = "select"
+        self.columns = "*"
+        self.rows = None
+        self.on_conflict = None
+        self.clauses = _Clauses()
+        self.embeds = {}
+
+    # -- actions -------------------------------------------------------------
+
+    def select(self, columns="*", **_options):
+        self.columns = columns
+        return self
+
+    def insert(self, rows, **_options):
+        self.action, self.rows = "insert", rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows, on_conflict="", **_options):
+        self.action, self.rows = "upsert", rows if isinstance(rows, list) else [rows]
+        self.on_conflict = [c for c in on_conflict.split(",") if c] or ["id"]
+        return self
+
+    def update(self, data, **_options):
+        self.action, self.rows = "update", [data]
+        return self
+
+    def delete(self, **_options):
+        self.action = "delete"
+        return self
+
+    # -- filters and modifiers -----------------------------------------------
+
+    def _clauses(self, embed=None):
+        return self.embeds.setdefault(embed, _Clauses()) if embed else self.clauses
+
+    def _scope(self, column, embed=None):
+        """The clauses a filter on `column` belongs to, this table's or an embed's, and the bare column"""
+        table, _, column = column.rpartition(".")
+        return self._clauses(table or embed), column
+
+    def _filter(self, column, op, value):
+        clauses, column = self._scope(column)
+        sql, params = _condition(column, op, value)
+        clauses.where.append(sql)
+        clauses.params.extend(params)
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, "eq", value)
+
+    def neq(self, column, value):
+        return self._filter(column, "neq", value)
+
+    def gt(self, column, value):
+        return self._filter(column, "gt", value)
+
+    def gte(self, column, value):
+        return self._filter(column, "gte", value)
+
+    def lt(self, column, value):
+        return self._filter(column, "lt", value)
+
+    def lte(self, column, value):
+        return self._filter(column, "lte", value)
+
+    def in_(self, column, values):
+        return self._filter(column, "in", values)
+
+    def is_(self, column, value):
+        return self._filter(column, "is", value)
+
+    def or_(self, filters, reference_table=None, foreign_table=None):
+        clauses = self._clauses(reference_table or foreign_table)
+        sql, params = _logic("or", filters)
+        clauses.where.append(sql)
+        clauses.params.extend(params)
+        return self
+
+    def order(self, column, desc=False, nullsfirst=None, foreign_table=None, reference_table=None):
+        clauses, column = self._scope(column, reference_table or foreign_table)
+        # Postgres puts nulls last ascending and first descending
+        nulls_first = desc if nullsfirst is None else nullsfirst
+        clauses.order.append(f"{_quote(column)} {'DESC' if desc else 'ASC'} NULLS {'FIRST' if nulls_first else 'LAST'}")
+        return self
+
+    def limit(self, size, foreign_table=None, reference_table=None):
+        self._clauses(reference_table or foreign_table).limit = size
+        return self
+
+    def range(self, start, end, foreign_table=None, reference_table=None):
+        clauses = self._clauses(reference_table or foreign_table)
+        clauses.limit, clauses.offset = end - start + 1, start
+        return self
+
+    def execute(self):
+        # HTTP method labels, so dashboards read the same for either backend
+        method = {"select": "GET", "insert": "POST", "upsert": "POST", "update": "PATCH", "delete": "DELETE"}[self.action]
+        with metrics.timed("db", self.table, method):
+            return Response(getattr(self.storage, f"_{self.action}")(self))
+
+
+class _RPC:
+    def __init__(self, storage, name, params):
+        self.storage = storage
+        self.name = name
+        self.params = params
+
+    def execute(self):
+        function = getattr(self.storage, f"rpc_{self.name}", None)
+        if function is None:
+            raise ValueError(f"Unknown function: {self.name}")
+        with metrics.timed("db", f"rpc/{self.name}", "POST"):
+            return Response(function(**self.params))
+
+
+class SQLiteStorage:
+    """The tables in a local SQLite file, behind the Supabase query builder"""
+
+    name = "sqlite"
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._columns = {}
+        with open(SCHEMA_PATH) as f:
+            self._conn().executescript(f.read())
+
+    def _conn(self):
+        # One connection per thread, re-opened in a forked child
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _transaction(self, work):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = work(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    def table(self, name):
+        _quote(name)
+        return Query(self, name)
+
+    def rpc(self, name, params=None):
+        return _RPC(self, name, params or {})
+
+    # -- values ----------------------------------------------------------------
+
+    def columns(self, table):
+        """{column: declared type} for a table"""
+        types = self._columns.get(table)
+        if types is None:
+            rows = self._conn().execute(f"PRAGMA table_info({_quote(table)})").fetchall()
+            if not rows:
+                raise ValueError(f"Unknown table: {table}")
+            types = self._columns[table] = {r["name"]: r["type"].upper() for r in rows}
+        return types
+
+    def _encode(self, table, row, new=False):
+        """Column values for SQLite; new rows of uuid-keyed tables get an id"""
+        types = self.columns(table)
+        out = {}
+        for column, value in row.items():
+            if column not in types:
+                raise ValueError(f"Unknown column {table}.{column}")
+            if value == "now()":
+                value = _now()
+            elif types[column] == "JSON" and value is not None:
+                value = json.dumps(value, default=str)
+            elif isinstance(value, (dict, list)):
+                value = json.dumps(value, default=str)
+            out[column] = value
+        if new and "id" not in out and types.get("id") == "TEXT":
+            out["id"] = str(uuid.uuid4())
+        return out
+
+    def _decode(self, table, row):
+        types = self.columns(table)
+        out = dict(row)
+        for column, value in out.items():
+            if value is None:
+                continue
+            if types.get(column) == "BOOLEAN":
+                out[column] = bool(value)
+            elif types.get(column) == "JSON" and isinstance(value, str):
+                out[column] = json.loads(value)
+        return out
+
+    def _fetch(self, table, sql, params):
+        return [self._decode(table, r) for r in self._conn().execute(sql, params).fetchall()]
+
+    # -- select ----------------------------------------------------------------
+
+    def _project(self, query, table, row, columns):
+        if columns.strip() in ("", "*"):
+            return row
+        out = {}
+        for part in _split_top(columns):
+            if "(" in part:
+                name, _, inner = part.partition("(")
+                out[name.strip()] = self._embed(query, table, row, name.strip(), inner[:-1])
+            elif part == "*":
+                out.update(row)
+            else:
+                out[part] = row.get(part)
+        return out
+
+    def _embed(self, query, table, row, name, columns):
+        """One-level embed: a to-one row through <name singular>_id, or to-many rows pointing back"""
+        clauses = query.embeds.get(name) or _Clauses()
+        many_to_one = f"{name.rstrip('s')}_id"
+        one_to_many = f"{table.rstrip('s')}_id"
+        if many_to_one in self.columns(table):
+            key, column = row.get(many_to_one), "id"
+        elif one_to_many in self.columns(name):
+            key, column = row.get("id"), one_to_many
+        else:
+            raise ValueError(f"No relationship between {table} and {name}")
+        sql = f"SELECT * FROM {_quote(name)} WHERE {_quote(column)} = ?"
+        if clauses.where:
+            sql += " AND " + " AND ".join(clauses.where)
+        tail = _Clauses()
+        tail.order, tail.limit, tail.offset = clauses.order, clauses.limit, clauses.offset
+        rows = self._fetch(name, sql + tail.sql(), [key, *clauses.params])
+        rows = [self._project(query, name, r, columns) for r in rows]
+        if column == "id":
+            return rows[0] if rows else None
+        return rows
+
+    def _select(self, query):
+        rows = self._fetch(query.table, f"SELECT * FROM {_quote(query.table)}{query.clauses.sql()}", query.clauses.params)
+        return [self._project(query, query.table, r, query.columns) for r in rows]
+
+    # -- writes ----------------------------------------------------------------
+
+    def _insert(self, query):
+        def work(conn):
+            saved = []
+            for row in query.rows:
+                row = self._encode(query.table, row, new=True)
+                names = ", ".join(_quote(c) for c in row)
+                sql = f"INSERT INTO {_quote(query.table)} ({names}) VALUES ({', '.join('?' * len(row))}) RETURNING *"
+                saved.append(self._decode(query.table, conn.execute(sql, list(row.values())).fetchone()))
+            return saved
+        return self._transaction(work)
+
+    def _upsert(self, query):
+        key = [_quote(c) for c in query.on_conflict]
+        stamp = "updated_at" in self.columns(query.table)
+
+        def work(conn):
+            saved = []
+            for posted in query.rows:
+                row = self._encode(query.table, posted, new=True)
+                names = ", ".join(_quote(c) for c in row)
+                # A generated id only applies to a new row, never to the one it conflicts with
+                updates = [
+                    f"{_quote(c)} = excluded.{_quote(c)}" for c in row
+                    if c not in query.on_conflict and (c != "id" or "id" in posted)
+                ]
+                params = list(row.values())
+                if stamp and "updated_at" not in row:
+                    updates.append('"updated_at" = ?')
+                    params.append(_now())
+                sql = (
+                    f"INSERT INTO {_quote(query.table)} ({names}) VALUES ({', '.join('?' * len(row))})"
+                    f" ON CONFLICT ({', '.join(key)}) DO UPDATE SET {', '.join(updates or [f'{key[0]} = excluded.{key[0]}'])}"
+                    " RETURNING *"
+                )
+                saved.append(self._decode(query.table, conn.execute(sql, params).fetchone()))
+            return saved
+        return self._transaction(work)
+
+    def _update(self, query):
+        data = self._encode(query.table, query.rows[0])
+        if "updated_at" in self.columns(query.table) and "updated_at" not in data:
+            data["updated_at"] = _now()
+        assignments = ", ".join(f"{_quote(c)} = ?" for c in data)
+        sql = f"UPDATE {_quote(query.table)} SET {assignments}{query.clauses.sql()} RETURNING *"
+        return self._transaction(lambda conn: [
+            self._decode(query.table, r) for r in conn.execute(sql, [*data.values(), *query.clauses.params]).fetchall()
+        ])
+
+    def _delete(self, query):
+        sql = f"DELETE FROM {_quote(query.table)}{query.clauses.sql()} RETURNING *"
+        return self._transaction(lambda conn: [
+            self._decode(query.table, r) for r in conn.execute(sql, query.clauses.params).fetchall()
+        ])
+
+    # -- functions and raw SQL -------------------------------------------------
+
+    def rpc_complete_payment(self, p_order_id, p_pp_data=None):
+        """sql/complete_payment.sql for SQLite: mark COMPLETED and create the subscription in one transaction"""
+        def work(conn):
+            now = _now()
+            pp_data = json.dumps(p_pp_data, default=str) if p_pp_data is not None else None
+            paid = conn.execute(
+                "UPDATE payments SET status = 'COMPLETED', pp_data = coalesce(?, pp_data), updated_at = ?"
+                " WHERE order_id = ? AND status IS NOT 'COMPLETED' RETURNING *",
+                (pp_data, now, p_order_id),
+            ).fetchone()
+            if paid is None:
+                paid = conn.execute("SELECT * FROM payments WHERE order_id = ?", (p_order_id,)).fetchone()
+                if paid is None:
+                    return {"status": "not_found"}
+            months = 3 if paid["plan"] == "3_month" else 1
+            start = datetime.now(timezone.utc)
+            created = conn.execute(
+                "INSERT INTO subscriptions (id, user_id, payment_id, plan_type, start_date, end_date, status)"
+                " VALUES (?, ?, ?, ?, ?, ?, 'active')"
+                " ON CONFLICT (payment_id) WHERE payment_id IS NOT NULL DO NOTHING RETURNING id",
+                (str(uuid.uuid4()), paid["user_id"], paid["id"], paid["plan"],
+                 start.isoformat(timespec="milliseconds"),
+                 (start + timedelta(days=30 * months)).isoformat(timespec="milliseconds")),
+            ).fetchone()
+            return {
+                "status": "completed" if created else "already_completed",
+                "user_id": paid["user_id"],
+                "payment_id": paid["id"],
+                "subscription_id": created["id"] if created else None,
+            }
+        return self._transaction(work)
+
+    def query(self, sql, args=()):
+        """Raw SQL written for psycopg2 (%s placeholders); rows as dicts"""
+        with metrics.timed("db", "sql", "SQL"):
+            cursor = self._conn().execute(sql.replace("%s", "?"), tuple(args))
+            return [dict(r) for r in cursor.fetchall()] if cursor.description else []
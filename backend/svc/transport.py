@@ -0,0 +1,130 @@
+"""
+Pooled HTTP transport for the Supabase client.
+
+supabase-py builds its own httpx client per sub-client with default limits.
+Here one httpx.Client is shared by PostgREST and auth calls, with an explicit
+keep-alive pool per worker, HTTP/2 multiplexing and connect/read timeouts,
+and it counts requests so the pool can be sized from /pool/stats. Every
+call is also timed into svc.metrics, labelled with its table.
+"""
+
+import os
+import threading
+import time
+import httpx
+from svc import metrics
+
+SUPABASE_HTTP2 = os.getenv("SUPABASE_HTTP2", "1") == "1"
+SUPABASE_MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", "20"))
+SUPABASE_MAX_KEEPALIVE = int(os.getenv("SUPABASE_MAX_KEEPALIVE", "10"))
+SUPABASE_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY", "30"))  # seconds
+
+# Timeouts in seconds; the pool timeout is how long a request waits for a free connection
+SUPABASE_CONNECT_TIMEOUT = float(os.getenv("SUPABASE_CONNECT_TIMEOUT", "5"))
+SUPABASE_READ_TIMEOUT = float(os.getenv("SUPABASE_READ_TIMEOUT", "30"))
+SUPABASE_POOL_TIMEOUT = float(os.getenv("SUPABASE_POOL_TIMEOUT", "10"))
+
+
+def _table(request):
+    """The PostgREST table (or rpc/<name>) a request is for"""
+    path = request.url.path
+    if "/rest/v1/" in path:
+        return path.split("/rest/v1/", 1)[1] or "root"
+    return path.strip("/").split("/", 1)[0] or "root"
+
+
+class _TimedStream(httpx.SyncByteStream):
+    """Response body that records the call's latency once it has been read"""
+
+    def __init__(self, stream, done):
+        self._stream = stream
+        self._done = done
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            done, self._done = self._done, None
+            if done:
+                done()
+
+
+class CountingTransport(httpx.HTTPTransport):
+    """HTTPTransport that keeps request and concurrency counters"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        # Includes requests still waiting for a free connection
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def handle_request(self, request):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        labels = (_table(request), request.method)
+        start = time.perf_counter()
+        try:
+            response = super().handle_request(request)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            metrics.record("db", time.perf_counter() - start, *labels)
+            raise
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        response.stream = _TimedStream(
+            response.stream, lambda: metrics.record("db", time.perf_counter() - start, *labels)
+        )
+        return response
+
+    def connections(self):
+        """(total, idle, http2) connection counts in the pool"""
+        # httpcore has no public counters; its connection list is the closest thing
+        conns = list(self._pool.connections)
+        idle = sum(1 for c in conns if c.is_idle())
+        http2 = sum(1 for c in conns if type(getattr(c, "_connection", None)).__name__ == "HTTP2Connection")
+        return len(conns), idle, http2
+
+
+def build_http_client():
+    """A pooled httpx.Client to hand to supabase's ClientOptions"""
+    limits = httpx.Limits(
+        max_connections=SUPABASE_MAX_CONNECTIONS,
+        max_keepalive_connections=SUPABASE_MAX_KEEPALIVE,
+        keepalive_expiry=SUPABASE_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(
+        SUPABASE_READ_TIMEOUT,
+        connect=SUPABASE_CONNECT_TIMEOUT,
+        pool=SUPABASE_POOL_TIMEOUT,
+    )
+    transport = CountingTransport(http2=SUPABASE_HTTP2, limits=limits)
+    return httpx.Client(transport=transport, timeout=timeout, follow_redirects=True)
+
+
+def pool_stats(client):
+    """Connection and request counters for a client from build_http_client()"""
+    transport = client._transport
+    total, idle, http2 = transport.connections()
+    return {
+        "http2": SUPABASE_HTTP2,
+        "max_connections": SUPABASE_MAX_CONNECTIONS,
+        "max_keepalive": SUPABASE_MAX_KEEPALIVE,
+        "connections": total,
+        "idle": idle,
+        "active": total - idle,
+        "http2_connections": http2,
+        "requests": transport.requests,
+        "errors": transport.errors,
+        "in_flight": transport.in_flight,
+        "peak_in_flight": transport.peak_in_flight,
+    }
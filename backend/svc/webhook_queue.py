@@ -0,0 +1,236 @@
+"""
+Durable local queue for PhonePe webhooks.
+
+The webhook route only verifies a notification and appends it here, so its
+reply does not wait on Supabase. The scheduler worker (svc.jobs) drains due
+jobs every WEBHOOK_POLL_INTERVAL seconds. A failed job is retried with
+exponential backoff, and after WEBHOOK_MAX_ATTEMPTS tries it is moved to the
+dead-letter state, where it stays until someone retries it by hand:
+
+    python -m svc.webhook_queue list --state dead
+    python -m svc.webhook_queue retry 42
+
+Order checks (svc.reconcile) and ledger closing refreshes (svc.ledger) ride
+on the same queue.
+
+The queue is a SQLite file (WEBHOOK_QUEUE_PATH) shared by every gunicorn
+worker on the host, written with synchronous=FULL so an acknowledged
+webhook survives a crash. A job claimed by a worker that dies is picked up
+again once its lease runs out. The file must live on a persistent volume,
+not the dyno's temporary filesystem, or a restart loses acknowledged
+webhooks; gunicorn.conf.py will not start unless WEBHOOK_QUEUE_PATH is set.
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Local runs default to the working directory, like STORAGE_PATH
+WEBHOOK_QUEUE_PATH = os.getenv("WEBHOOK_QUEUE_PATH", "mdm-webhooks.sqlite3")
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8"))
+WEBHOOK_RETRY_BASE = float(os.getenv("WEBHOOK_RETRY_BASE", "5"))  # seconds, doubled per attempt
+WEBHOOK_RETRY_MAX = float(os.getenv("WEBHOOK_RETRY_MAX", "1800"))  # seconds
+WEBHOOK_LEASE = float(os.getenv("WEBHOOK_LEASE", "120"))  # seconds a claimed job is held
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "20"))
+WEBHOOK_KEEP_DONE = int(os.getenv("WEBHOOK_KEEP_DONE", "7"))  # days
+
+STATES = ("queued", "running", "done", "dead")
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = set()
+
+
+def _conn():
+    # One connection per thread, re-opened in a forked child
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.pid != os.getpid():
+        conn = sqlite3.connect(WEBHOOK_QUEUE_PATH, timeout=10, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL")
+        _local.conn = conn
+        _local.pid = os.getpid()
+        _ensure_schema(conn)
+    return conn
+
+
+def _ensure_schema(conn):
+    with _schema_lock:
+        if WEBHOOK_QUEUE_PATH in _schema_ready:
+            return
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " event TEXT NOT NULL, payload TEXT NOT NULL,"
+            " state TEXT NOT NULL DEFAULT 'queued',"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " run_at REAL NOT NULL, last_error TEXT,"
+            " created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_due ON jobs (state, run_at)")
+        _schema_ready.add(WEBHOOK_QUEUE_PATH)
+
+
+def _row(row):
+    return {**dict(row), "payload": json.loads(row["payload"])}
+
+
+def enqueue(event, payload, unique_in=()):
+    """
+    Durably record a webhook for the worker; returns the job id. Nothing is
+    added while a job with the same event and payload is in one of the
+    unique_in states; that job's id is returned instead.
+    """
+    conn = _conn()
+    now = time.time()
+    body = json.dumps(payload, default=str, sort_keys=True)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if unique_in:
+            row = conn.execute(
+                f"SELECT id FROM jobs WHERE state IN ({', '.join('?' * len(unique_in))}) AND event = ? AND payload = ?",
+                (*unique_in, event, body),
+            ).fetchone()
+            if row:
+                return row["id"]
+        cursor = conn.execute(
+            "INSERT INTO jobs (event, payload, run_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (event, body, now, now, now),
+        )
+        return cursor.lastrowid
+    finally:
+        conn.execute("COMMIT")
+
+
+def _claim(limit):
+    """Take up to `limit` due jobs, including ones whose lease has run out"""
+    conn = _conn()
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        rows = conn.execute(
+            "SELECT * FROM jobs WHERE state IN ('queued', 'running') AND run_at <= ?"
+            " ORDER BY run_at, id LIMIT ?",
+            (now, limit),
+        ).fetchall()
+        conn.executemany(
+            "UPDATE jobs SET state = 'running', attempts = attempts + 1, run_at = ?, updated_at = ? WHERE id = ?",
+            [(now + WEBHOOK_LEASE, now, row["id"]) for row in rows],
+        )
+    finally:
+        conn.execute("COMMIT")
+    return [dict(_row(row), attempts=row["attempts"] + 1) for row in rows]
+
+
+def backoff(attempts):
+    """Seconds to wait before the next try, with jitter so retries spread out"""
+    delay = min(WEBHOOK_RETRY_BASE * 2 ** (attempts - 1), WEBHOOK_RETRY_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _finish(job, error=None):
+    now = time.time()
+    if error is None:
+        state, run_at = "done", now
+    elif job["attempts"] >= WEBHOOK_MAX_ATTEMPTS:
+        state, run_at = "dead", now
+    else:
+        state, run_at = "queued", now + backoff(job["attempts"])
+    _conn().execute(
+        "UPDATE jobs SET state = ?, run_at = ?, last_error = ?, updated_at = ? WHERE id = ?",
+        (state, run_at, error, now, job["id"]),
+    )
+    return state
+
+
+def run_due(handler, limit=WEBHOOK_BATCH_SIZE):
+    """
+    Run handler(event, payload) for every due job, a batch at a time, until
+    none are left. Returns a count per outcome.
+    """
+    counts = {"done": 0, "queued": 0, "dead": 0}
+    while True:
+        jobs = _claim(limit)
+        for job in jobs:
+            try:
+                handler(job["event"], job["payload"])
+                error = None
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            state = _finish(job, error)
+            counts[state] += 1
+            if state == "dead":
+                logger.error(f"Webhook job {job['id']} ({job['event']}) dead after {job['attempts']} attempts: {error}")
+            elif error:
+                logger.warning(f"Webhook job {job['id']} attempt {job['attempts']} failed: {error}")
+        if len(jobs) < limit:
+            return counts
+
+
+def purge_done(days=WEBHOOK_KEEP_DONE):
+    """Drop processed jobs older than `days`"""
+    cutoff = time.time() - days * 86400
+    return _conn().execute("DELETE FROM jobs WHERE state = 'done' AND updated_at < ?", (cutoff,)).rowcount
+
+
+def jobs(state="dead", limit=50):
+    """Most recent jobs in a state, newest first"""
+    rows = _conn().execute(
+        "SELECT * FROM jobs WHERE state = ? ORDER BY updated_at DESC LIMIT ?", (state, limit)
+    ).fetchall()
+    return [_row(row) for row in rows]
+
+
+def retry(job_id):
+    """Put a dead job back on the queue with a fresh attempt count"""
+    now = time.time()
+    return _conn().execute(
+        "UPDATE jobs SET state = 'queued', attempts = 0, run_at = ?, updated_at = ? WHERE id = ? AND state = 'dead'",
+        (now, now, job_id),
+    ).rowcount == 1
+
+
+def stats():
+    """Job counts per state and the age of the oldest waiting job"""
+    conn = _conn()
+    counts = dict.fromkeys(STATES, 0)
+    counts.update(conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+    oldest = conn.execute("SELECT MIN(created_at) FROM jobs WHERE state IN ('queued', 'running')").fetchone()[0]
+    return {
+        **counts,
+        "oldest_waiting_seconds": round(time.time() - oldest, 1) if oldest else 0.0,
+        "max_attempts": WEBHOOK_MAX_ATTEMPTS,
+        "path": WEBHOOK_QUEUE_PATH,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the webhook queue")
+    commands = parser.add_subparsers(dest="command", required=True)
+    list_parser = commands.add_parser("list", help="show jobs in a state")
+    list_parser.add_argument("--state", choices=STATES, default="dead")
+    list_parser.add_argument("--limit", type=int, default=50)
+    retry_parser = commands.add_parser("retry", help="re-queue a dead job")
+    retry_parser.add_argument("job_id", type=int)
+    commands.add_parser("stats", help="job counts per state")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for job in jobs(args.state, args.limit):
+            print(json.dumps(job, default=str))
+    elif args.command == "retry":
+        print("re-queued" if retry(args.job_id) else "no dead job with that id")
+    else:
+        print(json.dumps(stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Tests run against the SQLite storage backend (svc/storage.py), so they
+need no Supabase project or Postgres. Every module reads its settings at
+import, so the environment is set here, before anything imports db.
+"""
+
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_workdir = tempfile.mkdtemp(prefix="mdm-tests-")
+os.environ.update(
+    STORAGE_BACKEND="sqlite",
+    STORAGE_PATH=os.path.join(_workdir, "storage.sqlite3"),
+    CACHE_BACKEND="sqlite",
+    CACHE_PATH=os.path.join(_workdir, "cache.sqlite3"),
+    WEBHOOK_QUEUE_PATH=os.path.join(_workdir, "webhooks.sqlite3"),
+    METRICS_DIR=os.path.join(_workdir, "metrics"),
+    SESSION_SECRET="test-session-secret-0123456789abcdef",
+    SCHEDULER_ENABLED="0",
+)
+os.environ.pop("DATABASE_URL", None)
+
+import db  # noqa: E402
+from svc import webhook_queue  # noqa: E402
+
+
+@pytest.fixture
+def user_id():
+    """A fresh user, so tests sharing the storage file never see each other's rows"""
+    user_id = str(uuid.uuid4())
+    db._get_client().table("users").insert({"id": user_id, "email": f"{user_id}@example.com"}).execute()
+    return user_id
+
+
+@pytest.fixture
+def queue():
+    """The webhook queue, emptied before the test"""
+    webhook_queue._conn().execute("DELETE FROM jobs")
+    return webhook_queue
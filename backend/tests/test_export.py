@@ -0,0 +1,26 @@
+import pytest
+
+import db
+from app import app
+from svc.session import issue_token
+
+
+@pytest.fixture
+def client(user_id):
+    db.upsert_milk_records(user_id, [{"date": "2025-02-03", "children": 10}])
+    token = issue_token(user_id, "2099-01-01T00:00:00+00:00")
+    client = app.test_client()
+    client.environ_base["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+    return client
+
+
+def test_filename_comes_from_the_parsed_months(client):
+    response = client.get("/api/export/milk", query_string={"from": "2025-2", "to": "2025-03\n"})
+    assert response.status_code == 200
+    assert response.headers["Content-Disposition"] == 'attachment; filename="MDM_milk_2025-02_2025-03.csv"'
+    assert "2025-02-03" in response.get_data(as_text=True)
+
+
+def test_malformed_months_are_rejected(client):
+    response = client.get("/api/export/milk", query_string={"from": "2025-02", "to": "2025-03x"})
+    assert response.status_code == 400
@@ -0,0 +1,68 @@
+import db
+from svc.ledger import get_milk_ledger, get_stock_ledger
+
+
+def save_milk(user_id, records):
+    return db.upsert_milk_records(user_id, records)
+
+
+def stock_rows(user_id, year, month, grade="1-5"):
+    return [r for r in get_stock_ledger(user_id, year, month) if r["grade"] == grade]
+
+
+def test_milk_month_carries_into_next(user_id):
+    save_milk(user_id, [
+        {"date": "2025-01-01", "milk_open": 10, "ragi_open": 4},
+        {"date": "2025-01-06", "children": 100, "milk_rcpt": 2},  # a Monday: ragi too
+    ])
+    january = get_milk_ledger(user_id, 2025, 1)
+    assert january[-1]["milk_close"] == 10.2  # 10 + 2 - 100 * 0.018
+    assert january[-1]["ragi_close"] == 3.5  # 4 - 100 * 0.005
+
+    first = get_milk_ledger(user_id, 2025, 2)[0]
+    assert first["milk_open"] is None and first["ragi_open"] is None
+    assert (first["milk_carry"], first["ragi_carry"]) == (10.2, 3.5)
+    assert (first["milk_opening"], first["ragi_opening"]) == (10.2, 3.5)
+
+
+def test_explicit_day_one_opening_overrides_carry(user_id):
+    save_milk(user_id, [{"date": "2025-01-01", "milk_open": 10}])
+    get_milk_ledger(user_id, 2025, 1)
+    save_milk(user_id, [{"date": "2025-02-01", "milk_open": 3}])
+
+    first, second = get_milk_ledger(user_id, 2025, 2)[:2]
+    assert (first["milk_open"], first["milk_carry"], first["milk_opening"]) == (3.0, 10.0, 3.0)
+    # Only day 1 reports an entered opening
+    assert second["milk_open"] is None and second["milk_opening"] == 3.0
+
+
+def test_stock_month_carries_into_next(user_id):
+    db.upsert_stock_records(user_id, [{"date": "2025-01-02", "grade": "1-5", "rice_add": 50}])
+    db.upsert_meal_plans(user_id, [{"date": "2025-01-03", "cnt_1to5": 100, "cnt_6to10": 0,
+                                    "meal_type": "rice", "has_pulses": False}])
+    assert stock_rows(user_id, 2025, 1)[-1]["rice_closing"] == 40.0  # 50 - 100 * 0.1
+
+    first = stock_rows(user_id, 2025, 2)[0]
+    assert (first["rice_open"], first["rice_carry"], first["rice_opening"]) == (None, 40.0, 40.0)
+
+
+def test_stored_zero_stock_opening_is_not_entered(user_id):
+    db.upsert_stock_records(user_id, [{"date": "2025-01-02", "grade": "1-5", "rice_add": 20}])
+    assert stock_rows(user_id, 2025, 1)[-1]["rice_closing"] == 20.0
+
+    # What the old page posted back for day 1: the /calc zeros as openings
+    db.upsert_stock_records(user_id, [{"date": "2025-02-01", "grade": "1-5", "rice_add": 5,
+                                       "rice_open": 0, "wheat_open": 0, "oil_open": 0, "pulse_open": 0}])
+    february = stock_rows(user_id, 2025, 2)
+    assert (february[0]["rice_open"], february[0]["rice_opening"]) == (None, 20.0)
+    assert february[-1]["rice_closing"] == 25.0
+
+
+def test_cleared_stock_opening_falls_back_to_carry(user_id):
+    db.upsert_stock_records(user_id, [{"date": "2025-01-02", "grade": "1-5", "rice_add": 20}])
+    get_stock_ledger(user_id, 2025, 1)
+    db.upsert_stock_records(user_id, [{"date": "2025-02-01", "grade": "1-5", "rice_open": 7}])
+    assert stock_rows(user_id, 2025, 2)[0]["rice_opening"] == 7.0
+
+    db.upsert_stock_records(user_id, [{"date": "2025-02-01", "grade": "1-5", "rice_add": 1, "rice_open": None}])
+    assert stock_rows(user_id, 2025, 2)[0]["rice_opening"] == 20.0
@@ -0,0 +1,33 @@
+import pytest
+
+from app import app
+from svc import profiler
+
+TOKEN = "operator-token"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(profiler, "PROFILE_TOKEN", TOKEN)
+    return app.test_client()
+
+
+@pytest.mark.parametrize("path", ["/cache/stats", "/pool/stats", "/webhooks/stats"])
+def test_stats_need_the_profile_token(client, path):
+    assert client.get(path).status_code == 401
+    assert client.get(path, headers={"X-Profile": "wrong"}).status_code == 401
+
+    response = client.get(path, headers={"X-Profile": TOKEN})
+    assert response.status_code == 200
+    # The token opens the endpoint; it does not profile the request
+    assert "X-Profile-File" not in response.headers
+
+
+def test_stats_are_off_without_a_token(monkeypatch):
+    monkeypatch.setattr(profiler, "PROFILE_TOKEN", None)
+    assert app.test_client().get("/cache/stats", headers={"X-Profile": ""}).status_code == 401
+
+
+def test_webhook_stats_leave_out_the_queue_path(client):
+    stats = client.get("/webhooks/stats", headers={"X-Profile": TOKEN}).json
+    assert "queued" in stats and "path" not in stats
@@ -0,0 +1,42 @@
+import db
+from app import app
+from routes import pay
+from svc.reconcile import RECONCILE_EVENT
+from svc.session import issue_token
+
+
+def auth(user_id):
+    return {"Authorization": f"Bearer {issue_token(user_id, '2099-01-01T00:00:00+00:00')}"}
+
+
+def test_unique_enqueue_while_queued(queue):
+    payload = {"merchantOrderId": "order-1"}
+    first = queue.enqueue(RECONCILE_EVENT, payload, unique_in=("queued", "running"))
+    assert queue.enqueue(RECONCILE_EVENT, payload, unique_in=("queued", "running")) == first
+    assert queue.enqueue(RECONCILE_EVENT, {"merchantOrderId": "order-2"}, unique_in=("queued",)) != first
+    assert queue.stats()["queued"] == 2
+
+
+def test_pending_status_queues_one_reconcile(user_id, queue, monkeypatch):
+    monkeypatch.setattr(pay, "FRONTEND_FAILED_URL", "https://app.example/payment")
+    db.insert_payment(user_id, f"order-{user_id}", "1_month", 1)
+    client = app.test_client()
+
+    for _ in range(3):
+        response = client.get(f"/api/pay/status/order-{user_id}")
+        assert response.status_code == 302
+        assert response.headers["Location"] == f"https://app.example/payment?order=order-{user_id}"
+    assert queue.stats()["queued"] == 1
+
+
+def test_order_state_is_only_shown_to_its_owner(user_id, queue):
+    db.insert_payment(user_id, f"order-{user_id}", "1_month", 1)
+    client = app.test_client()
+
+    response = client.get(f"/api/pay/order/order-{user_id}", headers=auth(user_id))
+    assert response.json == {"order_id": f"order-{user_id}", "status": "pending"}
+
+    other = "someone-else"
+    db._get_client().table("users").insert({"id": other, "email": "other@example.com"}).execute()
+    assert client.get(f"/api/pay/order/order-{user_id}", headers=auth(other)).status_code == 404
+    assert client.get(f"/api/pay/order/order-{user_id}").status_code == 401
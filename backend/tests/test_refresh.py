@@ -0,0 +1,33 @@
+import db
+from svc.jobs import handle_job
+from svc.ledger import get_milk_ledger, refresh_saved_months
+
+
+def save_milk(user_id, records):
+    counts = db.upsert_milk_records(user_id, records)
+    refresh_saved_months(user_id, counts["dates"], register="milk")
+    return counts
+
+
+def test_edit_to_earlier_month_reaches_later_months(user_id, queue):
+    save_milk(user_id, [{"date": "2025-01-01", "milk_open": 10}])
+    for month in (1, 2, 3):
+        get_milk_ledger(user_id, 2025, month)
+    queue.run_due(handle_job)
+
+    save_milk(user_id, [{"date": "2025-01-01", "milk_open": 10, "milk_rcpt": 5}])
+    # The save only queues the refresh; the scheduler worker runs it
+    assert queue.stats()["queued"] == 1
+    assert queue.run_due(handle_job)["done"] == 1
+
+    closings = {str(r["period"])[:10]: r["milk_close"] for r in db.get_milk_closings(
+        user_id, ["2025-01-01", "2025-02-01", "2025-03-01"])}
+    assert closings == {"2025-01-01": 15.0, "2025-02-01": 15.0, "2025-03-01": 15.0}
+    assert get_milk_ledger(user_id, 2025, 4)[0]["milk_opening"] == 15.0
+
+
+def test_repeated_saves_queue_one_refresh(user_id, queue):
+    save_milk(user_id, [{"date": "2025-01-01", "milk_open": 10}])
+    save_milk(user_id, [{"date": "2025-01-01", "milk_open": 11}])
+    save_milk(user_id, [{"date": "2025-01-02", "children": 5}])
+    assert queue.stats()["queued"] == 1
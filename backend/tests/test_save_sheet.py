@@ -0,0 +1,72 @@
+import pytest
+
+import db
+from app import app
+from svc.session import issue_token
+
+MEALS = [
+    {"date": "2025-03-03", "cnt_1to5": 40, "cnt_6to10": 30, "meal_type": "rice", "has_pulses": True},
+    {"date": "2025-03-04", "cnt_1to5": 41, "cnt_6to10": 31, "meal_type": "wheat", "has_pulses": False},
+]
+
+
+def test_unchanged_rows_are_skipped(user_id):
+    first = db.upsert_meal_plans(user_id, MEALS)
+    assert (first["inserted"], first["updated"], first["unchanged"]) == (2, 0, 0)
+
+    again = db.upsert_meal_plans(user_id, MEALS)
+    assert (again["inserted"], again["updated"], again["unchanged"]) == (0, 0, 2)
+    assert again["dates"] == []
+
+    edited = db.upsert_meal_plans(user_id, [MEALS[0], {**MEALS[1], "cnt_1to5": 45}])
+    assert (edited["inserted"], edited["updated"], edited["unchanged"]) == (0, 1, 1)
+    assert edited["dates"] == ["2025-03-04"]
+
+
+def test_deleted_dates_remove_stored_rows(user_id):
+    db.upsert_meal_plans(user_id, MEALS)
+    counts = db.upsert_meal_plans(user_id, [], deleted=["2025-03-04", "2025-03-05"])
+    assert counts["deleted"] == 1
+    assert [str(r["date"])[:10] for r in db.get_meal_plans(user_id, 2025, 3)] == ["2025-03-03"]
+
+
+def test_bare_date_deletes_every_grade(user_id):
+    db.upsert_stock_records(user_id, [
+        {"date": "2025-03-03", "grade": "1-5", "rice_add": 5},
+        {"date": "2025-03-03", "grade": "6-10", "rice_add": 7},
+    ])
+    assert db.upsert_stock_records(user_id, [], deleted=[{"date": "2025-03-03", "grade": "6-10"}])["deleted"] == 1
+    assert db.upsert_stock_records(user_id, [], deleted=["2025-03-03"])["deleted"] == 1
+    assert db.get_stock_records(user_id, 2025, 3) == []
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/api/milk/save", {"records": [{"date": "2025-03-03", "children": 10}, {"date": "2025-03-04"}]}),
+    ("/api/meal/save", {"meals": MEALS}),
+    ("/api/stock/save", {"records": [{"date": "2025-03-03", "grade": "1-5", "rice_add": 5}]}),
+    ("/api/egg/save", {"records": [{"date": "2025-03-03", "egg_m": 4}]}),
+])
+def test_save_routes_accept_null_deleted(user_id, path, body):
+    token = issue_token(user_id, "2099-01-01T00:00:00+00:00")
+    response = app.test_client().post(path, json={**body, "deleted": None},
+                                      headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200, response.json
+
+
+def test_invalid_dates_are_row_errors(user_id):
+    with pytest.raises(db.RecordValidationError) as info:
+        db.upsert_meal_plans(user_id, [{**MEALS[0], "date": "2025-13-01"}, MEALS[1]],
+                             deleted=[{"grade": "1-5"}, "yesterday"])
+    assert info.value.errors == [
+        {"index": 0, "date": "2025-13-01", "error": "Invalid date '2025-13-01'"},
+        {"deleted": 0, "date": None, "error": "Missing field 'date'"},
+        {"deleted": 1, "date": "yesterday", "error": "Invalid date 'yesterday'"},
+    ]
+    # Nothing from the batch was written
+    assert db.get_meal_plans(user_id, 2025, 3) == []
+
+
+def test_deleted_dates_are_normalised(user_id):
+    db.upsert_meal_plans(user_id, MEALS)
+    counts = db.upsert_meal_plans(user_id, [], deleted=["2025-03-04T00:00:00"])
+    assert (counts["deleted"], counts["dates"]) == (1, ["2025-03-04"])
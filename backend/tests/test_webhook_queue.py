@@ -0,0 +1,74 @@
+import pytest
+
+import db
+from svc import payments
+from svc.jobs import handle_job
+
+
+@pytest.fixture
+def order(user_id):
+    db.insert_payment(user_id, f"order-{user_id}", "1_month", 1)
+    return f"order-{user_id}"
+
+
+def completed(order_id):
+    return {"merchantOrderId": order_id, "state": "COMPLETED", "amount": 100}
+
+
+def subscriptions(user_id):
+    return db._get_client().table("subscriptions").select("*").eq("user_id", user_id).execute().data
+
+
+def test_redelivered_webhook_creates_one_subscription(user_id, order, queue):
+    # PhonePe delivers the same notification again when our reply is late
+    for _ in range(2):
+        queue.enqueue(payments.COMPLETED_EVENT, completed(order))
+    assert queue.run_due(handle_job) == {"done": 2, "queued": 0, "dead": 0}
+
+    assert db.get_payment_by_order_id(order)["status"] == "COMPLETED"
+    assert len(subscriptions(user_id)) == 1
+
+
+def test_failed_job_is_retried(user_id, order, queue, monkeypatch):
+    monkeypatch.setattr(queue, "WEBHOOK_RETRY_BASE", 0)
+    calls = []
+
+    def flaky(event, payload):
+        calls.append(event)
+        if len(calls) == 1:
+            raise RuntimeError("database unavailable")
+        handle_job(event, payload)
+
+    job_id = queue.enqueue(payments.COMPLETED_EVENT, completed(order))
+    assert queue.run_due(flaky) == {"done": 0, "queued": 1, "dead": 0}
+    assert queue.run_due(flaky) == {"done": 1, "queued": 0, "dead": 0}
+
+    job = next(j for j in queue.jobs("done") if j["id"] == job_id)
+    assert (job["state"], job["attempts"]) == ("done", 2)
+    assert len(subscriptions(user_id)) == 1
+
+
+def test_job_failing_every_attempt_is_dead_lettered(queue, monkeypatch):
+    monkeypatch.setattr(queue, "WEBHOOK_RETRY_BASE", 0)
+    monkeypatch.setattr(queue, "WEBHOOK_MAX_ATTEMPTS", 2)
+
+    def broken(event, payload):
+        raise RuntimeError("always")
+
+    job_id = queue.enqueue(payments.COMPLETED_EVENT, completed("missing-order"))
+    assert queue.run_due(broken) == {"done": 0, "queued": 1, "dead": 0}
+    assert queue.run_due(broken) == {"done": 0, "queued": 0, "dead": 1}
+    job = next(j for j in queue.jobs("dead") if j["id"] == job_id)
+    assert (job["attempts"], job["last_error"]) == (2, "RuntimeError: always")
+
+
+def test_payment_response_is_stored_as_json(user_id, order, queue):
+    queue.enqueue(payments.FAILED_EVENT, {"merchantOrderId": order, "state": "FAILED", "errorCode": "TXN_DECLINED"})
+    queue.run_due(handle_job)
+    payment = db.get_payment_by_order_id(order)
+    assert payment["status"] == "FAILED"
+    assert payment["pp_data"] == {"merchantOrderId": order, "state": "FAILED", "errorCode": "TXN_DECLINED"}
+
+    # The completion RPC keeps the gateway payload as JSON too
+    assert db.complete_payment(order, completed(order))["status"] == "completed"
+    assert db.get_payment_by_order_id(order)["pp_data"] == completed(order)
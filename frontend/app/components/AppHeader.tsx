@@ -1,5 +1,6 @@
 import { Button } from '@/app/components/ui/button';
 import { useRouter } from 'next/navigation';
+import { clearSessionToken } from '@/app/utils/session';
 import { useState, useRef, useEffect } from 'react';
 
 interface AppHeaderProps {
@@ -16,6 +17,7 @@ export function AppHeader({ title, subtitle, showBackButton = true, userName }:
 
   const handleLogout = () => {
     localStorage.removeItem('user');
+    clearSessionToken();
     router.push('/');
   };
 
@@ -2,6 +2,7 @@
 
 import { useEffect, useState } from 'react';
 import { useRouter } from 'next/navigation';
+import { authHeaders } from '@/app/utils/session';
 import { SheetSelector } from '@/app/components/SheetSelector';
 import { MonthYearPicker } from '@/app/components/MonthYearPicker';
 import { Button } from '@/app/components/ui/button';
@@ -31,7 +32,7 @@ export default function Dashboard() {
     setUserName(userData.name || userData.email || 'User');
 
     // Check subscription status on every dashboard visit
-    fetch(`${process.env.NEXT_PUBLIC_BACKEND_URL}/api/sub/check?user_id=${userData.id}`)
+    fetch(`${process.env.NEXT_PUBLIC_BACKEND_URL}/api/sub/check`, { headers: authHeaders() })
       .then(res => res.json())
       .then(data => {
         if (!data.has_active_subscription) {
@@ -2,7 +2,8 @@
 
 import { useEffect, useState, useCallback, useMemo, useRef } from 'react';
 import { useRouter } from 'next/navigation';
-import { exportToPDF } from '@/app/utils/pdf';
+import { authHeaders, keepSessionFresh } from '@/app/utils/session';
+import { exportReportPDF } from '@/app/utils/pdf';
 import {
   Table,
   TableBody,
@@ -65,8 +66,9 @@ export default function EggPage() {
     setLoading(true);
     try {
       const res = await fetch(`${BACKEND_URL}/api/egg/${year}/${month}`, {
-        headers: { 'ngrok-skip-browser-warning': 'true' }
+        headers: { 'ngrok-skip-browser-warning': 'true', ...authHeaders() }
       });
+      keepSessionFresh(res);
       
       if (!res.ok) throw new Error('Failed to load');
       
@@ -146,14 +148,21 @@ export default function EggPage() {
           banana_price: bananaPrice,
         }));
 
+      // Empty rows are sent as deletions in case they were saved before
+      const deleted = rows
+        .filter(r => !(r.payer || r.egg_m || r.egg_f || r.banana_m || r.banana_f))
+        .map(r => r.date);
+
       const res = await fetch(`${BACKEND_URL}/api/egg/save`, {
         method: 'POST',
         headers: { 
           'Content-Type': 'application/json',
-          'ngrok-skip-browser-warning': 'true'
+          'ngrok-skip-browser-warning': 'true',
+          ...authHeaders()
         },
-        body: JSON.stringify({ user_id: userId, records })
+        body: JSON.stringify({ user_id: userId, records, deleted })
       });
+      keepSessionFresh(res);
       
       const responseData = await res.json();
       
@@ -198,8 +207,10 @@ export default function EggPage() {
   const handleExportPDF = () => {
     const monthName = new Date(year, month - 1).toLocaleString('default', { month: 'long' });
     const fileName = `Egg_Banana_${monthName}_${year}.pdf`;
-    exportToPDF(
-      printRef,
+    exportReportPDF(
+      'egg',
+      year,
+      month,
       fileName,
       () => alert('PDF exported successfully!'),
       (error) => alert('Export failed: ' + error)
@@ -2,7 +2,8 @@
 
 import { useEffect, useState, useCallback, useMemo, memo, useRef } from 'react';
 import { useRouter } from 'next/navigation';
-import { exportToPDF } from '@/app/utils/pdf';
+import { authHeaders, keepSessionFresh } from '@/app/utils/session';
+import { exportReportPDF } from '@/app/utils/pdf';
 import {
   Table,
   TableBody,
@@ -210,8 +211,9 @@ export default function Meals() {
     setError('');
     try {
       const res = await fetch(`${BACKEND_URL}/api/meal/${year}/${month}?user_id=${userId}`, {
-        headers: { 'ngrok-skip-browser-warning': 'true' }
+        headers: { 'ngrok-skip-browser-warning': 'true', ...authHeaders() }
       });
+      keepSessionFresh(res);
       if (!res.ok) throw new Error('Failed to load');
       const data = await res.json();
       
@@ -265,16 +267,21 @@ export default function Meals() {
           has_pulses: m.has_pulses || false
         }));
 
+      // Days without a meal are sent as deletions in case they were saved before
+      const deleted = meals.filter(m => m.meal_type === null).map(m => m.date);
+
       console.log('Saving meals:', { user_id: userId, meals: mealsToSave });
 
       const res = await fetch(`${BACKEND_URL}/api/meal/save`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
-          'ngrok-skip-browser-warning': 'true'
+          'ngrok-skip-browser-warning': 'true',
+          ...authHeaders()
         },
-        body: JSON.stringify({ user_id: userId, meals: mealsToSave })
+        body: JSON.stringify({ user_id: userId, meals: mealsToSave, deleted })
       });
+      keepSessionFresh(res);
       
       const responseData = await res.json();
       console.log('Response:', responseData);
@@ -310,8 +317,10 @@ export default function Meals() {
 
   const handleExportPDF = () => {
     const fileName = `Meals_${monthName}_${year}.pdf`;
-    exportToPDF(
-      printRef,
+    exportReportPDF(
+      'meals',
+      year,
+      month,
       fileName,
       () => alert('PDF exported successfully!'),
       (error) => alert('Export failed: ' + error)
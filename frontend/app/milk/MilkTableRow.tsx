@@ -21,8 +21,8 @@ interface MilkTableRowProps {
 }
 
 const MilkTableRow = ({ row, onHandleChange, isFirstDay = false }: MilkTableRowProps) => {
-  const totalMilk = useMemo(() => calculateTotalMilk(row.milk_open || 0, row.milk_rcpt || 0), [row.milk_open, row.milk_rcpt]);
-  const totalRagi = useMemo(() => calculateTotalRagi(row.ragi_open || 0, row.ragi_rcpt || 0), [row.ragi_open, row.ragi_rcpt]);
+  const totalMilk = useMemo(() => calculateTotalMilk(row.milk_opening || 0, row.milk_rcpt || 0), [row.milk_opening, row.milk_rcpt]);
+  const totalRagi = useMemo(() => calculateTotalRagi(row.ragi_opening || 0, row.ragi_rcpt || 0), [row.ragi_opening, row.ragi_rcpt]);
   const distMilk = useMemo(() => calculateMilkDistribution(row.children || 0), [row.children]);
   const distRagi = useMemo(() => calculateRagiDistribution(row.children || 0, row.dist_type, row.date), [row.children, row.dist_type, row.date]);
   const closeMilk = useMemo(() => calculateClosingMilk(totalMilk, distMilk), [totalMilk, distMilk]);
@@ -71,26 +71,28 @@ const MilkTableRow = ({ row, onHandleChange, isFirstDay = false }: MilkTableRowP
         {isFirstDay ? (
           <Input
             type="number"
-            value={row.milk_open || 0}
-            onChange={e => onHandleChange(row.id, 'milk_open', e.target.valueAsNumber || 0)}
+            value={row.milk_open ?? ''}
+            placeholder={(row.milk_opening || 0).toFixed(3)}
+            onChange={e => onHandleChange(row.id, 'milk_open', e.target.valueAsNumber)}
             className="w-20"
             step="0.001"
           />
         ) : (
-          (row.milk_open || 0).toFixed(3)
+          (row.milk_opening || 0).toFixed(3)
         )}
       </TableCell>
       <TableCell>
         {isFirstDay ? (
           <Input
             type="number"
-            value={row.ragi_open || 0}
-            onChange={e => onHandleChange(row.id, 'ragi_open', e.target.valueAsNumber || 0)}
+            value={row.ragi_open ?? ''}
+            placeholder={(row.ragi_opening || 0).toFixed(3)}
+            onChange={e => onHandleChange(row.id, 'ragi_open', e.target.valueAsNumber)}
             className="w-20"
             step="0.001"
           />
         ) : (
-          (row.ragi_open || 0).toFixed(3)
+          (row.ragi_opening || 0).toFixed(3)
         )}
       </TableCell>
       <TableCell>
@@ -2,7 +2,8 @@
 
 import { useEffect, useState, useCallback, useMemo, useRef } from 'react';
 import { useRouter } from 'next/navigation';
-import { exportToPDF } from '@/app/utils/pdf';
+import { authHeaders, keepSessionFresh } from '@/app/utils/session';
+import { exportReportPDF } from '@/app/utils/pdf';
 import {
   Table,
   TableBody,
@@ -37,6 +38,8 @@ export default function Milk() {
   const [loading, setLoading] = useState(false);
   const [saving, setSaving] = useState(false);
   const [zoom, setZoom] = useState(1);
+  // Month-end balance carried in, for day 1 when no opening is entered
+  const carryRef = useRef({ milk: 0, ragi: 0 });
 
   useEffect(() => {
     const user = localStorage.getItem('user');
@@ -58,9 +61,10 @@ export default function Milk() {
     
     setLoading(true);
     try {
-      const res = await fetch(`${BACKEND_URL}/api/milk/${year}/${month}?user_id=${userId}`, {
-        headers: { 'ngrok-skip-browser-warning': 'true' }
+      const res = await fetch(`${BACKEND_URL}/api/milk/calc/${year}/${month}?user_id=${userId}`, {
+        headers: { 'ngrok-skip-browser-warning': 'true', ...authHeaders() }
       });
+      keepSessionFresh(res);
       
       if (!res.ok) {
         throw new Error(`Failed to load data: ${res.status} ${res.statusText}`);
@@ -70,6 +74,8 @@ export default function Milk() {
       
       const daysInMonth = new Date(year, month, 0).getDate();
       const allDays: MilkRow[] = [];
+      const first = data[0] || {};
+      carryRef.current = { milk: first.milk_carry || 0, ragi: first.ragi_carry || 0 };
       
       for (let day = 1; day <= daysInMonth; day++) {
         const dateStr = `${year}-${String(month).padStart(2, '0')}-${String(day).padStart(2, '0')}`;
@@ -79,8 +85,10 @@ export default function Milk() {
           id: day,
           date: dateStr,
           children: existing.children || 0,
-          milk_open: existing.milk_open || 0,
-          ragi_open: existing.ragi_open || 0,
+          milk_open: existing.milk_open ?? null,
+          ragi_open: existing.ragi_open ?? null,
+          milk_opening: existing.milk_opening || 0,
+          ragi_opening: existing.ragi_opening || 0,
           milk_rcpt: existing.milk_rcpt || 0,
           ragi_rcpt: existing.ragi_rcpt || 0,
           dist_type: existing.dist_type || 'milk & ragi'
@@ -88,8 +96,10 @@ export default function Milk() {
           id: day,
           date: dateStr,
           children: 0,
-          milk_open: 0,
-          ragi_open: 0,
+          milk_open: null,
+          ragi_open: null,
+          milk_opening: 0,
+          ragi_opening: 0,
           milk_rcpt: 0,
           ragi_rcpt: 0,
           dist_type: 'milk & ragi'
@@ -115,18 +125,17 @@ export default function Milk() {
       const idx = newRows.findIndex(r => r.id === id);
       
       if (idx !== -1) {
-        // Ensure numeric fields never become NaN or undefined
-        if (field === 'children' || field === 'milk_open' || field === 'ragi_open' || 
-            field === 'milk_rcpt' || field === 'ragi_rcpt') {
-          (newRows[idx] as any)[field] = isNaN(value) ? 0 : (value || 0);
+        // Ensure numeric fields never become NaN or undefined; a cleared
+        // day-1 opening goes back to null so the carried balance applies
+        if (field === 'milk_open' || field === 'ragi_open') {
+          newRows[idx] = { ...newRows[idx], [field]: isNaN(value) ? null : value };
+        } else if (field === 'children' || field === 'milk_rcpt' || field === 'ragi_rcpt') {
+          newRows[idx] = { ...newRows[idx], [field]: isNaN(value) ? 0 : (value || 0) };
         } else {
-          (newRows[idx] as any)[field] = value;
+          newRows[idx] = { ...newRows[idx], [field]: value };
         }
         
-        // Only recalculate from the next row if we're not editing the first day's opening stock
-        // If editing first day's opening stock, recalculate from index 1
-        const recalcStartIdx = (idx === 0 && (field === 'milk_open' || field === 'ragi_open')) ? 1 : idx;
-        return recalculateOpeningStock(newRows, recalcStartIdx);
+        return recalculateOpeningStock(newRows, idx, carryRef.current);
       }
       
       return newRows;
@@ -136,11 +145,13 @@ export default function Milk() {
   const saveData = async () => {
     setSaving(true);
     try {
-      const records = rows.map(r => ({
+      // Only an opening typed in on day 1 is saved; the computed ones are
+      // rebuilt by the ledger from the previous month's closing
+      const records = rows.map((r, index) => ({
         date: r.date,
         children: r.children || 0,
-        milk_open: r.milk_open || 0,
-        ragi_open: r.ragi_open || 0,
+        milk_open: index === 0 ? r.milk_open : null,
+        ragi_open: index === 0 ? r.ragi_open : null,
         milk_rcpt: r.milk_rcpt || 0,
         ragi_rcpt: r.ragi_rcpt || 0,
         dist_type: r.dist_type
@@ -152,10 +163,12 @@ export default function Milk() {
         method: 'POST',
         headers: { 
           'Content-Type': 'application/json',
-          'ngrok-skip-browser-warning': 'true'
+          'ngrok-skip-browser-warning': 'true',
+          ...authHeaders()
         },
         body: JSON.stringify({ user_id: userId, records })
       });
+      keepSessionFresh(res);
       
       const responseData = await res.json();
       console.log('Response:', responseData);
@@ -178,8 +191,10 @@ export default function Milk() {
   const handleExportPDF = () => {
     const monthName = new Date(year, month - 1).toLocaleString('default', { month: 'long' });
     const fileName = `Milk_Ragi_${monthName}_${year}.pdf`;
-    exportToPDF(
-      printRef,
+    exportReportPDF(
+      'milk',
+      year,
+      month,
       fileName,
       () => alert('PDF exported successfully!'),
       (error) => alert('Export failed: ' + error)
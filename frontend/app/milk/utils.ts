@@ -2,8 +2,12 @@ export interface MilkRow {
   id: number;
   date: string;
   children: number;
-  milk_open: number;
-  ragi_open: number;
+  // Entered on day 1 only; null opens from the carried-in balance
+  milk_open: number | null;
+  ragi_open: number | null;
+  // Computed opening balances, shown but never saved
+  milk_opening: number;
+  ragi_opening: number;
   milk_rcpt: number;
   ragi_rcpt: number;
   dist_type: 'milk & ragi' | 'only milk';
@@ -50,8 +54,13 @@ export const calculateSugar = (children: number) => {
   return (children || 0) * 0.44;
 };
 
-// Recalculate opening stock for subsequent rows
-export const recalculateOpeningStock = (rows: MilkRow[], startIdx: number): MilkRow[] => {
+// Recalculate opening stock from startIdx on; day 1 opens from its entered
+// values or the balance carried in from the previous month
+export const recalculateOpeningStock = (
+  rows: MilkRow[],
+  startIdx: number,
+  carry: { milk: number; ragi: number }
+): MilkRow[] => {
   const newRows = [...rows];
   
   for (let i = startIdx; i < newRows.length; i++) {
@@ -59,13 +68,22 @@ export const recalculateOpeningStock = (rows: MilkRow[], startIdx: number): Milk
     const prev = i > 0 ? newRows[i - 1] : null;
     
     if (prev) {
-      const prevTotalMilk = calculateTotalMilk(prev.milk_open || 0, prev.milk_rcpt || 0);
+      const prevTotalMilk = calculateTotalMilk(prev.milk_opening || 0, prev.milk_rcpt || 0);
       const prevDistMilk = calculateMilkDistribution(prev.children || 0);
-      curr.milk_open = calculateClosingMilk(prevTotalMilk, prevDistMilk);
-      
-      const prevTotalRagi = calculateTotalRagi(prev.ragi_open || 0, prev.ragi_rcpt || 0);
+      const prevTotalRagi = calculateTotalRagi(prev.ragi_opening || 0, prev.ragi_rcpt || 0);
       const prevDistRagi = calculateRagiDistribution(prev.children || 0, prev.dist_type, prev.date);
-      curr.ragi_open = calculateClosingRagi(prevTotalRagi, prevDistRagi);
+      newRows[i] = {
+        ...curr,
+        milk_opening: calculateClosingMilk(prevTotalMilk, prevDistMilk),
+        ragi_opening: calculateClosingRagi(prevTotalRagi, prevDistRagi)
+      };
+    } else {
+      // As in the backend ledger, an entered 0 is the same as none
+      newRows[i] = {
+        ...curr,
+        milk_opening: curr.milk_open || carry.milk,
+        ragi_opening: curr.ragi_open || carry.ragi
+      };
     }
   }
   
@@ -2,6 +2,7 @@
 
 import { useEffect, useState } from 'react';
 import { useRouter } from 'next/navigation';
+import { saveSessionToken } from '@/app/utils/session';
 import Script from 'next/script';
 
 declare global {
@@ -42,6 +43,7 @@ export default function Home() {
 
       if (data.user) {
         localStorage.setItem('user', JSON.stringify(data.user));
+        saveSessionToken(data.token);
         
         if (!data.user.is_subscribed) {
           router.push('/payment');
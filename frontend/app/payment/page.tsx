@@ -2,9 +2,14 @@
 
 import { useEffect, useState } from 'react';
 import { useRouter } from 'next/navigation';
+import { authHeaders } from '@/app/utils/session';
 
 const BACKEND_URL = process.env.NEXT_PUBLIC_BACKEND_URL;
 
+// An order PhonePe has not settled yet is polled every POLL_MS, up to POLL_LIMIT times
+const POLL_MS = 2000;
+const POLL_LIMIT = 30;
+
 if (!BACKEND_URL) {
   throw new Error("NEXT_PUBLIC_BACKEND_URL is undefined. App cannot start.");
 }
@@ -15,6 +20,7 @@ export default function Payment() {
   const [plan, setPlan] = useState<string>('');
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string>('');
+  const [checking, setChecking] = useState(false);
 
   useEffect(() => {
     const user = localStorage.getItem('user');
@@ -26,6 +32,46 @@ export default function Payment() {
     setUserId(userData.id);
   }, [router]);
 
+  // Back from PhonePe with ?order=... while the payment was still pending
+  useEffect(() => {
+    const orderId = new URLSearchParams(window.location.search).get('order');
+    if (!orderId) return;
+
+    let polls = 0;
+    let timer: ReturnType<typeof setTimeout>;
+    const poll = async () => {
+      try {
+        const res = await fetch(`${BACKEND_URL}/api/pay/order/${encodeURIComponent(orderId)}`, {
+          headers: { 'ngrok-skip-browser-warning': 'true', ...authHeaders() }
+        });
+        if (!res.ok) throw new Error(`HTTP ${res.status}`);
+        const data = await res.json();
+        if (data.status === 'COMPLETED') {
+          router.push('/dashboard');
+          return;
+        }
+        if (data.status === 'FAILED') {
+          setChecking(false);
+          setError('Payment failed. Please try again.');
+          return;
+        }
+      } catch (err: any) {
+        console.error('Payment status error:', err);
+      }
+      polls += 1;
+      if (polls < POLL_LIMIT) {
+        timer = setTimeout(poll, POLL_MS);
+      } else {
+        setChecking(false);
+        setError('Your payment is still being confirmed. Your subscription will be activated once it completes.');
+      }
+    };
+
+    setChecking(true);
+    poll();
+    return () => clearTimeout(timer);
+  }, [router]);
+
   const handlePayment = async (e: React.FormEvent) => {
     e.preventDefault();
     
@@ -42,7 +88,8 @@ export default function Payment() {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
-          'ngrok-skip-browser-warning': 'true'
+          'ngrok-skip-browser-warning': 'true',
+          ...authHeaders()
         },
         body: JSON.stringify({ user_id: userId, plan })
       });
@@ -86,6 +133,12 @@ export default function Payment() {
             </select>
           </div>
 
+          {checking && (
+            <div className="p-3 bg-blue-50 text-blue-700 rounded-lg text-sm">
+              Confirming your payment...
+            </div>
+          )}
+
           {error && (
             <div className="p-3 bg-red-50 text-red-600 rounded-lg text-sm">
               {error}
@@ -94,7 +147,7 @@ export default function Payment() {
 
           <button
             type="submit"
-            disabled={loading}
+            disabled={loading || checking}
             className="w-full bg-blue-600 text-white p-3 rounded-lg font-medium disabled:bg-gray-400"
           >
             {loading ? 'Processing...' : 'Continue to Payment'}
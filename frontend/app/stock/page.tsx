@@ -2,7 +2,8 @@
 
 import React, { useEffect, useState, useCallback, useRef } from 'react';
 import { useRouter } from 'next/navigation';
-import { exportToPDF } from '@/app/utils/pdf';
+import { authHeaders, keepSessionFresh } from '@/app/utils/session';
+import { exportReportPDF } from '@/app/utils/pdf';
 import {
   Table,
   TableBody,
@@ -37,6 +38,15 @@ interface StockRow {
   wheat_used: number;
   oil_used: number;
   pulse_used: number;
+  // Server-computed ledger balances; day 1 opening carries last month's closing
+  rice_carry?: number | null;
+  wheat_carry?: number | null;
+  oil_carry?: number | null;
+  pulse_carry?: number | null;
+  rice_opening?: number;
+  wheat_opening?: number;
+  oil_opening?: number;
+  pulse_opening?: number;
 }
 
 export default function Stock() {
@@ -71,8 +81,9 @@ export default function Stock() {
     setLoading(true);
     try {
       const res = await fetch(`${BACKEND_URL}/api/stock/calc/${year}/${month}?user_id=${userId}`, {
-        headers: { 'ngrok-skip-browser-warning': 'true' }
+        headers: { 'ngrok-skip-browser-warning': 'true', ...authHeaders() }
       });
+      keepSessionFresh(res);
       
       if (!res.ok) {
         throw new Error(`Failed to load data: ${res.status}`);
@@ -95,7 +106,9 @@ export default function Stock() {
   const handleChange = useCallback((date: string, grade: '1-5' | '6-10', field: string, value: number) => {
     setRows(prev => prev.map(r => {
       if (r.date === date && r.grade === grade) {
-        return { ...r, [field]: isNaN(value) ? 0 : value };
+        // A cleared opening is null (not entered), so day 1 opens from the carried balance
+        const empty = field.endsWith('_open') ? null : 0;
+        return { ...r, [field]: isNaN(value) ? empty : value };
       }
       return r;
     }));
@@ -109,10 +122,7 @@ export default function Stock() {
         .filter(r => {
           const isFirstDay = r.date.endsWith('-01');
           const hasOpeningStock = isFirstDay && (
-            (r.rice_open !== null && r.rice_open !== 0) ||
-            (r.wheat_open !== null && r.wheat_open !== 0) ||
-            (r.oil_open !== null && r.oil_open !== 0) ||
-            (r.pulse_open !== null && r.pulse_open !== 0)
+            !!r.rice_open || !!r.wheat_open || !!r.oil_open || !!r.pulse_open
           );
           const hasIncomingStock = 
             r.rice_add !== 0 ||
@@ -129,20 +139,29 @@ export default function Stock() {
           wheat_add: r.wheat_add || 0,
           oil_add: r.oil_add || 0,
           pulse_add: r.pulse_add || 0,
-          rice_open: r.rice_open,
-          wheat_open: r.wheat_open,
-          oil_open: r.oil_open,
-          pulse_open: r.pulse_open,
+          // Only day 1 takes an opening; never send a derived one back
+          rice_open: r.date.endsWith('-01') ? r.rice_open || null : null,
+          wheat_open: r.date.endsWith('-01') ? r.wheat_open || null : null,
+          oil_open: r.date.endsWith('-01') ? r.oil_open || null : null,
+          pulse_open: r.date.endsWith('-01') ? r.pulse_open || null : null,
         }));
 
+      // Empty rows are sent as deletions in case they were saved before
+      const savedKeys = new Set(records.map(r => `${r.date}|${r.grade}`));
+      const deleted = rows
+        .filter(r => !savedKeys.has(`${r.date}|${r.grade}`))
+        .map(r => ({ date: r.date, grade: r.grade }));
+
       const res = await fetch(`${BACKEND_URL}/api/stock/save`, {
         method: 'POST',
         headers: { 
           'Content-Type': 'application/json',
-          'ngrok-skip-browser-warning': 'true'
+          'ngrok-skip-browser-warning': 'true',
+          ...authHeaders()
         },
-        body: JSON.stringify({ user_id: userId, records })
+        body: JSON.stringify({ user_id: userId, records, deleted })
       });
+      keepSessionFresh(res);
       
       const responseData = await res.json();
       
@@ -186,11 +205,12 @@ export default function Stock() {
       const isFirstDay = date.endsWith('-01');
       
       if (isFirstDay) {
+        // As in the ledger, an entered 0 counts as not entered
         return {
-          rice: row.rice_open || 0,
-          wheat: row.wheat_open || 0,
-          oil: row.oil_open || 0,
-          pulse: row.pulse_open || 0,
+          rice: row.rice_open || row.rice_carry || 0,
+          wheat: row.wheat_open || row.wheat_carry || 0,
+          oil: row.oil_open || row.oil_carry || 0,
+          pulse: row.pulse_open || row.pulse_carry || 0,
         };
       } else {
         const currentDate = new Date(date);
@@ -256,8 +276,10 @@ export default function Stock() {
   const handleExportPDF = () => {
     const monthName = new Date(year, month - 1).toLocaleString('default', { month: 'long' });
     const fileName = `Stock_${monthName}_${year}.pdf`;
-    exportToPDF(
-      printRef,
+    exportReportPDF(
+      'stock',
+      year,
+      month,
       fileName,
       () => alert('PDF exported successfully!'),
       (error) => alert('Export failed: ' + error)
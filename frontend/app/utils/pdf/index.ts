@@ -6,6 +6,7 @@
 import { RefObject } from 'react';
 import { PDFExporter } from './exporter';
 import { PDFExportOptions, PDFExportCallbacks } from './types';
+import { downloadReport, ReportKind } from './report';
 
 // Singleton instance for reuse
 let exporterInstance: PDFExporter | null = null;
@@ -53,5 +54,32 @@ export async function exportToPDF(
   await exporter.export(elementRef, exportOptions, callbacks);
 }
 
+/**
+ * Export a register as a vector PDF rendered by the backend
+ *
+ * @param kind - Register to export
+ * @param year - Year of the register
+ * @param month - Month of the register (1-12)
+ * @param fileName - Name of the PDF file
+ * @param onSuccess - Success callback
+ * @param onError - Error callback
+ */
+export async function exportReportPDF(
+  kind: ReportKind,
+  year: number,
+  month: number,
+  fileName: string,
+  onSuccess?: () => void,
+  onError?: (error: string) => void
+): Promise<void> {
+  try {
+    await downloadReport(kind, year, month, fileName);
+    onSuccess?.();
+  } catch (error) {
+    onError?.(error instanceof Error ? error.message : 'Unknown error occurred');
+  }
+}
+
 // Re-export types for convenience
 export type { PDFExportOptions, PDFExportCallbacks } from './types';
+export type { ReportKind } from './report';
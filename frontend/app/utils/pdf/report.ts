@@ -0,0 +1,29 @@
+/**
+ * Server-rendered reports
+ * Downloads a register drawn as vector PDF by the backend
+ */
+
+import { authHeaders, keepSessionFresh } from '@/app/utils/session';
+
+export type ReportKind = 'meals' | 'stock' | 'milk' | 'egg';
+
+export async function downloadReport(
+  kind: ReportKind,
+  year: number,
+  month: number,
+  fileName: string
+): Promise<void> {
+  const res = await fetch(
+    `${process.env.NEXT_PUBLIC_BACKEND_URL}/api/report/${kind}/${year}/${month}.pdf`,
+    { headers: { 'ngrok-skip-browser-warning': 'true', ...authHeaders() } }
+  );
+  keepSessionFresh(res);
+  if (!res.ok) throw new Error(`HTTP ${res.status}`);
+
+  const url = URL.createObjectURL(await res.blob());
+  const link = document.createElement('a');
+  link.href = url;
+  link.download = fileName;
+  link.click();
+  URL.revokeObjectURL(url);
+}
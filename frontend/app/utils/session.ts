@@ -0,0 +1,22 @@
+const TOKEN_KEY = 'sessionToken';
+const REFRESH_HEADER = 'X-Session-Token';
+
+export function saveSessionToken(token: string) {
+  localStorage.setItem(TOKEN_KEY, token);
+}
+
+export function clearSessionToken() {
+  localStorage.removeItem(TOKEN_KEY);
+}
+
+// Authorization header for backend calls
+export function authHeaders(): Record<string, string> {
+  const token = localStorage.getItem(TOKEN_KEY);
+  return token ? { Authorization: `Bearer ${token}` } : {};
+}
+
+// The backend sends a refreshed token once the old one's subscription_end has passed
+export function keepSessionFresh(res: Response) {
+  const token = res.headers.get(REFRESH_HEADER);
+  if (token) saveSessionToken(token);
+}